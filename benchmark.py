@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+Latency and jitter benchmarks for the dispense control path.
+
+Runs against the simulated hardware backend (sim_hardware.py), optionally
+replaying recorded raw load-cell counts, and prints JSON with p50/p95/p99 for:
+
+  weight_read          LoadCell.get_weight() latency, direct and streaming
+  rpm_read             BLDCMotor.get_rpm() and BLDCMotor.rpm latency, rpm step response
+  engine_tick_jitter   deviation of DispenseEngine ice-stage ticks from their period
+  interlock_reaction   lid-open edge -> EN/BRK driven high, as recorded by InterlockWatcher
+  motor_commands       release()/set_speed()/brake() latency and pigpio commands per call
+  jam_detection        ice jam (rotor drag) onset -> JAM event, and false alarms while running free
+  config_edits         settings edit latency for a spinbox burst and the settings.json writes it caused
+  config_reload        recipe edit -> recompiled plan (one-recipe delta) vs a full recompile, and an external file edit merged by reload()
+  vibration            detrended weight ripple (g) with the empty rotor spinning, without and with the rotor notch,
+                       and the notch fits rejected as implausible
+  stop_latency         stop trigger -> EN/BRK driven high, per stop mode: threshold stops from the true
+                       weight crossing plan.ice_stop_g, predicted stops from the flow predictor's decision
+  ice_error_oz         settled ice weight minus the recipe's Ice target (true sim weight)
+  flavor_error_oz      poured flavor minus the Flavor target for an operator who stops on the cue
+  zeroing              ZEROING state duration (waiting for a steady scale, bounded by zero_settle_time)
+  ice_settle           ICE_DONE -> engine "settled" event
+  order_cycle          full simulated order, start -> finish
+
+    python benchmark.py --orders 3 --output bench.json
+    python benchmark.py --orders 3 --gui-stall 300  # block the GUI thread 300 ms twice a second while shaving
+    python benchmark.py --compare bench.json        # show p50 change against a previous run
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+
+import sim_hardware
+sim_hardware.install()
+import numpy as np
+import dispense_engine
+import recipe_plan
+
+GRAMS_PER_OZ = 28.35
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "n": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def timed_calls(func, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def throughput(func, seconds=1.0):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def bench_weight_read(iterations):
+    from hx711_reader import LoadCell
+    load_cell = LoadCell()
+    results = {"direct": summarize(timed_calls(load_cell.get_weight, max(iterations // 10, 3)))}
+    load_cell.start_stream()
+    load_cell.stream_buffer.wait_for(20, timeout=2.0)
+    results["streaming"] = summarize(timed_calls(load_cell.get_weight, iterations))
+    results["streaming"]["calls_per_s"] = throughput(load_cell.get_weight)
+    load_cell.stop_stream()
+    return results
+
+
+def bench_rpm(iterations, motor):
+    motor.start()
+    motor.set_speed(60)
+    time.sleep(0.5)
+    results = {"get_rpm": summarize(timed_calls(motor.get_rpm, iterations))}
+    results["get_rpm"]["calls_per_s"] = 1.0 / max(results["get_rpm"]["mean_ms"] / 1000.0, 1e-9)
+    results["rpm"] = summarize(timed_calls(lambda: motor.rpm, iterations * 100))
+    results["rpm"]["calls_per_s"] = throughput(lambda: motor.rpm)
+
+    # How closely each reading follows the true rotor speed through a 60 % -> 30 % step
+    world = sim_hardware.world()
+    errors = []
+    motor.set_speed(30)
+    step_start = time.monotonic()
+    while time.monotonic() - step_start < 1.0:
+        true_rpm = world.rotor_rpm * 1.031  # BLDCMotor applies the same correction factor
+        errors.append(abs(motor.rpm - true_rpm) / max(true_rpm, 1.0) * 100.0)
+        time.sleep(0.005)
+    results["rpm_step_error_pct"] = {
+        "mean": float(np.mean(errors)),
+        "p95": float(np.percentile(errors, 95)),
+        "max": float(np.max(errors)),
+    }
+    motor.stop()
+    return results
+
+
+def bench_interlock(trials, motor, watcher):
+    world = sim_hardware.world()
+    for _ in range(trials):
+        motor.start()
+        motor.set_speed(60)
+        time.sleep(0.05)
+        world.open_lid()
+        time.sleep(0.02)
+        world.close_lid()
+    motor.stop()
+    return watcher.report()
+
+
+def _detrended_std(times, values):
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    fit = np.polyval(np.polyfit(times - times[-1], values, 1), times - times[-1])
+    return float(np.std(values - fit))
+
+
+def bench_vibration(motor, load_cell, duties=(40, 70, 100), seconds=1.0):
+    """Weight ripple while the empty rotor spins: streamed samples and get_weight(), raw vs notched."""
+    world = sim_hardware.world()
+    rpm_source = load_cell.notch.rpm_source
+    ice_rate = world.ice_rate_full
+    world.ice_rate_full = 0.0  # Empty hopper: only vibration moves the reading
+    results = {}
+    motor.start()
+    for duty in duties:
+        motor.set_speed(duty)
+        time.sleep(1.0)  # Let the rotor reach speed
+        entry = {"rpm": motor.rpm}
+        for label, source in (("raw", None), ("notch", lambda: motor.rpm)):
+            load_cell.notch.rpm_source = source
+            if source is not None:
+                load_cell.notch.ready  # The notch sees the rotor at speed from here on
+                time.sleep(seconds)  # Fill the window with steady-speed samples
+            readings, stamps = [], []
+            start = time.monotonic()
+            while time.monotonic() - start < seconds:
+                readings.append(load_cell.get_weight())
+                stamps.append(time.monotonic())
+                time.sleep(0.02)
+            times, weights = load_cell.recent_weights(int(seconds * world.sample_rate))
+            entry[label] = {"samples_std_g": _detrended_std(times, weights),
+                            "get_weight_std_g": _detrended_std(stamps, readings)}
+        results[f"duty_{duty}"] = entry
+    motor.stop()
+    results["notch_rejected"] = load_cell.notch.rejected
+    load_cell.notch.rpm_source = rpm_source
+    world.ice_rate_full = ice_rate
+    return results
+
+
+def bench_config_edits(iterations):
+    """A burst of recipe edits as a spinbox drag sends them, then wait for the coalesced write."""
+    import config_store
+    import settings
+    config = config_store.store(settings.SETTINGS_FILE)
+    app_settings = settings.load_settings()
+    flavor = next(iter(app_settings["sizes"]))
+    size = next(iter(app_settings["sizes"][flavor]))
+    recipe = app_settings["sizes"][flavor][size]
+    original = recipe.get("Flavor", 0)
+    writes = config.writes
+
+    def edit():
+        recipe["Flavor"] = round(recipe.get("Flavor", 0) + 0.05, 2)
+        settings.save_settings(app_settings)
+
+    results = summarize(timed_calls(edit, iterations))
+    recipe["Flavor"] = original
+    settings.save_settings(app_settings)
+    start = time.perf_counter()
+    config.flush()
+    results["flush_ms"] = (time.perf_counter() - start) * 1000.0
+    results["file_writes"] = config.writes - writes
+    return results
+
+
+def bench_config_reload(iterations, load_cell, motor):
+    """How fast a recipe edit reaches the engine's plans, from this process and from another one."""
+    import config_store
+    import settings
+    config = settings.store()
+    engine = dispense_engine.DispenseEngine(load_cell, motor, settings.load_settings())
+    flavor = next(iter(engine.app_settings["sizes"]))
+    size = next(iter(engine.app_settings["sizes"][flavor]))
+    key = ("sizes", flavor, size, "Ice")
+    original = config_store.lookup(config.data(), key)
+    config.add_listener(engine._on_settings_changed)
+
+    step = [0]
+
+    def edit():
+        step[0] += 1
+        config.set_in(key, round(original + 0.01 * (step[0] % 2 + 1), 2))
+
+    results = {
+        "edit_to_plan": summarize(timed_calls(edit, iterations)),
+        "full_recompile": summarize(timed_calls(engine.compile_recipes, iterations)),
+    }
+
+    # Another process edits the file: wait for it on disk, then merge it as the watcher would
+    config.flush()
+    samples = []
+    for i in range(max(iterations // 10, 3)):
+        with open(config.path) as f:
+            data = json.load(f)
+        data["sizes"][flavor][size]["Ice"] = round(original + 0.1 * (i + 1), 2)
+        time.sleep(0.01)  # Distinct mtime
+        with open(config.path, "w") as f:
+            json.dump(data, f, indent=4)
+        start = time.perf_counter()
+        changes = config.reload()
+        samples.append(time.perf_counter() - start)
+        if len(changes) != 1 or engine.plans[(flavor, size)].ice_target_oz != data["sizes"][flavor][size]["Ice"]:
+            print(f"[WARNING] External edit not applied as one delta: {changes}")
+    results["external_reload"] = summarize(samples)
+    results["version"] = config.version
+
+    config.remove_listener(engine._on_settings_changed)
+    config.set_in(key, original)
+    config.flush()
+    return results
+
+
+def bench_jam(trials, motor, bus, drag=0.8):
+    import hw_events
+    world = sim_hardware.world()
+    if not motor.feedforward.ready:
+        motor.learn_feedforward()
+    events = bus.subscribe_queue(types=(hw_events.JAM,))
+    latencies, missed, false_alarms = [], 0, 0
+    for _ in range(trials):
+        motor.start()
+        motor.set_speed(60)
+        time.sleep(bus.stall_grace + 1.0)
+        while not events.empty():
+            events.get_nowait()
+            false_alarms += 1
+        world.set_jam(drag)
+        jammed_at = time.monotonic()
+        try:
+            event = events.get(timeout=3.0)
+            latencies.append(event["time"] - jammed_at)
+        except queue.Empty:
+            missed += 1
+        world.set_jam(0.0)
+        motor.stop()
+        time.sleep(0.3)
+    bus.unsubscribe(events)
+    return dict(summarize(latencies), missed=missed, false_alarms=false_alarms, drag=drag)
+
+
+class CountingPi:
+    """Wraps a pigpio.pi and counts daemon commands (one socket round trip each on hardware)."""
+
+    def __init__(self, pi):
+        self._pi = pi
+        self.commands = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._pi, name)
+        if not callable(attr):
+            return attr
+
+        def command(*args, **kwargs):
+            self.commands += 1
+            return attr(*args, **kwargs)
+        return command
+
+
+def bench_motor_commands(iterations, motor):
+    counter = CountingPi(motor.pi)
+    motor.pi = counter
+    samples = {"release": [], "set_speed": [], "brake": []}
+    commands = {name: 0 for name in samples}
+    calls = {"release": motor.release, "set_speed": lambda: motor.set_speed(60), "brake": motor.brake}
+    try:
+        for _ in range(iterations):
+            for name, call in calls.items():
+                before = counter.commands
+                t0 = time.perf_counter()
+                call()
+                samples[name].append(time.perf_counter() - t0)
+                commands[name] += counter.commands - before
+                time.sleep(0.01)
+    finally:
+        motor.pi = counter._pi
+    results = {}
+    for name in samples:
+        results[name] = summarize(samples[name])
+        results[name]["pigpio_commands"] = commands[name] / iterations
+    return results
+
+
+class OrderDriver:
+    """Plays the operator through complete orders on MainUI and records timings."""
+
+    def __init__(self, app, window, orders, flavor, size, gui_stall=0.0):
+        from PyQt5.QtCore import QTimer
+        self.app = app
+        self.window = window
+        self.engine = window.engine
+        self.world = sim_hardware.world()
+        self.orders = orders
+        self.flavor = flavor
+        self.size = size
+        self.gui_stall = gui_stall  # Seconds the GUI thread is blocked, twice a second, while shaving
+
+        self.ticks = []
+        self.ice_errors = []
+        self.stop_latencies = {"threshold": [], "predicted": []}
+        self.stops_without_crossing = 0
+        self.ice_stop = None  # (mode, world time of the stop decision) from the ICE_DONE event
+        self.ice_started = None  # World time the ice stage started
+        self.zeroing_times = []
+        self.settle_times = []
+        self.zeroing_started = None
+        self.ice_done_at = None
+        self.flavor_errors = []
+        self.stop_cue = False
+        self.pour_stop_at = None
+        self.flavor_zero = None
+        self.flavor_measured = False
+        self.order_times = []
+        self.failed_orders = 0
+        self.phase = "start"
+        self.order_start = None
+        self.net_zero = 0.0
+        self.last_stall = 0.0
+
+        # Time the engine's ice-stage ticks by wrapping its tick handler
+        tick = self.engine._tick
+
+        def timed_tick():
+            if self.engine.state == dispense_engine.ICE:
+                self.ticks.append(time.monotonic())
+            elif self.ticks and self.ticks[-1] is not None:
+                self.ticks.append(None)  # Don't count the gap between ice stages as jitter
+            tick()
+        self.engine._tick = timed_tick
+        self.engine.add_listener(self.on_engine_event)
+
+        self.poll = QTimer()
+        self.poll.timeout.connect(self.step)
+        self.poll.start(20)
+
+    def intervals(self):
+        intervals = []
+        for previous, current in zip(self.ticks, self.ticks[1:]):
+            if previous is not None and current is not None:
+                intervals.append(current - previous)
+        return intervals
+
+    def on_engine_event(self, event):
+        now = event["time"]
+        if event["type"] == "settled":
+            self.settle_times.append(now - self.ice_done_at)
+        elif event["type"] == "progress" and event["state"] == dispense_engine.FLAVOR:
+            self.stop_cue = self.stop_cue or event["stop_now"]
+        elif event["type"] != "state":
+            return
+        elif event["state"] == dispense_engine.ZEROING:
+            self.zeroing_started = now
+        elif event["previous"] == dispense_engine.ZEROING:
+            self.zeroing_times.append(now - self.zeroing_started)
+        if event.get("state") == dispense_engine.ICE:
+            self.ice_started = now - self.world.start_time
+        elif event.get("state") == dispense_engine.ICE_DONE:
+            self.ice_done_at = now
+            self.ice_stop = (event["stop"], event["stop_time"] - self.world.start_time)
+
+    def _brake_time(self, after):
+        """World time of the first EN or BRK high write at or after `after`."""
+        with self.world.lock:
+            log = list(self.world.pin_log)
+        for tick, gpio, level in log:
+            t = tick / 1e6
+            if gpio in (sim_hardware.EN_PIN, sim_hardware.BRK_PIN) and level == 1 and t >= after:
+                return t
+        return None
+
+    def record_stop(self):
+        """Stop latency of the finished ice stage, matched against the pin log."""
+        mode, decided = self.ice_stop
+        if mode not in self.stop_latencies or self.ice_started is None:
+            return  # Time-based stage
+        brake = self._brake_time(self.ice_started)
+        trigger = self.world.weight_mark_time if mode == "threshold" else decided
+        if trigger is None:
+            self.stops_without_crossing += 1  # The true weight never reached the threshold
+        elif brake is not None:
+            self.stop_latencies[mode].append(brake - trigger)
+
+    def step(self):
+        w = self.window
+        state = self.engine.state
+        if self.phase == "start":
+            if len(self.order_times) + self.failed_orders >= self.orders:
+                self.poll.stop()
+                self.app.quit()
+                return
+            self.world.clear_scale()
+            self.world.place(15.0)  # Empty cup
+            self.order_start = time.monotonic()
+            w.flavor_dropdown.setCurrentText(self.flavor)
+            w.size_buttons[self.size].setChecked(True)
+            w.start_process()
+            self.phase = "place_cup"
+        elif self.phase == "place_cup" and state == dispense_engine.PLACE_CUP:
+            self.net_zero = self.world.cup_weight
+            self.ice_stop = None
+            self.world.mark_weight(self.net_zero + self.engine.plan.ice_stop_g)
+            w.next_step()  # Zero (once the scale is steady on the cup) and start shaving
+            self.phase = "ice"
+        elif self.phase == "ice":
+            if state == dispense_engine.ICE_DONE:
+                self.phase = "settle"
+                self.settle_until = time.monotonic() + 1.0  # Upper bound if "settled" never comes
+            elif state == dispense_engine.IDLE:
+                self.failed_orders += 1
+                self.phase = "start"
+            elif self.gui_stall and time.monotonic() - self.last_stall >= 0.5:
+                time.sleep(self.gui_stall)  # A busy GUI thread must not delay the motor stop
+                self.last_stall = time.monotonic()
+        elif self.phase == "settle" and (self.engine.settled or time.monotonic() >= self.settle_until):
+            plan = self.engine.plan
+            if self.ice_stop is not None:
+                self.record_stop()
+            if not plan.is_time_based:
+                settled_oz = (self.world.cup_weight - self.net_zero) / GRAMS_PER_OZ
+                self.ice_errors.append(settled_oz - plan.ice_target_oz)
+            w.next_step()  # Zero for flavor, or finish an ice-only plan
+            self.phase = "flavor" if recipe_plan.FLAVOR in plan.stages else "finish"
+        elif self.phase == "flavor" and state == dispense_engine.FLAVOR:
+            now = time.monotonic()
+            if self.flavor_zero is None:
+                self.flavor_zero = self.world.cup_weight
+                self.flavor_measured = False
+                self.stop_cue = False
+                self.pour_stop_at = None
+            if self.pour_stop_at is None and self.stop_cue:
+                self.pour_stop_at = now + self.engine.pour_assistant.reaction_time  # The operator reacts
+            if self.pour_stop_at is None or now < self.pour_stop_at:
+                self.world.pour(grams_per_second=40.0, seconds=0.02)
+            elif now >= self.pour_stop_at + 0.5:  # Syrup settled on the scale
+                if not self.flavor_measured:
+                    self.flavor_measured = True
+                    poured_oz = (self.world.cup_weight - self.flavor_zero) / GRAMS_PER_OZ
+                    self.flavor_errors.append(poured_oz - self.engine.plan.flavor_target_oz)
+                if w.next_button.isVisible() and w.next_button.isEnabled():
+                    w.next_step()  # Flavor done
+                    self.flavor_zero = None
+                    self.phase = "finish"
+                else:
+                    self.world.pour(grams_per_second=5.0, seconds=0.02)  # Top up the last drops
+        elif self.phase == "finish" and state == dispense_engine.FINISH:
+            w.next_step()  # Finish
+            self.phase = "done"
+        elif self.phase == "done" and state == dispense_engine.IDLE:
+            self.order_times.append(time.monotonic() - self.order_start)
+            self.phase = "start"
+
+
+def bench_orders(orders, flavor, size, gui_stall=0.0):
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError as e:
+        return {"skipped": f"PyQt5 not available: {e}"}
+    import main_ui
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = main_ui.MainUI()
+    window.show()
+    driver = OrderDriver(app, window, orders, flavor, size, gui_stall)
+    app.exec_()
+    window.engine.stop()
+    window.motor.stop()
+
+    intervals = driver.intervals()
+    jitter = [abs(i - window.engine.tick_period) for i in intervals]
+    cycle = summarize(driver.order_times)
+    if driver.order_times:
+        cycle["orders_per_min"] = 60.0 / float(np.mean(driver.order_times))
+    ice_error = error_stats(driver.ice_errors)
+    return {
+        "engine_tick_jitter": summarize(jitter),
+        "engine_tick_interval": summarize(intervals),
+        "stop_latency": {mode: summarize(latencies) for mode, latencies in driver.stop_latencies.items()},
+        "stops_without_crossing": driver.stops_without_crossing,
+        "ice_error_oz": ice_error,
+        "flavor_error_oz": error_stats(driver.flavor_errors),
+        "zeroing": summarize(driver.zeroing_times),
+        "ice_settle": summarize(driver.settle_times),
+        "order_cycle": dict(cycle, failed=driver.failed_orders),
+        "gui_stall_ms": gui_stall * 1000.0,
+    }
+
+
+def error_stats(errors):
+    errors = np.asarray(errors, dtype=np.float64)
+    stats = {"n": int(len(errors))}
+    if len(errors):
+        stats.update(mean=float(errors.mean()), mean_abs=float(np.abs(errors).mean()),
+                     max_abs=float(np.abs(errors).max()))
+    return stats
+
+
+def compare(current, previous, path=""):
+    """Print the p50 change of every metric present in both runs."""
+    for key, value in current.items():
+        if key not in previous:
+            continue
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and "p50_ms" in value and "p50_ms" in previous[key]:
+            old, new = previous[key]["p50_ms"], value["p50_ms"]
+            change = (new - old) / old * 100.0 if old else float("inf")
+            print(f"{name:45s} p50 {old:10.3f} ms -> {new:10.3f} ms ({change:+.1f}%)")
+        elif isinstance(value, dict):
+            compare(value, previous[key], name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="calls per latency benchmark")
+    parser.add_argument("--orders", type=int, default=2, help="simulated orders to run (0 to skip)")
+    parser.add_argument("--flavor", default="Caramel Frappe")
+    parser.add_argument("--size", default="Small")
+    parser.add_argument("--gui-stall", type=float, default=0.0, help="ms to block the GUI thread twice a second while shaving")
+    parser.add_argument("--profile", help='speed profile JSON for the benchmarked recipe, e.g. \'{"bulk_speed": 90, "finish_speed": 40}\'')
+    parser.add_argument("--recording", help="replay raw load-cell counts from this file")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    # Work on copies so benchmark runs never touch the machine's calibration or recipes
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    work_dir = tempfile.mkdtemp(prefix="wunderbar-bench-")
+    for name in ("settings.json", "calibration.json"):
+        if os.path.exists(os.path.join(repo_dir, name)):
+            shutil.copy(os.path.join(repo_dir, name), work_dir)
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(work_dir)
+    if args.profile:
+        with open("settings.json") as f:
+            recipes = json.load(f)
+        recipes["sizes"][args.flavor][args.size]["speed_profile"] = json.loads(args.profile)
+        with open("settings.json", "w") as f:
+            json.dump(recipes, f, indent=4)
+
+    world = sim_hardware.world()
+    if args.recording:
+        world.load_recording(args.recording)
+
+    import devices
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "backend": "recorded" if args.recording else "sim",
+        "hx711_rate_hz": world.sample_rate,
+        "weight_read": bench_weight_read(args.iterations),
+        "rpm_read": bench_rpm(max(args.iterations // 50, 2), devices.motor()),
+        "interlock_reaction": bench_interlock(max(args.iterations // 10, 3), devices.motor(), devices.interlock()),
+        "motor_commands": bench_motor_commands(args.iterations, devices.motor()),
+        "jam_detection": bench_jam(max(args.iterations // 20, 3), devices.motor(), devices.events()),
+        "config_edits": bench_config_edits(max(args.iterations // 10, 10)),
+        "config_reload": bench_config_reload(max(args.iterations // 10, 10), devices.load_cell(), devices.motor()),
+        "vibration": bench_vibration(devices.motor(), devices.load_cell()),
+    }
+    if args.orders > 0 and not args.recording:
+        results.update(bench_orders(args.orders, args.flavor, args.size, args.gui_stall / 1000.0))
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+        print(f"[INFO] Benchmark results written to {output}")
+    else:
+        print(text)
+
+    if previous:
+        with open(previous) as f:
+            compare(results, json.load(f))
+    os._exit(0)  # Skip waiting on daemon hardware threads
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import sys
-import json
+import sim_hardware
+sim_hardware.install_if_requested()  # Fake RPi.GPIO, pigpio and hx711 before anything imports them
 import time
 import subprocess  # Import subprocess to launch Onboard
 from PyQt5.QtWidgets import (
@@ -9,7 +10,7 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QDoubleValidator  # Import QDoubleValidator for numeric input
-from hx711_reader import LoadCell  # Import the load cell sensor class
+import devices  # Shared LoadCell
 from ui import WeightDisplay  # Import the WeightDisplay class
 
 
@@ -22,7 +23,7 @@ class CalibrationUI(QWidget):
         self.showMaximized()  # Maximize the window but keep the menu bar visible
 
         # Load Cell Instance
-        self.load_cell = LoadCell()
+        self.load_cell = devices.load_cell()
 
         # UI Components
         self.instructions = QLabel(
@@ -179,15 +180,10 @@ class CalibrationUI(QWidget):
             QMessageBox.warning(self, "Error", "Compute calibration before saving.")
             return
 
-        calibration_data = {
-            "offset": self.offset,
-            "A": self.A,
-            "B": self.B
-        }
-
-        with open("calibration.json", "w") as file:
-            json.dump(calibration_data, file)
-
+        # Merged into calibration.json by the load cell, keeping the other sections
+        self.load_cell.offset = self.offset
+        self.load_cell.A = self.A
+        self.load_cell.B = self.B
         self.load_cell.save_calibration()
         if hasattr(self, 'save_calibration_callback'):
             self.save_calibration_callback()  # Trigger callback to reload calibration
@@ -209,6 +205,11 @@ class CalibrationUI(QWidget):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    if "--interrupt" in sys.argv:
+        # Calibrate the pigpio interrupt stream; its raw counts need their own offset/A/B
+        load_cell = devices.load_cell()
+        load_cell.stop_stream()
+        load_cell.start_stream(mode="interrupt", uncalibrated=True)
     window = CalibrationUI()
     window.show()
     sys.exit(app.exec_())
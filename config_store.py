@@ -0,0 +1,377 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+_lock = threading.Lock()
+_stores = {}  # Absolute path -> ConfigStore
+_watcher = None
+
+_MISSING = object()
+
+
+class Change(namedtuple("Change", [
+        "file",      # Absolute path of the config file
+        "version",   # Store version after the edit; all changes of one edit share it
+        "key",       # Path into the document, e.g. ("sizes", "Mango", "Small", "Ice") or ("offset",)
+        "value",     # New value (a copy), None when removed
+        "removed",   # True when the key was deleted
+])):
+    """One fine-grained config change, as delivered to ConfigStore listeners."""
+    __slots__ = ()
+
+    @property
+    def section(self):
+        """Top-level key the change belongs to."""
+        return self.key[0]
+
+
+def diff(old, new, key=()):
+    """
+    List the (key, value, removed) changes that turn old into new. Dicts are
+    compared key by key, so editing one recipe field yields one change;
+    anything else (lists, numbers) changes as a whole.
+    """
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return [] if old == new else [(key, new, False)]
+    changes = []
+    for k, value in new.items():
+        if k not in old:
+            changes.append((key + (k,), value, False))
+        else:
+            changes.extend(diff(old[k], value, key + (k,)))
+    changes.extend((key + (k,), None, True) for k in old if k not in new)
+    return changes
+
+
+def lookup(data, key, default=None):
+    """Value at a key path, or default."""
+    for k in key:
+        if not isinstance(data, dict) or k not in data:
+            return default
+        data = data[k]
+    return data
+
+
+def apply_change(data, change):
+    """Apply one Change (or (key, value, removed) tuple) to a dict in place."""
+    key, value, removed = change[-3:]
+    parent = data
+    for k in key[:-1]:
+        if not isinstance(parent.get(k), dict):
+            if removed:
+                return
+            parent[k] = {}
+        parent = parent[k]
+    if removed:
+        parent.pop(key[-1], None)
+    else:
+        parent[key[-1]] = copy.deepcopy(value)
+
+
+class ConfigStore:
+    """
+    In-memory copy of one JSON config file (settings.json, calibration.json)
+    shared by every module that reads or writes it.
+
+    Edits change the memory copy at once and never touch the disk on the
+    caller's thread. A writer thread saves the file `delay` seconds after the
+    last edit of a burst (at most `max_delay` after the first), so a spinbox
+    drag or a tare costs one write. Writes go to a temporary file that is
+    fsynced and renamed over the original, so a power cut leaves either the
+    old or the new file, never a truncated one. Edits are merged per
+    top-level section; a section nobody touched is written back unchanged.
+
+    Reads return deep copies, so callers may modify what they get and
+    publish it again with set() or update().
+
+    Every edit that changes something bumps `version` and is delivered to
+    the listeners as a list of fine-grained Change tuples (one recipe field,
+    one calibration value), so running components apply deltas instead of
+    reloading. Listeners run on the editing thread, or on the watcher thread
+    for changes made by another process or an editor (see watch()), in the
+    order they were added. Edits made on disk are merged three-way: only
+    what changed in the file since it was last read or written is applied,
+    so pending in-memory edits survive.
+    """
+
+    def __init__(self, path, default=None, delay=0.5, max_delay=2.0, indent=4):
+        self.path = path
+        self.delay = delay
+        self.max_delay = max_delay
+        self.indent = indent
+        self.writes = 0  # Files written, for diagnostics
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # Serializes file writes and reloads; taken before _lock
+        self._first_edit = None  # Start of the pending burst, None when the file is up to date
+        self._last_edit = None
+        self._writer = None
+        self._listeners = []
+        self.version = 0
+        self._stat = _file_stat(path)
+        self._disk = self._read()  # Document as last read from or written to the file
+        if self._disk is None:
+            self._disk = {}
+            self._data = copy.deepcopy(default) if default is not None else {}
+        else:
+            self._data = copy.deepcopy(self._disk)
+
+    def _read(self):
+        """Parse the file, or None if it is missing or invalid."""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[ERROR] Failed to load {self.path}: {e}")
+            return None
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # --- Reading -------------------------------------------------------------
+
+    def data(self):
+        """Deep copy of the whole document."""
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def get(self, key, default=None):
+        """Deep copy of one top-level section, or default."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return copy.deepcopy(self._data[key])
+
+    # --- Listeners -----------------------------------------------------------
+
+    def add_listener(self, func):
+        """Call func(changes) with the list of Changes of every edit."""
+        with self._lock:
+            self._listeners.append(func)
+
+    def remove_listener(self, func):
+        with self._lock:
+            if func in self._listeners:
+                self._listeners.remove(func)
+
+    def _notify(self, changes, listeners):
+        for listener in listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"[ERROR] Config listener failed: {e}")
+
+    # --- Editing (any thread, never blocks on the disk) ------------------------
+
+    def set(self, key, value):
+        """Replace one top-level section."""
+        self.update({key: value})
+
+    def set_in(self, key, value):
+        """Replace one nested value, e.g. set_in(("sizes", flavor, size, "Ice"), 4.5)."""
+        self._edit(lambda data: apply_change(data, (tuple(key), value, False)))
+
+    def update(self, sections):
+        """Replace several top-level sections at once; other sections are kept."""
+        self._edit(lambda data: data.update(copy.deepcopy(sections)))
+
+    def replace(self, data):
+        """Replace the whole document (e.g. the full settings dict)."""
+        self._edit(lambda old: (old.clear(), old.update(copy.deepcopy(data))))
+
+    def _edit(self, func):
+        with self._lock:
+            data = copy.deepcopy(self._data)
+            func(data)
+            changes = self._commit(diff(self._data, data), data)
+            if changes:
+                self._mark_dirty()
+            listeners = list(self._listeners)
+        if changes:
+            self._notify(changes, listeners)
+
+    def _commit(self, changes, data):
+        """Install data as the new document and return the versioned Changes (lock held)."""
+        if not changes:
+            return []
+        self._data = data
+        self.version += 1
+        return [Change(self.path, self.version, key, copy.deepcopy(value), removed)
+                for key, value, removed in changes]
+
+    def reload(self):
+        """
+        Merge edits made to the file by another process or an editor. Only
+        keys that changed on disk since the last read or write are applied;
+        returns the resulting Changes (already delivered to the listeners).
+        """
+        with self._write_lock:  # Not while our own write is between rename and bookkeeping
+            stat = _file_stat(self.path)
+            if stat == self._stat:
+                return []
+            disk = self._read()  # Outside _lock: editors never wait on the file
+            with self._lock:
+                self._stat = stat
+                if disk is None:
+                    return []  # Deleted or half-written; the next valid save is picked up
+                changes, listeners = self._merge(disk), list(self._listeners)
+        if changes:
+            print(f"[INFO] {os.path.basename(self.path)} changed on disk: {len(changes)} change(s), v{changes[-1].version}")
+            self._notify(changes, listeners)
+        return changes
+
+    def _merge(self, disk):
+        """Apply what changed on disk since the last read or write; returns the Changes (lock held)."""
+        data = copy.deepcopy(self._data)
+        effective = []
+        for key, value, removed in diff(self._disk, disk):
+            current = lookup(data, key, _MISSING)
+            if (current is _MISSING) if removed else current == value:
+                continue
+            apply_change(data, (key, value, removed))
+            effective.append((key, value, removed))
+        self._disk = disk
+        return self._commit(effective, data)
+
+    def _mark_dirty(self):
+        now = time.monotonic()
+        if self._first_edit is None:
+            self._first_edit = now
+        self._last_edit = now
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="config-writer", daemon=True)
+            self._writer.start()
+        self._changed.notify_all()
+
+    # --- Writing -------------------------------------------------------------
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while self._first_edit is None:
+                    self._changed.wait()
+                due = min(self._last_edit + self.delay, self._first_edit + self.max_delay)
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._changed.wait(wait)  # Woken early by new edits, then the deadline moves
+                    continue
+            self._write()
+
+    def save(self):
+        """Schedule a write even if nothing changed (e.g. to create a missing file)."""
+        with self._lock:
+            self._mark_dirty()
+
+    def flush(self):
+        """Write pending edits now, on the calling thread."""
+        self._write()
+
+    def _write(self):
+        """
+        Snapshot the document under the lock, then write, fsync and rename
+        without it, so readers and editors never wait on the SD card. Only
+        one thread writes at a time; the lock is taken again only to record
+        what is now on disk. A failed write leaves the store dirty, and the
+        writer thread tries again `delay` seconds later.
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._first_edit is None:
+                    return
+                text = json.dumps(self._data, indent=self.indent)
+                self._first_edit = self._last_edit = None
+            tmp = f"{self.path}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                _fsync_dir(self.path)
+                stat = _file_stat(self.path)
+            except Exception as e:
+                print(f"[ERROR] Failed to save {self.path}: {e}")
+                with self._lock:
+                    if self._first_edit is None:  # Edits made meanwhile are already scheduled
+                        self._first_edit = self._last_edit = time.monotonic()
+                        self._changed.notify_all()
+                return
+            with self._lock:
+                self._disk = json.loads(text)
+                self._stat = stat  # Our own write is not an external edit
+                self.writes += 1
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _fsync_dir(path):
+    """Persist the rename itself (POSIX); a no-op where directories cannot be opened."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def store(path, default=None):
+    """Return the process-wide ConfigStore for a file, loading it on first use."""
+    key = os.path.abspath(path)
+    with _lock:
+        if key not in _stores:
+            _stores[key] = ConfigStore(key, default)
+        return _stores[key]
+
+
+def watch(interval=1.0):
+    """
+    Start the file watcher (once per process): every `interval` seconds each
+    loaded store checks its file's mtime, size and inode and merges edits
+    made outside this process (see ConfigStore.reload).
+    """
+    global _watcher
+    with _lock:
+        if _watcher is not None:
+            return
+        _watcher = threading.Thread(target=_watch_loop, args=(interval,), name="config-watcher", daemon=True)
+        _watcher.start()
+
+
+def _watch_loop(interval):
+    while True:
+        time.sleep(interval)
+        with _lock:
+            stores = list(_stores.values())
+        for config in stores:
+            try:
+                config.reload()
+            except Exception as e:
+                print(f"[ERROR] Config watcher: {e}")
+
+
+def flush_all():
+    """Write every pending edit. Runs at interpreter exit."""
+    with _lock:
+        stores = list(_stores.values())
+    for config in stores:
+        config.flush()
+
+
+atexit.register(flush_all)
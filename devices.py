@@ -0,0 +1,81 @@
+import threading
+from hx711_reader import LoadCell
+from motor import BLDCMotor
+from interlock import InterlockWatcher
+import hw_events
+
+# BCM pins of the motor driver harness (see README)
+MOTOR_PINS = {"pwm_pin": 5, "speed_pin": 16, "en_pin": 20, "brk_pin": 19}
+
+_lock = threading.Lock()
+_load_cell = None
+_motor = None
+_interlock = None
+_events = None
+
+
+def load_cell():
+    """Return the process-wide LoadCell, creating it and starting its stream on first use."""
+    global _load_cell
+    with _lock:
+        if _load_cell is None:
+            print("[INFO] Creating shared LoadCell...")
+            _load_cell = LoadCell(calibration_factor=0.002965)
+            _load_cell.start_stream()
+        return _load_cell
+
+
+def motor():
+    """Return the process-wide BLDCMotor, creating it on first use."""
+    global _motor
+    with _lock:
+        if _motor is None:
+            print("[INFO] Creating shared BLDCMotor...")
+            _motor = BLDCMotor(**MOTOR_PINS)
+        return _motor
+
+
+def interlock():
+    """Return the process-wide lid InterlockWatcher, started on the shared motor's pigpio session."""
+    global _interlock
+    shared_motor = motor()
+    with _lock:
+        if _interlock is None:
+            _interlock = InterlockWatcher(shared_motor)
+        _interlock.ensure_started()
+        return _interlock
+
+
+def events():
+    """Return the process-wide HardwareEventBus. A driver fault brakes the motor from the ALM edge."""
+    global _events
+    shared_motor = motor()
+    watcher = interlock()
+    with _lock:
+        if _events is None:
+            _events = hw_events.HardwareEventBus(shared_motor, watcher)
+            _events.subscribe(lambda event: shared_motor.emergency_brake(), types=(hw_events.FAULT,))
+            _events.start()
+        return _events
+
+
+def shutdown():
+    """Stop the motor and release all hardware. Call once when the application exits."""
+    global _load_cell, _motor, _interlock, _events
+    with _lock:
+        if _events is not None:
+            _events.stop()
+            _events = None
+        if _interlock is not None:
+            _interlock.cancel()
+            _interlock = None
+        if _motor is not None:
+            try:
+                _motor.shutdown()
+            except Exception as e:
+                print(f"[WARNING] Error stopping motor during shutdown: {e}")
+        _motor = None
+        if _load_cell is not None:
+            _load_cell.stop()
+            _load_cell = None
+    print("[INFO] Hardware released.")
@@ -0,0 +1,559 @@
+import queue
+import threading
+import time
+import config_store
+import hw_events
+import settings
+from flow_predictor import FlowRatePredictor
+from overshoot_learning import OvershootLearner
+from pour_assist import PourAssistant
+from recipe_plan import RecipeError, compile_plan, compile_plans
+from stability import StabilityDetector
+
+# Conversion: 1 oz ≈ 28.35 grams
+GRAMS_TO_OZ = 1 / 28.35
+
+# Order states
+IDLE = "idle"
+PLACE_CUP = "place_cup"  # Waiting for the cup and Next
+ZEROING = "zeroing"      # Zeroing the cup (before Ice) or the ice (before Flavor)
+ICE = "ice"              # Rotor running until the Ice target or the recipe time
+ICE_DONE = "ice_done"    # Rotor stopped, ice settling, waiting for Next
+FLAVOR = "flavor"        # Operator adds flavor up to the Flavor target
+FINISH = "finish"        # Waiting for Finish
+
+ALL_STATES = (IDLE, PLACE_CUP, ZEROING, ICE, ICE_DONE, FLAVOR, FINISH)
+
+
+class DispenseEngine:
+    """
+    Runs the order state machine (place cup -> zero -> ice -> zero -> flavor
+    -> finish) and all of its hardware timing on its own thread, so a busy
+    GUI never delays a motor stop. Front ends only send commands (start_order,
+    next, resume, abort) and render the events the engine publishes to its
+    listeners. Every event is a dict:
+
+        {"type": "state", "state": new state, "previous": old state, "time": monotonic s, ...}
+        {"type": "progress", "state", "weight_oz", "target_oz", "target_reached", "elapsed", "target_time",
+         "pour_rate", "eta", "stop_now", "time"}
+        {"type": "interrupted", "state", "time"}     lid open; call resume() once the operator closed it
+        {"type": "settled", "state", "weight_oz", "time"}  the ice stopped falling (ICE_DONE), Next is safe
+        {"type": "failed", "title", "reason", "time"}  order cancelled, the engine is IDLE again
+
+    A ZEROING state event carries "stage" (ICE or FLAVOR, the state that
+    follows). An ICE_DONE state event carries "stop" ("predicted",
+    "threshold" or "time": what ended the ice stage) and "stop_time" (the
+    monotonic time of that decision, before the motor was told to stop). ZEROING lasts until the StabilityDetector reports a steady
+    scale, or at most zero_settle_time seconds. Listeners run on the engine
+    thread; Qt front ends forward the events through a signal.
+
+    While the operator pours flavor, progress events come every
+    pour_progress_period (display refresh) and carry the PourAssistant's
+    guidance: "pour_rate" (oz/s), "eta" (seconds until the operator should
+    stop, None while not pouring) and "stop_now". Other states send None,
+    None and False.
+
+    Recipes are compiled into DispensePlans (recipe_plan.py) when the engine
+    is created and whenever the settings or the overshoot table change, so
+    an invalid recipe is rejected by start_order() before any hardware moves.
+    While running, the engine listens to the settings and calibration stores
+    (config_store.py): a recipe edit recompiles only that recipe, a rotor
+    setting edit recompiles all of them, and edited ice_cutoff, stability or
+    pour_assist sections are rebuilt on the engine thread. A running order
+    keeps the plan it started with.
+    """
+
+    def __init__(self, load_cell, motor, app_settings, events=None, tick_period=0.02, progress_period=0.1,
+                 pour_progress_period=1 / 60, zero_settle_time=0.5, cal_file="calibration.json"):
+        self.load_cell = load_cell
+        self.motor = motor
+        self.app_settings = app_settings
+        self.events = events
+        self.tick_period = tick_period  # Seconds between weight checks during the ice stage
+        self.progress_period = progress_period  # Seconds between progress events
+        self.pour_progress_period = pour_progress_period  # Seconds between progress events while pouring flavor
+        self.zero_settle_time = zero_settle_time  # Longest wait for a steady scale before zeroing anyway
+        self.cal_file = cal_file
+
+        self.state = IDLE
+        self.flavor = None
+        self.size = None
+        self.plan = None  # DispensePlan of the running order
+        self.recipe = {}
+        self.motor_stopped = False
+        self.paused = False  # Ice stage halted by the lid interlock
+        self.ice_started = None  # time.monotonic() when the rotor started
+        self.ice_stop_weight = None  # Weight (oz) when the motor was stopped on weight, else None
+        self.ice_stop_predicted = False  # Last ice_target_reached() decision came from the flow predictor
+        self.ice_stop_fit = None  # Predictor's (fitted weight oz, rate oz/s) at a predicted stop, else None
+        self.settled = False  # Scale steady since entering the current state
+        self.original_offset = load_cell.offset
+        self.overshoot_learner = OvershootLearner(cal_file)
+        self.flow_predictor = FlowRatePredictor.from_config(self.load_ice_cutoff())
+        self.stability = StabilityDetector.from_config(self._load_cal_section("stability"))
+        self.pour_assistant = PourAssistant.from_config(self._load_cal_section("pour_assist"))
+        load_cell.set_rotor_source(lambda: motor.rpm)  # Notch the rotor vibration out of the ice-stage weights
+
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._plans_lock = threading.Lock()
+        self.plans = {}  # (flavor, size) -> DispensePlan
+        self.plan_errors = {}  # (flavor, size) -> RecipeError
+        self.settings_version = settings.store().version  # Config versions the plans reflect
+        self.calibration_version = config_store.store(cal_file).version
+        self.compile_recipes()
+        self._commands = queue.Queue()
+        self._thread = None
+        self._running = False
+        self._last_progress = 0.0
+        self._progress_state = None
+        self._zero_stage = None  # State that follows ZEROING
+        self._zero_started = None
+
+    # --- Listeners -----------------------------------------------------------
+
+    def add_listener(self, func):
+        with self._lock:
+            self._listeners.append(func)
+
+    def remove_listener(self, func):
+        with self._lock:
+            if func in self._listeners:
+                self._listeners.remove(func)
+
+    def _publish(self, event_type, **data):
+        event = {"type": event_type, "time": time.monotonic()}
+        event.update(data)
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[ERROR] Dispense listener failed: {e}")
+        return event
+
+    # --- Commands (any thread) ----------------------------------------------
+
+    def start_order(self, flavor, size):
+        """
+        Begin an order. Raises RecipeError (a ValueError) if the recipe does
+        not exist or failed to compile; otherwise the engine moves to
+        PLACE_CUP and waits for next().
+        """
+        plan = self.plans.get((flavor, size))
+        if plan is None:
+            raise RecipeError(str(self.plan_errors.get((flavor, size), f"Recipe not found: {flavor} / {size}")))
+        self._commands.put(("start", (plan,)))
+
+    def next(self):
+        """Operator pressed Next (or Finish)."""
+        self._commands.put(("next", ()))
+
+    def resume(self):
+        """Restart the rotor after an interlock stop, if the lid is closed again."""
+        self._commands.put(("resume", ()))
+
+    def abort(self):
+        """Stop the motor, restore the scale offset and return to IDLE."""
+        self._commands.put(("abort", ()))
+
+    def update_settings(self, app_settings):
+        """Recompile the recipes; the new plans and rotor settings apply from the next order on."""
+        self.app_settings = app_settings
+        self.compile_recipes()
+
+    def recompile_recipes(self, keys):
+        """Recompile only the given (flavor, size) recipes; removed recipes are dropped."""
+        with self._plans_lock:
+            plans, errors = dict(self.plans), dict(self.plan_errors)
+            for flavor, size in keys:
+                plans.pop((flavor, size), None)
+                errors.pop((flavor, size), None)
+                recipe = self.app_settings.get("sizes", {}).get(flavor, {}).get(size)
+                if recipe is None:
+                    continue
+                try:
+                    plans[(flavor, size)] = compile_plan(flavor, size, recipe, self.app_settings,
+                                                         self.overshoot_learner.compensation)
+                except RecipeError as e:
+                    errors[(flavor, size)] = e
+                    print(f"[WARNING] Recipe {flavor} / {size} cannot be dispensed: {e}")
+            self.plans, self.plan_errors = plans, errors
+
+    def _on_settings_changed(self, changes):
+        """settings.json deltas (any thread): recompile what they touch; orders already running keep their plan."""
+        self.app_settings = settings.store().data()
+        self.settings_version = changes[-1].version
+        keys = set()
+        for change in changes:
+            if change.section != "sizes":
+                if change.section in ("rotor_speed", "speed_mode"):
+                    self.compile_recipes()
+                    return
+            elif len(change.key) >= 3:
+                keys.add(change.key[1:3])
+            else:
+                # A whole flavor (or all of them) added or removed
+                flavors = [change.key[1]] if len(change.key) == 2 else list(self.app_settings.get("sizes", {}))
+                keys.update(key for key in self.plans.keys() | self.plan_errors.keys() if key[0] in flavors)
+                for flavor in flavors:
+                    keys.update((flavor, size) for size in self.app_settings.get("sizes", {}).get(flavor, {}))
+        self.recompile_recipes(keys)
+
+    def compile_recipes(self, report=True):
+        """Compile settings.json and the overshoot table into dispense plans."""
+        with self._plans_lock:
+            plans, errors = compile_plans(self.app_settings, self.overshoot_learner.compensation)
+            self.plans, self.plan_errors = plans, errors
+        if report:
+            for (flavor, size), error in errors.items():
+                print(f"[WARNING] Recipe {flavor} / {size} cannot be dispensed: {error}")
+
+    # --- Thread --------------------------------------------------------------
+
+    def start(self):
+        if self.events is not None:
+            self.events.subscribe(self._on_hardware_event, types=(hw_events.STALL, hw_events.JAM))
+        settings.store().add_listener(self._on_settings_changed)
+        config_store.store(self.cal_file).add_listener(self._on_calibration_changed)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self.events is not None:
+            self.events.unsubscribe(self._on_hardware_event)
+        settings.store().remove_listener(self._on_settings_changed)
+        config_store.store(self.cal_file).remove_listener(self._on_calibration_changed)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _on_hardware_event(self, event):
+        self._commands.put(("hardware", (event,)))
+
+    def _on_calibration_changed(self, changes):
+        self._commands.put(("calibration", (changes,)))
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._running:
+            try:
+                command, args = self._commands.get(timeout=max(next_tick - time.monotonic(), 0.0))
+            except queue.Empty:
+                command = None
+            try:
+                if command is not None:
+                    getattr(self, f"_do_{command}")(*args)
+                now = time.monotonic()
+                if now >= next_tick:
+                    next_tick = max(next_tick + self.tick_period, now)
+                    self._tick()
+            except Exception as e:
+                print(f"[ERROR] Dispense engine: {e}")
+                self._fail("Error", str(e))
+
+    def _set_state(self, state, **data):
+        previous, self.state = self.state, state
+        self.settled = False
+        self.stability.reset()
+        print(f"[INFO] Dispense state: {previous} -> {state}")
+        self._publish("state", state=state, previous=previous, **data)
+
+    def _fail(self, title, reason):
+        print(f"[ERROR] Order failed: {reason}")
+        self._stop_motor()
+        self._restore_offset()
+        self._set_state(IDLE)
+        self._publish("failed", title=title, reason=reason)
+
+    # --- Command handlers (engine thread) --------------------------------------
+
+    def _do_start(self, plan):
+        if self.state != IDLE:
+            print(f"[WARNING] Order already running ({self.state}); start ignored.")
+            return
+        self.plan = plan
+        self.flavor, self.size, self.recipe = plan.flavor, plan.size, plan.recipe
+        self.motor_stopped = False
+        self.paused = False
+        self.ice_stop_weight = None
+        self.ice_stop_fit = None
+        self.original_offset = self.load_cell.offset  # Save the original offset before zeroing
+
+        print(f"[INFO] Starting order:")
+        print(f"  Flavor: {plan.flavor}")
+        print(f"  Size: {plan.size}")
+        print(f"  Rotor Speed: {settings.format_speed(self.app_settings)}")
+        if plan.is_time_based:
+            print(f"  Time-Based Recipe: Yes")
+            print(f"  Speed-Time Mapping: {plan.recipe.get('speed_time_mapping', {})}")
+            print(f"  Mapped Time: {plan.ice_time:.2f} seconds")
+        else:
+            print(f"  Time-Based Recipe: No")
+            print(f"  Recipe Details: {plan.recipe}")
+            print(f"  Ice Stop Threshold: {plan.ice_stop_g * GRAMS_TO_OZ:.2f} oz")
+        self._set_state(PLACE_CUP)
+
+    def _do_next(self):
+        if self.state == PLACE_CUP:
+            self._start_ice()
+        elif self.state in (ICE, ICE_DONE):
+            if FLAVOR in self.plan.stages:
+                self._start_flavor()
+            else:  # Ice-only recipe
+                self._stop_motor()
+                self.learn_overshoot(self.load_cell.get_weight() * GRAMS_TO_OZ)
+                self._set_state(FINISH)
+        elif self.state == FLAVOR:
+            self._set_state(FINISH)
+        elif self.state == FINISH:
+            self._restore_offset()
+            self._set_state(IDLE)
+
+    def _do_resume(self):
+        if self.state != ICE or not self.paused:
+            return
+        if self.motor.interlock_triggered():
+            self._publish("interrupted", state=self.state)
+            return
+        if self.motor.start():
+            self.start_rotor()
+            self.paused = False
+
+    def _do_abort(self):
+        if self.state == IDLE:
+            return
+        print("[INFO] Order aborted.")
+        self._stop_motor()
+        self._restore_offset()
+        self._set_state(IDLE)
+
+    def _do_calibration(self, changes):
+        """Apply calibration.json deltas between ticks."""
+        self.calibration_version = changes[-1].version
+        sections = {change.section for change in changes}
+        if "ice_cutoff" in sections:
+            self.flow_predictor = FlowRatePredictor.from_config(self.load_ice_cutoff())
+        if "stability" in sections:
+            self.stability = StabilityDetector.from_config(self._load_cal_section("stability"))
+        if "pour_assist" in sections:
+            self.pour_assistant = PourAssistant.from_config(self._load_cal_section("pour_assist"))
+        if "overshoot_compensation" in sections:
+            self.compile_recipes(report=False)  # The learner already holds the new table
+        print(f"[INFO] Calibration v{self.calibration_version} applied: {', '.join(sorted(sections))}")
+
+    def _do_hardware(self, event):
+        """A STALL or JAM while the rotor shaves fails the order at once."""
+        if self.state != ICE or self.motor_stopped or self.paused:
+            return
+        if event["type"] == hw_events.STALL:
+            reason = f"The rotor stopped turning at {event['duty']:.0f}% duty."
+        elif event["expected_rpm"] is None:  # No duty->RPM map yet, the fixed floor tripped
+            reason = (f"The rotor slowed to {event['rpm']:.0f} RPM, below {event['min_rpm']:.0f} RPM "
+                      f"at {event['duty']:.0f}% duty.")
+        else:
+            reason = (f"The rotor slowed to {event['rpm']:.0f} RPM, expected {event['expected_rpm']:.0f} RPM "
+                      f"at {event['duty']:.0f}% duty.")
+        self._fail("Ice Jam", f"{reason} The order was cancelled. Clear the ice block before the next order.")
+
+    def _start_ice(self):
+        if self.motor.interlock_triggered():
+            self.motor.check_interlock_and_stop()
+            self._publish("interrupted", state=self.state)
+            return
+        self._start_zeroing(ICE)
+
+    def _start_zeroing(self, stage):
+        """Enter ZEROING; _zeroing_tick zeroes the scale once it is steady and moves on to `stage`."""
+        self._zero_stage = stage
+        self._zero_started = time.monotonic()
+        self._set_state(ZEROING, stage=stage)
+
+    def _zeroing_tick(self):
+        weight_g = self.load_cell.get_weight()
+        waited = time.monotonic() - self._zero_started
+        if not self._scale_settled(weight_g):
+            if waited < self.zero_settle_time:
+                return
+            print(f"[INFO] Scale not steady after {waited:.2f}s; zeroing anyway.")
+        current_weight_oz = weight_g * GRAMS_TO_OZ
+        if self._zero_stage == FLAVOR:
+            self.learn_overshoot(current_weight_oz)
+        self.load_cell.zero(current_weight_oz)
+        if self._zero_stage == ICE:
+            self._run_ice()
+        else:
+            self.pour_assistant.reset()
+            self._set_state(FLAVOR)
+
+    def _scale_settled(self, weight_g):
+        """Feed the stability detector (streamed window, or this tick's weight) and return its verdict."""
+        if self.load_cell.streaming:
+            return self.stability.update_window(*self.load_cell.recent_weights())
+        return self.stability.add(time.monotonic(), weight_g)
+
+    def _run_ice(self):
+        self.flow_predictor.reset()
+        self.motor_stopped = False
+        self.paused = False
+        if not self.motor.start():
+            self._set_state(PLACE_CUP)
+            self._publish("interrupted", state=self.state)
+            return
+        try:
+            self.start_rotor()
+        except RuntimeError as e:
+            self._fail("Speed Map", f"{e} Learn the speed map in Motor Settings.")
+            return
+        self.ice_started = time.monotonic()
+        self._set_state(ICE)
+
+    def _start_flavor(self):
+        self._stop_motor()
+        self._start_zeroing(FLAVOR)  # Learn the overshoot and zero once the ice has settled
+
+    def _stop_motor(self):
+        try:
+            self.motor.stop()
+        except Exception as e:
+            print("[WARNING] Error stopping motor:", e)
+        self.motor_stopped = True
+
+    def _restore_offset(self):
+        self.load_cell.offset = self.original_offset
+        print(f"[INFO] Offset reset to original value: {self.original_offset:.2f}")
+
+    # --- Periodic work (engine thread) ---------------------------------------
+
+    def _tick(self):
+        if self.state == ICE:
+            self._ice_tick()
+        elif self.state == ZEROING:
+            self._zeroing_tick()
+        elif self.state == ICE_DONE:
+            weight_g = self.load_cell.get_weight()
+            if not self.settled and self._scale_settled(weight_g):
+                self.settled = True
+                self._publish("settled", state=self.state, weight_oz=weight_g * GRAMS_TO_OZ)
+            self._publish_progress(weight_g * GRAMS_TO_OZ, self.plan.ice_target_oz)
+        elif self.state == FLAVOR:
+            self._flavor_tick()
+
+    def _ice_tick(self):
+        motor = self.motor
+        motor.check_interlock_and_stop()  # Backstop for the interlock watcher
+        if motor.was_interrupted:
+            motor.was_interrupted = False
+            self.paused = True
+            self._publish("interrupted", state=self.state)
+        if self.paused:
+            return
+
+        plan = self.plan
+        weight_g = self.load_cell.get_weight()
+        weight_oz = weight_g * GRAMS_TO_OZ
+        elapsed = time.monotonic() - self.ice_started
+        if plan.is_time_based:
+            if elapsed >= plan.ice_time:
+                decided = time.monotonic()
+                self._stop_motor()
+                self._set_state(ICE_DONE, stop="time", stop_time=decided)
+            self._publish_progress(weight_oz, plan.ice_target_oz, elapsed=elapsed, target_time=plan.ice_time)
+            return
+
+        if self.ice_target_reached(weight_g):
+            decided = time.monotonic()
+            self._stop_motor()
+            self.ice_stop_weight = weight_oz
+            predictor = self.flow_predictor
+            self.ice_stop_fit = ((predictor.current * GRAMS_TO_OZ, predictor.rate * GRAMS_TO_OZ)
+                                 if self.ice_stop_predicted else None)
+            self._set_state(ICE_DONE, stop="predicted" if self.ice_stop_predicted else "threshold",
+                            stop_time=decided)
+        self._publish_progress(weight_oz, plan.ice_target_oz, elapsed=elapsed)
+
+    def _flavor_tick(self):
+        weight_g = self.load_cell.get_weight()
+        assistant = self.pour_assistant
+        if self.load_cell.streaming:
+            assistant.update_window(*self.load_cell.recent_weights())
+        else:
+            assistant.add(time.monotonic(), weight_g)
+        target_g = self.plan.flavor_target_g
+        eta = assistant.time_to_stop(target_g)
+        self._publish_progress(weight_g * GRAMS_TO_OZ, self.plan.flavor_target_oz,
+                               target_reached=weight_g >= target_g,
+                               pour_rate=assistant.rate * GRAMS_TO_OZ if assistant.pouring else 0.0,
+                               eta=eta, stop_now=assistant.stop_now(target_g))
+
+    def _publish_progress(self, weight_oz, target_oz, target_reached=None, elapsed=None, target_time=None,
+                          pour_rate=None, eta=None, stop_now=False):
+        now = time.monotonic()
+        period = self.pour_progress_period if self.state == FLAVOR else self.progress_period
+        if self.state == self._progress_state and now - self._last_progress < period:
+            return  # The first update of a state is always sent
+        self._last_progress, self._progress_state = now, self.state
+        if target_reached is None:
+            target_reached = self.state == ICE_DONE
+        self._publish("progress", state=self.state, weight_oz=weight_oz, target_oz=target_oz,
+                      target_reached=target_reached, elapsed=elapsed, target_time=target_time,
+                      pour_rate=pour_rate, eta=eta, stop_now=stop_now)
+
+    # --- Ice stage decisions ---------------------------------------------------
+
+    def load_ice_cutoff(self):
+        """Load the predictive ice cut-off settings (stop delay, fit window) from calibration.json."""
+        return self._load_cal_section("ice_cutoff")
+
+    def _load_cal_section(self, key):
+        return config_store.store(self.cal_file).get(key, {})
+
+    def ice_target_reached(self, weight_g):
+        """
+        Decide whether to stop the rotor. Uses the predicted settled weight from the
+        flow rate, and falls back to the plan's static stop threshold (target minus
+        the learned overshoot) until the predictor has enough samples.
+        """
+        if self.load_cell.streaming:
+            # Raw weights until the notch has a full block at steady speed: a spin-up fit is not trustworthy
+            self.flow_predictor.update_window(*self.load_cell.recent_weights(notch=self.load_cell.notch.ready))
+        else:
+            self.flow_predictor.add(time.monotonic(), weight_g)
+
+        self.ice_stop_predicted = self.flow_predictor.ready
+        if self.ice_stop_predicted:
+            return self.flow_predictor.should_stop(self.plan.ice_target_g)
+        return weight_g >= self.plan.ice_stop_g
+
+    def start_rotor(self):
+        """Run the rotor with the plan's speed profile, or at the global rotor_speed."""
+        speed_mode = self.app_settings.get("speed_mode", "duty")
+        if self.plan.speed_profile is not None:
+            self.motor.run_profile(self.plan.speed_profile, self.ice_progress, speed_mode)
+        else:
+            self.motor.run_at(self.plan.rotor_speed, speed_mode)
+
+    def ice_progress(self):
+        """Filled fraction of the Ice target; polled by the motor's profile thread."""
+        if self.plan.ice_target_g <= 0:
+            return 1.0
+        return self.load_cell.get_weight() / self.plan.ice_target_g
+
+    def learn_overshoot(self, settled_weight_oz):
+        """
+        Feed the settled ice weight back into whichever cut-off stopped the
+        motor: the per-speed overshoot table for a threshold stop, the flow
+        predictor's stop_delay for a predicted one. The plans and the
+        predictor follow the calibration change event (_do_calibration).
+        """
+        if self.ice_stop_weight is None:
+            return  # Time-based or interrupted stage: nothing to learn from
+        if self.ice_stop_fit is not None:
+            fitted_oz, rate_oz = self.ice_stop_fit
+            self.overshoot_learner.record_stop_delay(fitted_oz, rate_oz, settled_weight_oz)
+        else:
+            self.overshoot_learner.record(self.plan.stop_speed, self.ice_stop_weight, settled_weight_oz)
+        self.ice_stop_weight = self.ice_stop_fit = None
@@ -0,0 +1,110 @@
+# --- dispense_qt.py ---
+
+from PySide6.QtCore import QObject, Signal, Property, Slot
+import devices
+import dispense_engine
+from dispense_engine import DispenseEngine
+from recipe_plan import RecipeError
+
+
+class DispenseController(QObject):
+    """QML front end of the DispenseEngine: slots send commands, properties mirror its events."""
+    stateChanged = Signal()
+    progressChanged = Signal()
+    interrupted = Signal()  # Cover opened during the ice stage; call resume() once it is closed
+    settled = Signal()  # The ice stopped falling after the rotor stopped
+    orderFailed = Signal(str, str)  # Title, reason
+    _engineEvent = Signal(object)  # Internal: marshals engine events onto the GUI thread
+
+    def __init__(self, app_settings, parent=None):
+        super().__init__(parent)
+        self._state = dispense_engine.IDLE
+        self._weight = 0.0  # oz
+        self._target = 0.0  # oz
+        self._target_reached = False
+        self._elapsed = 0.0
+        self._pour_rate = 0.0  # oz/s while pouring flavor
+        self._eta = -1.0  # Seconds until the operator should stop pouring, -1 while not pouring
+        self._stop_now = False
+        self._engineEvent.connect(self._on_engine_event)
+        self.engine = DispenseEngine(devices.load_cell(), devices.motor(), app_settings, events=devices.events())
+        self.engine.add_listener(self._engineEvent.emit)
+        self.engine.start()
+
+    def _on_engine_event(self, event):
+        if event["type"] == "state":
+            self._state = event["state"]
+            self.stateChanged.emit()
+        elif event["type"] == "progress":
+            self._weight = max(event["weight_oz"], 0.0)
+            self._target = event["target_oz"]
+            self._target_reached = event["target_reached"]
+            self._elapsed = event["elapsed"] or 0.0
+            self._pour_rate = event["pour_rate"] or 0.0
+            self._eta = event["eta"] if event["eta"] is not None else -1.0
+            self._stop_now = event["stop_now"]
+            self.progressChanged.emit()
+        elif event["type"] == "settled":
+            self.settled.emit()
+        elif event["type"] == "interrupted":
+            self.interrupted.emit()
+        elif event["type"] == "failed":
+            self.orderFailed.emit(event["title"], event["reason"])
+
+    @Slot(str, str, result=bool)
+    def startOrder(self, flavor, size):
+        try:
+            self.engine.start_order(flavor, size)
+            return True
+        except RecipeError as e:
+            print(f"[ERROR] Cannot start order: {e}")
+            self.orderFailed.emit("Recipe Error", str(e))
+            return False
+
+    @Slot()
+    def next(self):
+        self.engine.next()
+
+    @Slot()
+    def resume(self):
+        self.engine.resume()
+
+    @Slot()
+    def abort(self):
+        self.engine.abort()
+
+    def stop(self):
+        self.engine.stop()
+
+    def get_state(self):
+        return self._state
+
+    def get_weight(self):
+        return self._weight
+
+    def get_target(self):
+        return self._target
+
+    def get_target_reached(self):
+        return self._target_reached
+
+    def get_elapsed(self):
+        return self._elapsed
+
+    def get_pour_rate(self):
+        return self._pour_rate
+
+    def get_eta(self):
+        return self._eta
+
+    def get_stop_now(self):
+        return self._stop_now
+
+    state = Property(str, fget=get_state, notify=stateChanged)
+    weight = Property(float, fget=get_weight, notify=progressChanged)
+    target = Property(float, fget=get_target, notify=progressChanged)
+    targetReached = Property(bool, fget=get_target_reached, notify=progressChanged)
+    elapsed = Property(float, fget=get_elapsed, notify=progressChanged)
+    pourRate = Property(float, fget=get_pour_rate, notify=progressChanged)
+    eta = Property(float, fget=get_eta, notify=progressChanged)
+    stopNow = Property(bool, fget=get_stop_now, notify=progressChanged)
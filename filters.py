@@ -0,0 +1,373 @@
+import threading
+import time
+import numpy as np
+
+# Filters operate on NumPy windows of calibrated weight samples. Each filter takes
+# (timestamps, values) arrays and returns a filtered array of the same length, so
+# they can be chained. Configuration lives in calibration.json under "filter":
+#
+#   "filter": {
+#       "chain": ["median", "kalman"],
+#       "window": 20,
+#       "median": {"window": 5, "mad_threshold": 3.5},
+#       "ema": {"alpha": 0.3},
+#       "kalman": {"process_noise": 5.0, "measurement_noise": 0.05}
+#   }
+#
+# An empty chain keeps the plain arithmetic mean.
+#
+# The rotor-synchronous NotchFilter is not part of the chain: LoadCell runs it
+# first, on every streamed window, while the rotor turns. It is configured
+# under "notch", e.g. {"harmonics": 2, "cycles": 4, "min_rpm": 120, "fit_samples": 48}.
+
+
+class MedianFilter:
+    """Rolling median with MAD outlier rejection. Spikes are replaced by the local median."""
+    name = "median"
+    estimate = "mean"  # Cleaned samples are averaged for the final reading
+
+    def __init__(self, window=5, mad_threshold=3.5):
+        if window < 1:
+            raise ValueError("Median window must be at least 1.")
+        self.window = int(window)
+        self.mad_threshold = mad_threshold
+
+    def apply(self, times, values):
+        if len(values) < 3:
+            return values
+        w = min(self.window, len(values))
+        half = w // 2
+        padded = np.pad(values, (half, w - 1 - half), mode="edge")
+        windows = np.lib.stride_tricks.sliding_window_view(padded, w)
+        medians = np.median(windows, axis=1)
+        deviations = np.abs(values - medians)
+        mad = np.median(deviations)
+        if mad == 0:
+            return values
+        outliers = deviations > self.mad_threshold * 1.4826 * mad
+        return np.where(outliers, medians, values)
+
+    def lag_samples(self):
+        return 0.0
+
+
+class EMAFilter:
+    """Exponential moving average, evaluated as a truncated convolution."""
+    name = "ema"
+    estimate = "last"
+
+    def __init__(self, alpha=0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError("EMA alpha must be in (0, 1].")
+        self.alpha = alpha
+
+    def apply(self, times, values):
+        if len(values) == 0 or self.alpha == 1:
+            return values
+        decay = 1.0 - self.alpha
+        length = min(len(values), int(np.ceil(np.log(1e-6) / np.log(decay))) + 1)
+        kernel = self.alpha * decay ** np.arange(length)
+        kernel /= kernel.sum()
+        padded = np.concatenate([np.full(length - 1, values[0]), values])
+        return np.convolve(padded, kernel, mode="valid")
+
+    def lag_samples(self):
+        return (1.0 - self.alpha) / self.alpha
+
+
+class KalmanFilter:
+    """
+    1-D constant-rate Kalman filter with state [weight, weight rate].
+
+    The state is kept between calls: each window only runs the samples newer
+    than the last one seen, and the older samples get the estimates already
+    computed for them, so a streaming read costs one or two updates instead
+    of a pass over the whole window. A gap of more than `reset_gap` seconds,
+    time going backwards or reset() (LoadCell calls it when the offset
+    changes) starts the filter again from the next sample.
+    """
+    name = "kalman"
+    estimate = "last"
+
+    def __init__(self, process_noise=5.0, measurement_noise=0.05, reset_gap=0.5, history=256):
+        self.process_noise = process_noise  # Rate change variance, (g/s^2)^2
+        self.measurement_noise = measurement_noise  # Sample variance, g^2
+        self.reset_gap = reset_gap  # Seconds without samples after which the state is stale
+        self.history = int(history)  # Estimates kept for samples that reappear in later windows
+        self._lock = threading.Lock()  # get_weight() may run on several threads
+        self.reset()
+
+    def reset(self):
+        self.rate = 0.0  # Weight rate (g/s) after the newest sample
+        self._state = None  # (weight, rate, P00, P01, P11)
+        self._last_time = None
+        self._times = np.empty(0)
+        self._estimates = np.empty(0)
+
+    def apply(self, times, values):
+        n = len(values)
+        if n == 0:
+            return values
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            new = 0
+            if self._last_time is not None:
+                new = int(np.searchsorted(times, self._last_time, side="right"))
+                if times[-1] < self._last_time or (new < n and times[new] - self._last_time > self.reset_gap):
+                    self.reset()
+                    new = 0
+
+            out = np.empty(n)
+            if new:
+                # Samples seen before: reuse their estimates (raw values if they fell out of the history)
+                out[:new] = values[:new]
+                if len(self._times):
+                    idx = np.minimum(np.searchsorted(self._times, times[:new]), len(self._times) - 1)
+                    known = self._times[idx] == times[:new]
+                    out[:new][known] = self._estimates[idx[known]]
+
+            r = self.measurement_noise
+            q = self.process_noise
+            for i in range(new, n):
+                if self._state is None:
+                    x0, x1, p00, p01, p11 = values[i], 0.0, r, 0.0, 100.0
+                else:
+                    x0, x1, p00, p01, p11 = self._state
+                    dt = max(times[i] - self._last_time, 1e-4)
+                    # Predict
+                    x0 += dt * x1
+                    p00 += 2 * dt * p01 + dt * dt * p11 + q * dt ** 4 / 4
+                    p01 += dt * p11 + q * dt ** 3 / 2
+                    p11 += q * dt * dt
+                    # Update with the weight measurement
+                    s = p00 + r
+                    k0, k1 = p00 / s, p01 / s
+                    innovation = values[i] - x0
+                    x0 += k0 * innovation
+                    x1 += k1 * innovation
+                    p00, p01, p11 = p00 - k0 * p00, p01 - k0 * p01, p11 - k1 * p01
+                self._state = (x0, x1, p00, p01, p11)
+                self._last_time = times[i]
+                out[i] = x0
+
+            if new < n:
+                self.rate = float(self._state[1])
+                self._times = np.concatenate([self._times, times[new:]])[-self.history:]
+                self._estimates = np.concatenate([self._estimates, out[new:]])[-self.history:]
+        return out
+
+    def lag_samples(self):
+        return 0.0  # The rate state tracks constant-rate ramps without steady-state lag
+
+
+class NotchFilter:
+    """
+    Removes rotor vibration from the weight stream, synchronously with the
+    live rotor speed (BLDCMotor.rpm from the GPIO-16 speed pulses).
+
+    The window is cut into blocks of `cycles` rotor revolutions. In each
+    block a least-squares fit of a weight trend plus sine/cosine pairs at
+    the rotor frequency and its first `harmonics` multiples is made, and
+    only the sinusoids are subtracted: a comb notch that follows the rotor
+    speed, adds no lag and works on irregular sample times. The pairs are
+    also multiplied by time, so a few percent of RPM error or a changing
+    vibration amplitude is still cancelled. Harmonics that alias close to
+    0 Hz at the sample rate are skipped, since they cannot be told apart
+    from the ice flow. Below `min_rpm`, or without an RPM source, the
+    samples pass through unchanged.
+
+    A step in the weights (a cup placed, the scale zeroed) is not a
+    vibration, and a sine-plus-trend fit across it rings by tens of grams.
+    So only samples taken after the last restart() (LoadCell calls it when
+    the offset changes) and after the rotor held its speed within
+    `steady_tolerance` are fitted; older samples pass through. A block
+    whose removed vibration exceeds `max_amplitude` grams is left alone
+    and counted in `rejected`.
+
+    One notch serves the stream readers, the UI and the engine thread, and
+    the offset setter restarts it; the restart and steady-speed state is
+    guarded by a lock, the fit itself runs outside it.
+    """
+    name = "notch"
+
+    def __init__(self, harmonics=2, cycles=4, min_rpm=120.0, fit_samples=48, max_amplitude=3.0,
+                 steady_tolerance=0.05):
+        if harmonics < 1:
+            raise ValueError("The notch needs at least one harmonic.")
+        if cycles <= 0:
+            raise ValueError("Notch blocks must span a positive number of rotor cycles.")
+        self.harmonics = int(harmonics)
+        self.cycles = cycles
+        self.min_rpm = min_rpm
+        self.fit_samples = int(fit_samples)  # Samples LoadCell.get_weight() hands in while the rotor turns
+        self.max_amplitude = max_amplitude  # Largest plausible vibration (g); larger fits are rejected
+        self.steady_tolerance = steady_tolerance  # Relative RPM change that restarts the steady-speed wait
+        self.rpm_source = None  # Callable returning the live rotor RPM, see LoadCell.set_rotor_source
+        self.frequency = 0.0  # Rotor Hz used by the last run, 0 when passed through
+        self.fit_start = None  # Samples before this monotonic time are never fitted
+        self.rejected = 0  # Blocks left unfiltered because the fit was implausible
+        self._steady_rpm = None
+        self._steady_since = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a notch from the "notch" section of calibration.json."""
+        config = config or {}
+        return cls(
+            harmonics=config.get("harmonics", 2),
+            cycles=config.get("cycles", 4),
+            min_rpm=config.get("min_rpm", 120.0),
+            fit_samples=config.get("fit_samples", 48),
+            max_amplitude=config.get("max_amplitude", 3.0),
+            steady_tolerance=config.get("steady_tolerance", 0.05),
+        )
+
+    def restart(self, timestamp=None):
+        """Fit only samples taken after timestamp (default: now), e.g. once the scale was zeroed."""
+        with self._lock:
+            self.fit_start = time.monotonic() if timestamp is None else timestamp
+
+    def _fit_from(self, rpm, now):
+        """Oldest sample time that may be fitted: after the last restart and at steady rotor speed. Call under _lock."""
+        if rpm < self.min_rpm:
+            self._steady_rpm = self._steady_since = None
+            return now
+        if self._steady_rpm is None or abs(rpm - self._steady_rpm) > self.steady_tolerance * self._steady_rpm:
+            self._steady_rpm, self._steady_since = rpm, now
+        return self._steady_since if self.fit_start is None else max(self._steady_since, self.fit_start)
+
+    @property
+    def active(self):
+        return self.rpm_source is not None and self.rpm_source() >= self.min_rpm
+
+    @property
+    def ready(self):
+        """True once a full block of steady-speed samples since the last restart is available."""
+        rpm = self.rpm_source() if self.rpm_source is not None else 0.0
+        now = time.monotonic()
+        with self._lock:
+            start = self._fit_from(rpm, now)
+        return rpm >= self.min_rpm and now - start >= self.cycles * 60.0 / rpm
+
+    def apply(self, times, values):
+        rpm = self.rpm_source() if self.rpm_source is not None else 0.0
+        with self._lock:
+            start = self._fit_from(rpm, time.monotonic())
+        out, frequency, rejected = self._remove_vibration(times, values, rpm, start)
+        with self._lock:
+            self.frequency = frequency
+            self.rejected += rejected
+        return out
+
+    def _remove_vibration(self, times, values, rpm, start):
+        """(filtered values, rotor Hz used or 0.0, blocks rejected) for samples from `start` on."""
+        min_block = 2 + 4 * self.harmonics
+        if rpm < self.min_rpm or len(values) < min_block:
+            return values, 0.0, 0
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        fit = np.nonzero(times >= start)[0]
+        frequency = rpm / 60.0
+        if len(fit) < min_block or times[-1] - times[fit[0]] < 1.0 / frequency:
+            return values, 0.0, 0  # Less than one steady revolution since the last step
+        span = self.cycles / frequency
+        sample_rate = (len(values) - 1) / max(times[-1] - times[0], 1e-6)
+
+        # Block 0 is the newest; a short oldest block is merged into its neighbour
+        blocks = np.floor((times[-1] - times[fit]) / span).astype(int)
+        oldest = blocks == blocks[0]
+        if blocks[-1] != blocks[0] and (np.count_nonzero(oldest) < min_block
+                                        or np.ptp(times[fit][oldest]) < 1.0 / frequency):
+            blocks[oldest] = blocks[0] - 1
+
+        omegas = []
+        for k in range(1, self.harmonics + 1):
+            alias = abs(k * frequency - round(k * frequency / sample_rate) * sample_rate)
+            if alias >= 2.0 / span:
+                omegas.append(2.0 * np.pi * k * frequency)
+        if not omegas:
+            return values, frequency, 0
+
+        out = values.copy()
+        rejected = 0
+        for block in np.unique(blocks):
+            idx = fit[blocks == block]
+            if len(idx) < 2 + 4 * len(omegas):
+                continue
+            t = times[idx]
+            tc = t - t.mean()
+            columns = [np.ones(len(idx)), tc]
+            for omega in omegas:
+                c, s = np.cos(omega * t), np.sin(omega * t)
+                columns += [c, s, tc * c, tc * s]
+            design = np.column_stack(columns)
+            coef = np.linalg.lstsq(design, values[idx], rcond=None)[0]
+            vibration = design[:, 2:] @ coef[2:]
+            if np.max(np.abs(vibration)) > self.max_amplitude:
+                rejected += 1
+                continue
+            out[idx] -= vibration
+        return out, frequency, rejected
+
+
+FILTER_TYPES = {
+    MedianFilter.name: MedianFilter,
+    EMAFilter.name: EMAFilter,
+    KalmanFilter.name: KalmanFilter,
+}
+
+
+class FilterBank:
+    """Runs a chain of filters over a sample window and records per-filter latency."""
+
+    def __init__(self, filters=None, window=20):
+        self.filters = list(filters or [])
+        self.window = int(window)
+        self.latency = {f.name: 0.0 for f in self.filters}  # Seconds spent in the last run
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a bank from the "filter" section of calibration.json."""
+        config = config or {}
+        filters = []
+        for name in config.get("chain", []):
+            if name not in FILTER_TYPES:
+                raise ValueError(f"Unknown filter '{name}'. Choose from: {', '.join(FILTER_TYPES)}")
+            filters.append(FILTER_TYPES[name](**config.get(name, {})))
+        return cls(filters, window=config.get("window", 20))
+
+    def __bool__(self):
+        return bool(self.filters)
+
+    def reset(self):
+        """Drop the state of stateful filters (e.g. after the scale was zeroed)."""
+        for f in self.filters:
+            if hasattr(f, "reset"):
+                f.reset()
+
+    def apply(self, times, values):
+        """Filter a window of weights and return the current weight estimate."""
+        values = np.asarray(values, dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        if len(values) == 0:
+            return 0.0
+        estimate = "mean"
+        for f in self.filters:
+            start = time.perf_counter()
+            values = f.apply(times, values)
+            self.latency[f.name] = time.perf_counter() - start
+            estimate = f.estimate
+        return float(values[-1]) if estimate == "last" else float(values.mean())
+
+    def report(self, sample_period=None):
+        """Per-filter processing time (ms) and signal lag (samples, and seconds if the period is known)."""
+        report = {}
+        for f in self.filters:
+            lag = f.lag_samples()
+            entry = {"runtime_ms": self.latency[f.name] * 1000.0, "lag_samples": lag}
+            if sample_period:
+                entry["lag_s"] = lag * sample_period
+            report[f.name] = entry
+        return report
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class FlowRatePredictor:
+    """
+    Predicts the settled weight of the ice stage from the recent weight trajectory.
+
+    The flow rate is the least-squares slope of the weight over the last `window`
+    seconds. Ice keeps falling for `stop_delay` seconds after the motor is told to
+    stop, so the predicted final weight is the fitted current weight plus
+    rate * stop_delay. Units follow the weights fed in (g or oz).
+    """
+
+    def __init__(self, stop_delay=0.4, window=1.0, min_samples=5):
+        self.stop_delay = stop_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a predictor from the "ice_cutoff" section of calibration.json."""
+        config = config or {}
+        return cls(
+            stop_delay=config.get("stop_delay", 0.4),
+            window=config.get("window", 1.0),
+            min_samples=config.get("min_samples", 5),
+        )
+
+    def reset(self):
+        self._times = []
+        self._weights = []
+        self.rate = None        # Weight units per second
+        self.current = None     # Fitted weight at the newest sample
+
+    def add(self, timestamp, weight):
+        """Add one weight reading (e.g. from a UI tick) and refit."""
+        self._times.append(timestamp)
+        self._weights.append(weight)
+        while self._times and timestamp - self._times[0] > self.window:
+            self._times.pop(0)
+            self._weights.pop(0)
+        self._fit(np.asarray(self._times), np.asarray(self._weights))
+
+    def update_window(self, times, weights):
+        """Refit from a window of streamed samples, replacing any added history."""
+        times = np.asarray(times, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(times):
+            keep = times >= times[-1] - self.window
+            times, weights = times[keep], weights[keep]
+        self._times, self._weights = list(times), list(weights)
+        self._fit(times, weights)
+
+    def _fit(self, times, weights):
+        if len(times) < self.min_samples or times[-1] - times[0] <= 0:
+            self.rate = None
+            self.current = None
+            return
+        t = times - times[-1]
+        slope, intercept = np.polyfit(t, weights, 1)
+        self.rate = max(float(slope), 0.0)  # Ice only accumulates while shaving
+        self.current = float(intercept)
+
+    @property
+    def ready(self):
+        return self.rate is not None
+
+    def predicted_final(self):
+        """Predicted settled weight if the motor were stopped now, or None if not enough data."""
+        if not self.ready:
+            return None
+        return self.current + self.rate * self.stop_delay
+
+    def time_to_target(self, target):
+        """Seconds until the motor should be stopped to land on target, or None."""
+        if not self.ready or self.rate <= 0:
+            return None
+        return max((target - self.predicted_final()) / self.rate, 0.0)
+
+    def should_stop(self, target):
+        predicted = self.predicted_final()
+        return predicted is not None and predicted >= target
@@ -0,0 +1,246 @@
+import asyncio
+import queue
+import threading
+import time
+import pigpio
+
+# Event types
+LID_OPEN = "lid_open"
+LID_CLOSED = "lid_closed"
+FAULT = "fault"                  # ALM pulled LOW by the motor driver
+FAULT_CLEARED = "fault_cleared"
+STALL = "stall"                  # Driver enabled and commanded, but the rotor stands still
+JAM = "jam"                      # Rotor held well below the RPM expected for the commanded duty
+PULSE_RATE = "pulse_rate"        # Periodic rotor speed update while the motor runs
+OUTPUT_CHECK = "output_check"    # Read-back of EN/BRK/PWM after a motor command
+
+ALL_EVENTS = (LID_OPEN, LID_CLOSED, FAULT, FAULT_CLEARED, STALL, JAM, PULSE_RATE, OUTPUT_CHECK)
+
+
+class HardwareEventBus:
+    """
+    Publishes timestamped hardware events from GPIO edges to subscribers.
+
+    Sources: the lid InterlockWatcher (GPIO 25), an either-edge pigpio
+    callback on the driver ALM output (GPIO 13, LOW = fault), and a monitor
+    thread that turns the motor's speed pulses into PULSE_RATE updates,
+    STALL and JAM events and reads the motor outputs back after each command
+    (OUTPUT_CHECK), since the motor's command path is write-only. JAM fires
+    once the rotor has run below jam_ratio of the no-load RPM for the
+    commanded duty (the motor's duty->RPM map) for jam_time seconds, so a
+    jam is reported within about jam_time + pulse_rate_period. Until the map
+    is learned the threshold is a fixed jam_min_rpm_per_duty rotor RPM per
+    duty %, well below any loaded rotor (0 turns JAM off without a map).
+    Every event is a dict:
+
+        {"type": one of ALL_EVENTS, "time": monotonic s, "tick": pigpio tick or None, ...}
+
+    PULSE_RATE adds "rpm" and "duty", STALL adds "rpm", "duty" and "since_release",
+    JAM adds "rpm", "expected_rpm" (None without a map), "min_rpm" (the threshold), "duty"
+    and "slow_for" (seconds below the threshold),
+    LID_OPEN adds "reaction_us" when the interlock braked the motor,
+    OUTPUT_CHECK adds "ok", "expected" and "actual" (see BLDCMotor.verify_outputs).
+
+    Subscribers are plain callbacks (subscribe; also used for Qt, by emitting
+    a signal), queue.Queue (subscribe_queue, for threads) or asyncio.Queue
+    (subscribe_asyncio). Callbacks run on the publishing thread, which for
+    edge events is the pigpio callback thread, so they must return quickly.
+    """
+
+    def __init__(self, motor, interlock=None, alm_pin=13, pulse_rate_period=0.1,
+                 stall_rpm=20.0, stall_min_duty=10.0, stall_grace=1.0, jam_ratio=0.5, jam_time=0.5,
+                 jam_min_rpm_per_duty=3.0, verify_outputs=True):
+        self.motor = motor
+        self.interlock = interlock
+        self.alm_pin = alm_pin
+        self.pulse_rate_period = pulse_rate_period
+        self.stall_rpm = stall_rpm  # Rotor RPM below which a commanded rotor counts as stalled
+        self.stall_min_duty = stall_min_duty  # Below this duty the rotor may legitimately stand still
+        self.stall_grace = stall_grace  # Seconds after release() before a slow rotor counts as stalled
+        self.jam_ratio = jam_ratio  # Fraction of the expected RPM below which the rotor counts as slowed
+        self.jam_time = jam_time  # Seconds the rotor must stay slowed before JAM is published
+        self.jam_min_rpm_per_duty = jam_min_rpm_per_duty  # Fallback threshold (rotor RPM per duty %) without a map
+        self.verify_outputs = verify_outputs  # Read the motor outputs back after each command
+        self.output_mismatches = 0
+        self.fault_active = False
+        self.dropped = 0  # Events not delivered because a subscriber queue was full
+
+        self._subscribers = {}  # id(key handed to the subscriber) -> (key, deliver, types)
+        self._lock = threading.Lock()
+        self._alm_callback = None
+        self._monitor_thread = None
+        self._running = False
+        self._stalled = False
+        self._slow_since = None
+        self._jammed = False
+        self._verified_seq = None
+
+    # --- Subscribing -------------------------------------------------------
+
+    def subscribe(self, callback, types=None):
+        """Call callback(event) for every event (or only `types`). Returns callback for unsubscribe()."""
+        self._add(callback, callback, types)
+        return callback
+
+    def subscribe_queue(self, types=None, maxsize=100):
+        """Return a queue.Queue that receives events; full queues drop new events."""
+        q = queue.Queue(maxsize)
+
+        def deliver(event):
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+
+        self._add(q, deliver, types)
+        return q
+
+    def subscribe_asyncio(self, types=None, loop=None, maxsize=100):
+        """Return an asyncio.Queue fed on `loop` (default: the running loop). Call from the loop's thread."""
+        loop = loop or asyncio.get_running_loop()
+        q = asyncio.Queue(maxsize)
+
+        def put(event):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+        self._add(q, lambda event: loop.call_soon_threadsafe(put, event), types)
+        return q
+
+    def unsubscribe(self, key):
+        """Remove a subscriber by the callback or queue returned when subscribing."""
+        with self._lock:
+            self._subscribers.pop(id(key), None)
+
+    def _add(self, key, deliver, types):
+        types = frozenset(types) if types is not None else None
+        with self._lock:
+            self._subscribers[id(key)] = (key, deliver, types)
+
+    def publish(self, event_type, tick=None, **data):
+        event = {"type": event_type, "time": time.monotonic(), "tick": tick}
+        event.update(data)
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for _, deliver, types in subscribers:
+            if types is not None and event_type not in types:
+                continue
+            try:
+                deliver(event)
+            except Exception as e:
+                print(f"[ERROR] Hardware event subscriber failed: {e}")
+        return event
+
+    # --- Sources -----------------------------------------------------------
+
+    def start(self):
+        pi = self.motor.pi
+        pi.set_mode(self.alm_pin, pigpio.INPUT)
+        pi.set_pull_up_down(self.alm_pin, pigpio.PUD_UP)  # ALM is open collector, HIGH = normal
+        self.fault_active = pi.read(self.alm_pin) == 0
+        self._alm_callback = pi.callback(self.alm_pin, pigpio.EITHER_EDGE, self._on_alm_edge)
+        if self.interlock is not None:
+            self.interlock.add_listener(self._on_lid)
+
+        self._running = True
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor_thread.start()
+        print("[INFO] Hardware event bus started.")
+        if not self.motor.feedforward.ready:
+            if self.jam_min_rpm_per_duty:
+                print(f"[WARNING] No duty->RPM map: jams are only detected below {self.jam_min_rpm_per_duty:g} RPM "
+                      "per duty % until the speed map is learned.")
+            else:
+                print("[WARNING] No duty->RPM map: jam detection is off (full stalls only) until the speed map is learned.")
+        if self.fault_active:
+            self.publish(FAULT, pi.get_current_tick())
+
+    def stop(self):
+        self._running = False
+        if self._monitor_thread is not None:
+            self._monitor_thread.join()
+            self._monitor_thread = None
+        if self._alm_callback is not None:
+            self._alm_callback.cancel()
+            self._alm_callback = None
+        if self.interlock is not None:
+            self.interlock.remove_listener(self._on_lid)
+
+    def _on_alm_edge(self, gpio, level, tick):
+        if level == pigpio.TIMEOUT:
+            return
+        fault = level == 0
+        if fault == self.fault_active:
+            return
+        self.fault_active = fault
+        print(f"[SAFETY] Motor driver {'FAULT (ALM low)' if fault else 'fault cleared'}.")
+        self.publish(FAULT if fault else FAULT_CLEARED, tick)
+
+    def _on_lid(self, event):
+        if event["opened"]:
+            self.publish(LID_OPEN, event["tick"], reaction_us=event["reaction_us"])
+        else:
+            self.publish(LID_CLOSED, event["tick"])
+
+    def _monitor_loop(self):
+        while self._running:
+            time.sleep(self.pulse_rate_period)
+            motor = self.motor
+            rpm = motor.rpm
+            if motor.enabled or rpm > 0:
+                self.publish(PULSE_RATE, rpm=rpm, duty=motor.duty_cycle)
+
+            since_release = time.monotonic() - motor.released_at
+            stalled = (motor.enabled and rpm < self.stall_rpm and motor.duty_cycle >= self.stall_min_duty
+                       and since_release >= self.stall_grace)
+            if stalled and not self._stalled:
+                print(f"[SAFETY] Rotor stalled: {rpm:.0f} RPM at {motor.duty_cycle:.0f}% duty.")
+                self.publish(STALL, rpm=rpm, duty=motor.duty_cycle, since_release=since_release)
+            self._stalled = stalled
+            self._check_jam(rpm, since_release)
+
+            if self.verify_outputs and motor.command_seq != self._verified_seq:
+                self._check_outputs()
+
+    def jam_threshold(self):
+        """(rotor RPM below which the rotor counts as slowed, expected no-load RPM or None), or (None, None)."""
+        motor = self.motor
+        expected = motor.expected_rpm()
+        if expected is not None:
+            return self.jam_ratio * expected, expected
+        if self.jam_min_rpm_per_duty:
+            return self.jam_min_rpm_per_duty * motor.duty_cycle, None  # No map yet: a fixed, conservative floor
+        return None, None
+
+    def _check_jam(self, rpm, since_release):
+        motor = self.motor
+        threshold, expected = self.jam_threshold() if motor.enabled else (None, None)
+        slow = (threshold is not None and since_release >= self.stall_grace
+                and motor.duty_cycle >= self.stall_min_duty and rpm < threshold)
+        now = time.monotonic()
+        if not slow:
+            self._slow_since = None
+            self._jammed = False
+        elif self._slow_since is None:
+            self._slow_since = now
+        elif not self._jammed and now - self._slow_since >= self.jam_time:
+            self._jammed = True
+            print(f"[SAFETY] Rotor jammed: {rpm:.0f} RPM, below {threshold:.0f} RPM at {motor.duty_cycle:.0f}% duty.")
+            self.publish(JAM, rpm=rpm, expected_rpm=expected, min_rpm=threshold, duty=motor.duty_cycle,
+                         slow_for=now - self._slow_since)
+
+    def _check_outputs(self):
+        try:
+            result = self.motor.verify_outputs()
+        except Exception as e:
+            print(f"[WARNING] Motor output read-back failed: {e}")
+            return
+        if result is None:
+            return  # A command raced the read-back; check again next period
+        self._verified_seq = result["seq"]
+        if not result["ok"]:
+            self.output_mismatches += 1
+            print(f"[WARNING] Motor outputs differ from the last command: expected {result['expected']}, read {result['actual']}")
+        self.publish(OUTPUT_CHECK, ok=result["ok"], expected=result["expected"], actual=result["actual"])
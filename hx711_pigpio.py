@@ -0,0 +1,128 @@
+import time
+import pigpio
+
+
+class PigpioHX711:
+    """
+    Data-ready driven HX711 reader on top of the pigpio daemon.
+
+    A falling edge on DOUT means a conversion is ready. The callback immediately
+    sends a pre-built waveform of clock pulses on PD_SCK and the 24 data bits are
+    sampled on the falling clock edges reported by pigpio, so no thread sits in a
+    polling loop. Each sample is tagged with the pigpio tick of its DOUT edge.
+
+    Counts are the signed 24-bit ADC result, not the hx711 library's units, so
+    LoadCell keeps a separate "interrupt_calibration" for this reader.
+
+    pigpiod samples the GPIOs every 5 us by default (pigpiod -s), and an edge
+    shorter than a sample period can be missed, dropping a bit. The clock
+    phases therefore last several sample periods, which also leaves DOUT
+    settled and seen by the callback before the falling edge that latches it.
+    """
+
+    CLOCK_HIGH_US = 20  # >= 4 pigpiod sample periods; PD_SCK must stay below 60 us high or the HX711 powers down
+    CLOCK_LOW_US = 20
+    READ_TIMEOUT_US = 4000  # 27 pulses take 1.08 ms; the rest is callback latency
+
+    def __init__(self, pi, dout_pin=18, sck_pin=17, gain_pulses=25, on_sample=None):
+        """gain_pulses: 25 = channel A gain 128, 26 = channel B gain 32, 27 = channel A gain 64."""
+        self.pi = pi
+        self.dout_pin = dout_pin
+        self.sck_pin = sck_pin
+        self.gain_pulses = gain_pulses
+        self.on_sample = on_sample  # Called as on_sample(tick, timestamp, count)
+
+        self._dout_level = 1
+        self._reading = False
+        self._read_start = 0
+        self._bits = 0
+        self._value = 0
+        self._callbacks = []
+        self._wave_id = None
+
+        # Unwrap 32-bit pigpio ticks onto the time.monotonic() timeline
+        self._tick_ref = None
+        self._mono_ref = 0.0
+        self._elapsed_us = 0
+
+        self.samples_read = 0
+        self.read_errors = 0
+
+    def start(self):
+        pi = self.pi
+        pi.set_mode(self.sck_pin, pigpio.OUTPUT)
+        pi.write(self.sck_pin, 0)
+        pi.set_mode(self.dout_pin, pigpio.INPUT)
+
+        sck_mask = 1 << self.sck_pin
+        pulses = []
+        for _ in range(self.gain_pulses):
+            pulses.append(pigpio.pulse(sck_mask, 0, self.CLOCK_HIGH_US))
+            pulses.append(pigpio.pulse(0, sck_mask, self.CLOCK_LOW_US))
+        pi.wave_add_generic(pulses)
+        self._wave_id = pi.wave_create()
+        if self._wave_id < 0:
+            raise RuntimeError("Could not create HX711 clock waveform.")
+
+        self._tick_ref = pi.get_current_tick()
+        self._mono_ref = time.monotonic()
+        self._elapsed_us = 0
+        self._dout_level = pi.read(self.dout_pin)
+
+        self._callbacks = [
+            pi.callback(self.dout_pin, pigpio.EITHER_EDGE, self._on_edge),
+            pi.callback(self.sck_pin, pigpio.FALLING_EDGE, self._on_edge),
+        ]
+        if self._dout_level == 0:
+            self._begin_read(pi.get_current_tick())  # A conversion is already waiting
+        print("[INFO] HX711 data-ready sampling started (pigpio).")
+
+    def cancel(self):
+        for cb in self._callbacks:
+            cb.cancel()
+        self._callbacks = []
+        if self._wave_id is not None and self.pi.connected:
+            self.pi.wave_tx_stop()
+            self.pi.wave_delete(self._wave_id)
+            self.pi.write(self.sck_pin, 0)
+        self._wave_id = None
+        self._reading = False
+
+    def tick_to_monotonic(self, tick):
+        """Convert a pigpio tick to seconds on the time.monotonic() clock."""
+        self._elapsed_us += pigpio.tickDiff(self._tick_ref, tick)
+        self._tick_ref = tick
+        return self._mono_ref + self._elapsed_us / 1e6
+
+    def _begin_read(self, tick):
+        self._reading = True
+        self._read_start = tick
+        self._bits = 0
+        self._value = 0
+        self.pi.wave_send_once(self._wave_id)
+
+    def _on_edge(self, gpio, level, tick):
+        if gpio == self.dout_pin:
+            if level == pigpio.TIMEOUT:
+                return
+            self._dout_level = level
+            if level == 0:
+                if not self._reading:
+                    self._begin_read(tick)
+                elif pigpio.tickDiff(self._read_start, tick) > self.READ_TIMEOUT_US:
+                    self.read_errors += 1  # Lost clock edges; resynchronise on this conversion
+                    self._begin_read(tick)
+            return
+
+        # Falling PD_SCK edge: DOUT holds the bit shifted out by the preceding rising edge
+        if not self._reading:
+            return
+        if self._bits < 24:
+            self._value = (self._value << 1) | self._dout_level
+        self._bits += 1
+        if self._bits == self.gain_pulses:
+            self._reading = False
+            count = self._value - (1 << 24) if self._value & 0x800000 else self._value
+            self.samples_read += 1
+            if self.on_sample is not None:
+                self.on_sample(self._read_start, self.tick_to_monotonic(self._read_start), count)
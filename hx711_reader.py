@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import time
-import json
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
 import RPi.GPIO as GPIO
 from hx711 import HX711 # type: ignore
+from filters import FilterBank, NotchFilter
+from sample_buffer import SampleBuffer
+import config_store
 
 class LoadCell:
     def __init__(self, calibration_factor=0.002965, cal_file="calibration.json"):
@@ -10,16 +16,170 @@ class LoadCell:
         GPIO.setmode(GPIO.BCM)
         self.hx = HX711(18, 17)
         self.cal_file = cal_file
+        self.notch_config = {}
+        self.notch = NotchFilter()  # Rotor vibration removal, active once set_rotor_source() is called
+        self.filter_config = {}
+        self.filter_bank = FilterBank()  # Empty chain = plain mean
         self.A = calibration_factor
         self.B = 0
         self.offset = 0
+        self.tare_config = {}  # Stability-terminated tare settings, see tare_async
+
+        # Streaming mode (see start_stream)
+        self.stream_buffer = None
+        self.stream_mode = "thread"  # "thread" polls the hx711 library, "interrupt" uses pigpio edges
+        self.calibration_mode = "thread"  # Whose units offset/A/B are in: the hx711 library's or the raw pigpio counts
+        self._stream_thread = None
+        self._stream_reader = None
+        self._stream_pi = None  # pigpio connection opened for interrupt mode, closed by stop_stream()
+        self._stream_running = False
 
         self.load_calibration()   # ← Moved up
+        config_store.store(cal_file).add_listener(self._on_calibration_changed)
         #self.tare()               # ← Now runs after loading
 
-    def tare(self, samples=60):
-        """Zero the scale and set the tare offset."""
-        print("[INFO] Taring the scale... Make sure it's empty and stable.")
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, value):
+        if value != getattr(self, "_offset", None):
+            # A zero is a step in the weights; neither the notch nor the Kalman state may span it
+            self.notch.restart()
+            self.filter_bank.reset()
+        self._offset = value
+
+    @property
+    def streaming(self):
+        return self._stream_running
+
+    def start_stream(self, buffer_size=256, mode=None, pi=None, uncalibrated=False):
+        """
+        Sample the HX711 continuously into a ring buffer.
+        While streaming, get_raw/get_weight return immediately from the newest
+        buffered samples instead of reading the sensor on the caller's thread.
+
+        mode "thread" polls the hx711 library on a background thread. Mode
+        "interrupt" clocks each conversion out of a pigpio DOUT edge callback,
+        reusing the given pigpio connection if there is one. Defaults to the
+        "stream_mode" entry of calibration.json.
+
+        The pigpio reader returns raw signed 24-bit counts, not the hx711
+        library's units, so interrupt mode has its own offset/A/B in the
+        "interrupt_calibration" section. Without that section interrupt mode
+        falls back to thread mode, unless uncalibrated=True (to calibrate it:
+        tare and calibrate while streaming, and save_calibration() writes the
+        section).
+        """
+        if self._stream_running:
+            return
+        mode = mode or self.stream_mode
+        self.stream_buffer = SampleBuffer(buffer_size)
+
+        if mode == "interrupt":
+            try:
+                if not (uncalibrated or self._has_calibration("interrupt")):
+                    raise RuntimeError("no interrupt_calibration in calibration.json; its raw counts "
+                                       "differ from the hx711 library's, calibrate it first")
+                self._start_interrupt_stream(pi)
+                self._use_calibration("interrupt")
+            except Exception as e:
+                print(f"[ERROR] Interrupt sampling unavailable ({e}). Falling back to thread mode.")
+                mode = "thread"
+
+        if mode == "thread":
+            self._stream_running = True
+            self._stream_thread = threading.Thread(target=self._stream_loop, name="hx711-stream", daemon=True)
+            self._stream_thread.start()
+        elif mode != "interrupt":
+            raise ValueError(f"Unknown stream mode '{mode}'. Use 'thread' or 'interrupt'.")
+        self.stream_mode = mode
+        print(f"[INFO] Load cell streaming started ({mode}, buffer: {buffer_size} samples).")
+
+    def _start_interrupt_stream(self, pi):
+        import pigpio
+        from hx711_pigpio import PigpioHX711
+        owned = pi is None
+        pi = pi or pigpio.pi()
+        if not pi.connected:
+            if owned:
+                pi.stop()
+            raise RuntimeError("Could not connect to pigpio daemon!")
+        self._stream_reader = PigpioHX711(pi, dout_pin=18, sck_pin=17, on_sample=self._on_stream_sample)
+        try:
+            self._stream_reader.start()
+        except Exception:
+            self._stream_reader = None
+            if owned:
+                pi.stop()
+            raise
+        self._stream_pi = pi if owned else None
+        self._stream_running = True
+
+    def stop_stream(self):
+        """Stop the acquisition thread (or pigpio callbacks). The buffer keeps its last samples."""
+        if not self._stream_running:
+            return
+        self._stream_running = False
+        if self._stream_thread is not None:
+            self._stream_thread.join(timeout=1.0)
+            self._stream_thread = None
+        if self._stream_reader is not None:
+            self._stream_reader.cancel()
+            self._stream_reader = None
+        if self._stream_pi is not None:
+            self._stream_pi.stop()  # Only a connection this LoadCell opened itself
+            self._stream_pi = None
+        self._use_calibration("thread")  # Direct reads go through the hx711 library again
+        print("[INFO] Load cell streaming stopped.")
+
+    def _on_stream_sample(self, tick, timestamp, count):
+        self.stream_buffer.append(timestamp, count)
+
+    def _stream_loop(self):
+        while self._stream_running:
+            try:
+                reading = self.hx.get_weight_A(1)
+            except Exception as e:
+                print(f"[ERROR] Load cell stream read failed: {e}")
+                time.sleep(0.1)
+                continue
+            if reading == -1.0:  # Ignore invalid readings
+                time.sleep(0.01)
+                continue
+            self.stream_buffer.append(time.monotonic(), reading)
+
+    def recent_samples(self, n=None):
+        """Zero-copy (timestamps, raw counts) views of the newest n streamed samples."""
+        if self.stream_buffer is None:
+            raise RuntimeError("Load cell is not streaming. Call start_stream() first.")
+        return self.stream_buffer.latest(n)
+
+    def recent_weights(self, n=None, notch=True):
+        """(timestamps, calibrated grams) for the newest n streamed samples, rotor vibration removed unless notch=False."""
+        times, raw = self.recent_samples(n)
+        # Copy first: a full-buffer view loses its oldest sample on the next append
+        times, weights = times.copy(), self.A * (raw - self.offset) + self.B
+        return times, self.notch.apply(times, weights) if notch else weights
+
+    def set_rotor_source(self, rpm_source):
+        """Key the vibration notch to the live rotor RPM, e.g. lambda: motor.rpm."""
+        self.notch.rpm_source = rpm_source
+
+    def _latest_samples(self, samples):
+        """Newest (timestamps, raw counts) from the stream, waiting briefly for the first one."""
+        if self.stream_buffer.total == 0:
+            self.stream_buffer.wait_for(1, timeout=1.0)
+        return self.stream_buffer.latest(samples)
+
+    def _read_fresh(self, samples):
+        """Collect samples taken after this call, from the stream or the sensor directly."""
+        if self._stream_running:
+            start = self.stream_buffer.total
+            self.stream_buffer.wait_for(start + samples, timeout=samples * 0.2 + 1.0)
+            new = self.stream_buffer.total - start
+            return list(self.stream_buffer.latest(min(new, samples))[1])
 
         readings = []
         for _ in range(samples):
@@ -30,6 +190,13 @@ class LoadCell:
                 continue
             readings.append(reading)
             time.sleep(0.05)
+        return readings
+
+    def tare(self, samples=60):
+        """Zero the scale and set the tare offset."""
+        print("[INFO] Taring the scale... Make sure it's empty and stable.")
+
+        readings = self._read_fresh(samples)
 
         if not readings:
             print("[ERROR] No valid readings during tare!")
@@ -40,17 +207,71 @@ class LoadCell:
         self.B = 0  # Reset B to ensure the scale reads 0.00g after taring
         print(f"[DEBUG] New Offset Set: {self.offset:.2f}, B Reset to: {self.B}")
 
-        # Save and reload calibration to ensure the updated offset is applied
+        # The new offset is already live; persisting it does not wait for the disk
         self.save_calibration()
-        self.load_calibration()
 
         # Test the reading after taring
         test_reading = self.get_weight(5)
         print(f"[DEBUG] Weight after tare: {test_reading:.2f} g (should be 0.00g)")
         print("[INFO] Tare complete.")
 
+    def tare_async(self, window=None, max_std=None, timeout=None):
+        """
+        Tare on a background thread and return a Future that resolves to the new offset.
+        The tare finishes as soon as the standard deviation of the last `window`
+        samples falls below `max_std` grams, or after `timeout` seconds, in which
+        case the last window is used anyway. Defaults come from the "tare" section
+        of calibration.json.
+        """
+        window = window or self.tare_config.get("window", 10)
+        max_std = max_std if max_std is not None else self.tare_config.get("max_std", 0.2)
+        timeout = timeout or self.tare_config.get("timeout", 5.0)
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        worker = threading.Thread(
+            target=self._tare_until_stable, args=(future, window, max_std, timeout),
+            name="hx711-tare", daemon=True
+        )
+        worker.start()
+        return future
+
+    def _tare_until_stable(self, future, window, max_std, timeout):
+        try:
+            print("[INFO] Taring the scale... Make sure it's empty and stable.")
+            readings = deque(maxlen=window)
+            start = time.monotonic()
+            settled = False
+            while time.monotonic() - start < timeout:
+                readings.extend(self._read_fresh(1))
+                if len(readings) == window and np.std(readings) * abs(self.A) <= max_std:
+                    settled = True
+                    break
+
+            if not readings:
+                raise RuntimeError("No valid readings during tare!")
+            if not settled:
+                print(f"[WARNING] Scale did not settle within {timeout:.1f}s. Using the last {len(readings)} samples.")
+
+            self.offset = float(np.mean(readings))
+            self.B = 0  # Reset B to ensure the scale reads 0.00g after taring
+            print(f"[DEBUG] New Offset Set: {self.offset:.2f} after {time.monotonic() - start:.2f}s")
+            self.save_calibration()
+            print("[INFO] Tare complete.")
+            future.set_result(self.offset)
+        except Exception as e:
+            print(f"[ERROR] Tare failed: {e}")
+            future.set_exception(e)
+
     def get_raw(self, samples=5):
         """Return an average raw reading from the load cell."""
+        if self._stream_running:
+            readings = self._latest_samples(samples)[1]
+            if len(readings) == 0:
+                print("[ERROR] No valid readings!")
+                return 0.0
+            return float(readings.mean())
+
         readings = []
         for _ in range(samples):
             reading = self.hx.get_weight_A(1)
@@ -67,12 +288,31 @@ class LoadCell:
 
     def get_weight(self, samples=5):
         """Returns a stable weight reading using a moving average filter."""
-        raw_values = []
+        if self.filter_bank:
+            samples = max(samples, self.filter_bank.window)
+
+        if self._stream_running:
+            if self.notch.active:
+                # Fit the vibration over a longer window, then use only the newest samples
+                times, raw_values = self._latest_samples(max(samples, self.notch.fit_samples))
+                if len(raw_values) == 0:
+                    print("[ERROR] No valid readings after retries!")
+                    return 0.0
+                weights = self.notch.apply(times, self.A * (raw_values - self.offset) + self.B)
+                return self._filtered_weight(times[-samples:], weights[-samples:], calibrated=True)
+            times, raw_values = self._latest_samples(samples)
+            if len(raw_values) == 0:
+                print("[ERROR] No valid readings after retries!")
+                return 0.0
+            return self._filtered_weight(times, raw_values)
+
+        times, raw_values = [], []
         retries = 3  # Retry up to 3 times for valid readings
         for _ in range(samples):
             for attempt in range(retries):
                 reading = self.get_raw(1)
                 if reading != -1.0:  # Ignore invalid readings
+                    times.append(time.monotonic())
                     raw_values.append(reading)
                     break
                 else:
@@ -83,7 +323,22 @@ class LoadCell:
             print("[ERROR] No valid readings after retries!")
             return 0.0
 
-        avg_raw = sum(raw_values) / len(raw_values)
+        return self._filtered_weight(times, raw_values)
+
+    def _filtered_weight(self, times, values, calibrated=False):
+        """Run the configured filter chain over a window of raw samples (or grams if calibrated)."""
+        if calibrated:
+            weights = np.asarray(values, dtype=np.float64)
+        elif not self.filter_bank:
+            return self._to_weight(float(np.mean(values)))
+        else:
+            weights = self.A * (np.asarray(values, dtype=np.float64) - self.offset) + self.B
+        if not self.filter_bank:
+            return max(round(float(weights.mean()), 2), 0.0)
+        weight = self.filter_bank.apply(times, weights)
+        return max(round(weight, 2), 0.0)  # Ensure no negative weights
+
+    def _to_weight(self, avg_raw):
         adjusted = avg_raw - self.offset
         weight = self.A * adjusted + self.B
         #print(f"[DEBUG] Raw: {avg_raw:.2f}, Adjusted: {adjusted:.2f}, Weight: {weight:.2f}")
@@ -128,39 +383,92 @@ class LoadCell:
         except Exception as e:
             print(f"[ERROR] Failed to set calibration: {e}")
 
+    def set_filter_config(self, config):
+        """Replace the filter chain, e.g. {"chain": ["median", "ema"], "ema": {"alpha": 0.2}}."""
+        self.filter_bank = FilterBank.from_config(config)
+        self.filter_config = config
+        print(f"[INFO] Load cell filter chain: {[f.name for f in self.filter_bank.filters] or 'mean'}")
+
     def save_calibration(self):
-        """Save calibration values to a JSON file with proper error handling."""
-        data = {
+        """
+        Save calibration values. Only this object's sections are merged into the
+        shared calibration store, so other sections (overshoot, speed control)
+        survive; the file itself is written in the background (see config_store).
+        """
+        values = {
             "offset": self.offset,
             "A": self.A,
             "B": self.B
         }
-        try:
-            with open(self.cal_file, "w") as f:
-                json.dump(data, f)
-            print(f"[INFO] Calibration saved to {self.cal_file}")
-        except Exception as e:
-            print(f"[ERROR] Failed to save calibration: {e}")
+        sections = {"interrupt_calibration": values} if self.calibration_mode == "interrupt" else dict(values)
+        if self.filter_config:
+            sections["filter"] = self.filter_config
+        if self.tare_config:
+            sections["tare"] = self.tare_config
+        if self.notch_config:
+            sections["notch"] = self.notch_config
+        config_store.store(self.cal_file).update(sections)
+        print(f"[INFO] Calibration saved to {self.cal_file}")
         if hasattr(self, 'reload_calibration_callback'):
             self.reload_calibration_callback()  # Trigger callback to reload calibration
 
     def load_calibration(self):
-        """Load calibration values from a JSON file, if available."""
+        """Load calibration values from calibration.json, if available."""
+        data = config_store.store(self.cal_file).data()
+        if not data:
+            print(f"[INFO] No calibration file found ({self.cal_file}). Using default values.")
+            return
         try:
-            with open(self.cal_file, "r") as f:
-                data = json.load(f)
-
-            self.offset = data.get("offset", self.offset)
-            self.A = data.get("A", self.A)
-            self.B = data.get("B", self.B)
+            self._apply_calibration(data)
+            self.stream_mode = data.get("stream_mode", self.stream_mode)
 
             print(f"[DEBUG] Loaded Calibration - Offset: {self.offset:.2f}, A: {self.A:.6f}, B: {self.B:.6f}")
 
-        except FileNotFoundError:
-            print(f"[INFO] No calibration file found ({self.cal_file}). Using default values.")
         except Exception as e:
             print("[ERROR] Loading calibration:", e)
 
+    def _has_calibration(self, mode):
+        if mode == "thread":
+            return True  # The top-level offset/A/B, or the defaults
+        values = config_store.store(self.cal_file).get("interrupt_calibration") or {}
+        return "offset" in values and "A" in values
+
+    def _use_calibration(self, mode):
+        """Switch offset/A/B to the calibration of the sample units now in use."""
+        if mode == self.calibration_mode:
+            return
+        self.calibration_mode = mode
+        data = config_store.store(self.cal_file).data()
+        self._apply_calibration({key: data[key] for key in ("offset", "A", "B", "interrupt_calibration") if key in data})
+        print(f"[INFO] Load cell calibration: {mode} units (offset {self.offset:.2f}, A {self.A:.6f})")
+
+    def _apply_calibration(self, data):
+        """Take the sections present in data (a whole calibration.json or just changed sections)."""
+        values = (data.get("interrupt_calibration") or {}) if self.calibration_mode == "interrupt" else data
+        self.offset = values.get("offset", self.offset)
+        if (values.get("A", self.A), values.get("B", self.B)) != (self.A, self.B):
+            self.filter_bank.reset()  # The weights scale or shift like a zero
+        self.A = values.get("A", self.A)
+        self.B = values.get("B", self.B)
+        if "filter" in data:
+            self.set_filter_config(data["filter"])
+        self.tare_config = data.get("tare", self.tare_config)
+        if "notch" in data:
+            previous = self.notch
+            self.notch = NotchFilter.from_config(data["notch"])
+            self.notch.rpm_source, self.notch.fit_start = previous.rpm_source, previous.fit_start
+            self.notch_config = data["notch"]
+
+    def _on_calibration_changed(self, changes):
+        """Apply edited calibration fields (from any process) without re-reading the file."""
+        config = config_store.store(self.cal_file)
+        sections = {change.section for change in changes} & {"offset", "A", "B", "interrupt_calibration",
+                                                             "filter", "tare", "notch"}
+        changed = {section: config.get(section) for section in sections}
+        changed = {section: value for section, value in changed.items() if value is not None}
+        if changed:
+            self._apply_calibration(changed)
+
     def zero(self, current_weight_oz):
         """Zero the scale based on the current weight in ounces."""
         current_weight_g = current_weight_oz * 28.35  # Convert ounces to grams
@@ -169,6 +477,7 @@ class LoadCell:
         print(f"[INFO] Scale zeroed. New offset: {self.offset:.2f}")
 
     def stop(self):
+        self.stop_stream()
         GPIO.cleanup()
 
 if __name__ == "__main__":
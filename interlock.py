@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+import pigpio
+
+
+class InterlockWatcher:
+    """
+    Watches the lid switch (HIGH = open) with a pigpio edge callback on the
+    motor's pigpio session. When the lid opens while the motor runs, the
+    callback itself calls BLDCMotor.emergency_brake(), so the reaction time
+    does not depend on any UI timer. Each event records the pigpio tick of the
+    edge and, for brakes, the microseconds from that edge until the brake
+    writes had been sent. Listeners are called afterwards with the event dict:
+
+        {"opened": bool, "time": monotonic s, "tick": edge tick,
+         "motor_running": bool, "reaction_us": int or None}
+
+    Listeners run on the pigpio callback thread; Qt code should forward the
+    event through a signal.
+    """
+
+    def __init__(self, motor, pin=25, history=200):
+        self.motor = motor
+        self.pin = pin
+        self.events = deque(maxlen=history)
+        self.reaction_us = deque(maxlen=history)  # Edge -> brake sent, per braking event
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._callback = None
+        self._pi = None
+
+    def start(self):
+        pi = self.motor.pi
+        pi.set_mode(self.pin, pigpio.INPUT)
+        self._callback = pi.callback(self.pin, pigpio.EITHER_EDGE, self._on_edge)
+        self._pi = pi
+        print(f"[INFO] Lid interlock watcher started on GPIO {self.pin}.")
+
+    def cancel(self):
+        if self._callback is not None:
+            self._callback.cancel()
+            self._callback = None
+
+    def ensure_started(self):
+        """Re-register the callback if the motor reconnected to pigpio since start()."""
+        if self._callback is None or self._pi is not self.motor.pi:
+            self.cancel()
+            self.start()
+
+    @property
+    def is_open(self):
+        return self.motor.interlock_triggered()
+
+    def add_listener(self, func):
+        with self._lock:
+            self._listeners.append(func)
+
+    def remove_listener(self, func):
+        with self._lock:
+            if func in self._listeners:
+                self._listeners.remove(func)
+
+    def _on_edge(self, gpio, level, tick):
+        if level == pigpio.TIMEOUT:
+            return
+        opened = level == 1
+        running = self.motor.enabled
+        reaction = None
+        if opened and running:
+            self.motor.emergency_brake()
+            self.motor.was_interrupted = True
+            reaction = pigpio.tickDiff(tick, self.motor.pi.get_current_tick())
+            self.reaction_us.append(reaction)
+
+        event = {"opened": opened, "time": time.monotonic(), "tick": tick, "motor_running": running, "reaction_us": reaction}
+        self.events.append(event)
+        if reaction is not None:
+            print(f"[SAFETY] Lid opened: motor braked {reaction / 1000.0:.2f} ms after the edge.")
+        else:
+            print(f"[INFO] Lid {'opened' if opened else 'closed'}.")
+
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[ERROR] Interlock listener failed: {e}")
+
+    def report(self):
+        """Reaction-time statistics (ms) over the recorded braking events."""
+        if not self.reaction_us:
+            return {"n": 0}
+        ms = np.asarray(self.reaction_us, dtype=np.float64) / 1000.0
+        return {
+            "n": int(len(ms)),
+            "mean_ms": float(ms.mean()),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "max_ms": float(ms.max()),
+        }
@@ -1,17 +1,23 @@
 # --- loadcell_reader_qt.py ---
 
 from PySide6.QtCore import QObject, Signal, Property, QTimer, Slot
-from hx711_reader import LoadCell
+import devices
 
 class LoadCellReader(QObject):
     weightUpdated = Signal(float)
     weightChanged = Signal()
     tareCompleted = Signal()
+    tareFailed = Signal(str)  # Reason; the previous offset is still in use
+    _tareFinished = Signal(bool, str)  # Internal: marshals tare completion (ok, error) onto the GUI thread
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_rate_hz=30.0, deadband=0.05):
         super().__init__(parent)
         self._sensor = None  # delay actual init
-        self._weight = 0.0
+        self._weight = 0.0  # Cached snapshot served to QML
+        self.max_rate_hz = max_rate_hz  # Upper bound for weightChanged emissions
+        self.deadband = deadband  # Grams; smaller changes are not published
+        self._tare_future = None
+        self._tareFinished.connect(self._on_tare_finished)
 
         self.init_timer = QTimer(self)
         self.init_timer.setSingleShot(True)
@@ -19,10 +25,6 @@ class LoadCellReader(QObject):
         self.init_timer.start(1500)  # Wait until Qt settles
      
 
-    def initial_tare(self):
-        print("[INFO] Initial delayed tare (Python-side)")
-        self._sensor.tare()
-
     def delayed_init(self):
         print("[INFO] LoadCellReader ready for explicit initialization.")
         # Removed automatic initialization here
@@ -31,45 +33,63 @@ class LoadCellReader(QObject):
     def initialize_sensor(self):
         if self._sensor is None:
             print("[INFO] Initializing LoadCell...")
-            self._sensor = LoadCell()
+            self._sensor = devices.load_cell()  # Shared and already streaming
             print("[INFO] LoadCell initialized.")
-            # Start polling weight only after explicit initialization
+            # Start publishing weight only after explicit initialization
             self.timer = QTimer(self)
-            self.timer.setInterval(100)
+            self.timer.setInterval(int(1000 / self.max_rate_hz))
             self.timer.timeout.connect(self.read_weight)
             self.timer.start()
 
-    def _delayed_tare(self):
-        print("[INFO] Initial delayed tare (Python-side)")
-        self._sensor.tare()
-        self._weight = 0.0
-        self.weightChanged.emit()
-        self.weightUpdated.emit(0.0)
+    @Slot(float)
+    def set_max_rate(self, max_rate_hz):
+        """Change the maximum weightChanged rate (Hz)."""
+        self.max_rate_hz = max(max_rate_hz, 1.0)
+        if hasattr(self, 'timer'):
+            self.timer.setInterval(int(1000 / self.max_rate_hz))
+
+    @Slot(float)
+    def set_deadband(self, deadband):
+        """Change the minimum weight change (g) that is published."""
+        self.deadband = max(deadband, 0.0)
 
     def read_weight(self):
+        """Refresh the cached weight from the load cell stream and publish changes."""
         if self._sensor is None:
             print("[ERROR] LoadCell is not initialized!")
             return
 
-        samples = [self._sensor.get_weight() for _ in range(5)]
-        avg_weight = sum(samples) / len(samples)
-
-        # Removed raw samples debug log
-        if abs(avg_weight - self._weight) > 0.01:
-            self._weight = avg_weight
+        weight = self._sensor.get_weight()  # Served from the stream buffer, no sensor I/O
+        if abs(weight - self._weight) > self.deadband:
+            self._weight = weight
             self.weightUpdated.emit(self._weight)
             self.weightChanged.emit()
-        else:
-            print("[DEBUG] No significant weight change detected.")
 
     def get_weight(self):
-        samples = [self._sensor.get_weight() for _ in range(5)]
-        return sum(samples) / len(samples)
+        """Return the cached weight snapshot. Never touches the sensor."""
+        return self._weight
 
     @Slot()
     def tare(self):
+        """Start a stability-terminated tare; tareCompleted or tareFailed is emitted when it finishes."""
+        if self._tare_future is not None and not self._tare_future.done():
+            print("[INFO] Tare already in progress.")
+            return
+        if self._sensor is None:
+            print("[ERROR] LoadCell is not initialized; cannot tare.")
+            self.tareFailed.emit("Load cell is not initialized")
+            return
         print("[INFO] Taring from QML...")
-        self._sensor.tare()
+        self._tare_future = self._sensor.tare_async()
+        self._tare_future.add_done_callback(
+            lambda future: self._tareFinished.emit(future.exception() is None, str(future.exception() or ""))
+        )
+
+    def _on_tare_finished(self, ok, reason):
+        if not ok:
+            print(f"[ERROR] Tare failed — keeping the previous offset: {reason}")
+            self.tareFailed.emit(reason)
+            return
         self._weight = 0.0
         self.weightChanged.emit()
         self.weightUpdated.emit(0.0)
@@ -1,31 +1,36 @@
 #!/usr/bin/env python3
 import sys
-import time
+import sim_hardware
+sim_hardware.install_if_requested()  # Fake RPi.GPIO, pigpio and hx711 before anything imports them
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QComboBox, QButtonGroup, QMessageBox
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QPainter, QColor, QPen, QBrush
 import settings
-from hx711_reader import LoadCell  # Your load cell class
-from motor import BLDCMotor       # Your motor control class
+import config_store
+import devices  # Shared LoadCell and BLDCMotor
+import hw_events
+import dispense_engine
+from dispense_engine import DispenseEngine
+from recipe_plan import RecipeError
 from settings_ui import SettingsWindow  # Import the SettingsWindow class
 from ui import WeightDisplay  # Import the WeightDisplay class
-import json
-
-# Conversion: 1 oz ≈ 28.35 grams
-GRAMS_TO_OZ = 1 / 28.35
 
 class GaugeWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.value = 0.0
         self.target = 100.0
+        self.eta = None  # Seconds until the operator should stop pouring
+        self.stop_now = False
 
-    def setValue(self, value, target):
+    def setValue(self, value, target, eta=None, stop_now=False):
         self.value = value
         self.target = target
+        self.eta = eta
+        self.stop_now = stop_now
         self.update()
 
     def paintEvent(self, event):
@@ -36,34 +41,57 @@ class GaugeWidget(QWidget):
         painter.setPen(pen)
         painter.drawRect(rect.adjusted(1, 1, -1, -1))
         ratio = min(max(self.value / self.target, 0), 1) if self.target > 0 else 0
-        fill_color = QColor(0, 255, 0) if ratio >= 1.0 else QColor(255, 0, 0)
+        if ratio >= 1.0:
+            fill_color = QColor(0, 255, 0)
+        elif self.stop_now:
+            fill_color = QColor(255, 210, 0)  # Stop cue: the target is reached by the time the pour stops
+        else:
+            fill_color = QColor(255, 0, 0)
         painter.setBrush(QBrush(fill_color))
         fill_height = int(ratio * rect.height())
         fill_rect = rect.adjusted(2, rect.height() - fill_height + 2, -2, -2)
         painter.drawRect(fill_rect)
+        if self.stop_now and ratio < 1.0:
+            painter.drawText(rect, Qt.AlignHCenter | Qt.AlignTop, "STOP")
+        elif self.eta is not None:
+            painter.drawText(rect, Qt.AlignHCenter | Qt.AlignTop, f"{self.eta:.1f}s")
 
 class MainUI(QWidget):
+    hardwareEvent = pyqtSignal(object)  # Hardware event bus events, re-emitted on the GUI thread
+    dispenseEvent = pyqtSignal(object)  # DispenseEngine events, re-emitted on the GUI thread
+    settingsChanged = pyqtSignal(object)  # settings.json Changes, re-emitted on the GUI thread
+
     def __init__(self):
         print("[DEBUG] Initializing MainUI...")
         super().__init__()
         print("[DEBUG] Loading settings...")
         self.app_settings = settings.load_settings()
+        settings.store().add_listener(self.settingsChanged.emit)  # Recipe and rotor edits, from any process
+        self.settingsChanged.connect(self.on_settings_changed)
         print("[DEBUG] Initializing hardware components...")
-        self.load_cell = LoadCell(calibration_factor=0.002965)  # Re-enable LoadCell initialization
-        self.motor = BLDCMotor(pwm_pin=5, speed_pin=16, en_pin=20, brk_pin=19)  # Re-enable Motor initialization
+        self.load_cell = devices.load_cell()  # Shared, already streaming
+        self.motor = devices.motor()
+        self.hw_events = devices.events()  # Lid and ALM edges brake the motor before we hear of them
+        self.hw_events.subscribe(self.hardwareEvent.emit, types=(hw_events.FAULT,))
+        self.hardwareEvent.connect(self.on_hardware_event)
+        self.speed_mode = self.app_settings.get("speed_mode", "duty")
+        QTimer.singleShot(0, self.check_speed_map)  # Once the window is up
         print("[DEBUG] MainUI initialized.")
         self.setWindowTitle("Ice Shaver Main UI")
         self.setFixedSize(800, 480)
         self.setStyleSheet("background-color: black; color: white;")
-        self.state = 0
-        self.motor_stopped = False
+        self.state = dispense_engine.IDLE  # Last state reported by the engine
         self.settings_window = None  # Initialize settings window as None
         self.motor_settings_window = None  # Initialize motor settings window as None
-        self.original_offset = self.load_cell.offset  # Store the original offset
-        self.overshoot_compensation = self.load_overshoot_compensation()
+
+        # The order runs on the engine thread; this window only renders its events
+        self.engine = DispenseEngine(self.load_cell, self.motor, self.app_settings, events=self.hw_events)
+        self.engine.add_listener(self.dispenseEvent.emit)
+        self.dispenseEvent.connect(self.on_dispense_event)
+        self.engine.start()
 
         # --- Rotor speed display (absolute positioning) ---
-        self.rotor_speed_label = QLabel(f"Rotor Speed Setting: {self.app_settings['rotor_speed']}%", self)
+        self.rotor_speed_label = QLabel(f"Rotor Speed Setting: {settings.format_speed(self.app_settings)}", self)
         self.rotor_speed_label.setStyleSheet("font-size: 18px; font-weight: bold; color: white;")
         self.rotor_speed_label.setGeometry(20, 10, 300, 30)  # Position: (x=10, y=10), Size: (width=200, height=30)
 
@@ -180,18 +208,43 @@ class MainUI(QWidget):
         self.elapsed_time_label.setStyleSheet("font-size: 18px; color: white;")
         self.elapsed_time_label.hide()  # Initially hidden
         main_layout.addWidget(self.elapsed_time_label)  # Add to the main layout
-        self.elapsed_time = 0  # Initialize elapsed time in seconds
-        self.elapsed_time_start = None  # Initialize start time for elapsed time
-
-        self.timer = QTimer()
-        self.timer.setInterval(100)
-        self.timer.timeout.connect(self.update_weight)
 
     def size_button_clicked(self, button):
         for btn in self.size_buttons.values():
             btn.setStyleSheet("font-size: 16px; background-color: #444; color: white;")
         button.setStyleSheet("font-size: 16px; background-color: #888; color: white;")
 
+    def on_hardware_event(self, event):
+        """Driver-fault events; the motor has already been braked."""
+        if event["type"] == hw_events.FAULT:
+            self.handle_motor_fault()
+
+    def handle_motor_fault(self):
+        """The driver pulled ALM low: abort a running ice stage and tell the operator."""
+        if self.state == dispense_engine.ICE:
+            self.abort_process()
+        QMessageBox.warning(self, "Motor Fault", "The motor driver reported a fault and the motor was stopped. Check the rotor before the next order.")
+
+    def on_dispense_event(self, event):
+        """Render a DispenseEngine event (state change, progress, settled scale, lid interruption or failed order)."""
+        if event["type"] == "state":
+            self.state = event["state"]
+            self.update_ui_for_state(event)
+        elif event["type"] == "progress":
+            self.show_progress(event)
+        elif event["type"] == "settled":
+            self.elapsed_time_label.setText("Ice settled – press Next.")
+        elif event["type"] == "interrupted":
+            self.handle_motor_interrupted()
+        elif event["type"] == "failed":
+            self.instruction_label.setText(event["reason"])
+            QMessageBox.warning(self, event["title"], event["reason"])
+
+    def handle_motor_interrupted(self):
+        """Warn about the open cover and let the engine resume shaving once it is closed again."""
+        self.show_interlock_warning()
+        self.engine.resume()
+
     def show_interlock_warning(self):
         QMessageBox.warning(self, "Cover Open", "Cover is open – motor stopped for safety. Please close the cover and try again.")
 
@@ -205,31 +258,13 @@ class MainUI(QWidget):
             self.instruction_label.setText("Please select a size!")
             return
 
-        self.selected_flavor = self.flavor_dropdown.currentText()
-        self.selected_size = selected_size
-        self.recipe = self.app_settings["sizes"].get(self.selected_flavor, {}).get(self.selected_size, {})
-        self.is_time_based = "speed_time_mapping" in self.recipe  # Check if the recipe is time-based
-
-        if not self.recipe:
-            self.instruction_label.setText("Recipe not found!")
+        selected_flavor = self.flavor_dropdown.currentText()
+        try:
+            self.engine.start_order(selected_flavor, selected_size)
+        except RecipeError as e:
+            self.instruction_label.setText(f"Invalid recipe: {e}")
             return
 
-        # Print the settings being used
-        print(f"[INFO] Starting process with settings:")
-        print(f"  Flavor: {self.selected_flavor}")
-        print(f"  Size: {self.selected_size}")
-        print(f"  Rotor Speed: {self.app_settings['rotor_speed']}%")
-        if self.is_time_based:
-            rotor_speed = int(self.app_settings["rotor_speed"])
-            speed_time_mapping = self.recipe.get("speed_time_mapping", {})
-            target_time = speed_time_mapping.get(str(rotor_speed), None)
-            print(f"  Time-Based Recipe: Yes")
-            print(f"  Speed-Time Mapping: {speed_time_mapping}")
-            print(f"  Mapped Time for {rotor_speed}% Speed: {target_time} seconds")
-        else:
-            print(f"  Time-Based Recipe: No")
-            print(f"  Recipe Details: {self.recipe}")
-
         self.flavor_dropdown.hide()
         for btn in self.size_buttons.values():
             btn.hide()
@@ -240,192 +275,75 @@ class MainUI(QWidget):
 
         self.rotor_speed_label.hide()  # Hide the rotor speed label when the process starts
         self.abort_button.show()  # Show the Abort button when the process starts
-        self.motor_stopped = False
-        self.state = 1
-        self.original_offset = self.load_cell.offset  # Save the original offset before zeroing
-        self.update_ui_for_state()
 
     def next_step(self):
-        if self.motor.interlock_triggered():
-            self.motor.check_interlock_and_stop()
-            self.show_interlock_warning()
-            return
-
-        if self.state == 1:
-            self.instruction_label.setText("Zeroing cup, please wait...")
-            QApplication.processEvents()
-            current_weight_oz = self.load_cell.get_weight() * GRAMS_TO_OZ  # Get current weight in ounces
-            self.load_cell.zero(current_weight_oz)  # Zero the scale based on the current weight
-            time.sleep(0.5)
-            self.state = 2
-            self.elapsed_time_start = time.time()  # Record the start time
-            self.elapsed_time_label.setText("Elapsed Time: 0.0s")
-            self.elapsed_time_label.show()  # Show the elapsed time label
-            self.instruction_label.setText("Shaving ice... Please wait.")
-            if not self.motor.start():
-                self.show_interlock_warning()
-                return
-            self.motor.set_speed(self.app_settings["rotor_speed"])
-            self.timer.start()
-            self.next_button.hide()
-        elif self.state == 2:
-            self.timer.stop()
-            try:
-                self.motor.stop()
-            except Exception as e:
-                print("[WARNING] Error stopping motor:", e)
-            self.elapsed_time_label.hide()  # Hide the elapsed time label
-            self.instruction_label.setText("Ice shaving complete. Zeroing cup for flavor addition...")
-            QApplication.processEvents()
-            current_weight_oz = self.load_cell.get_weight() * GRAMS_TO_OZ  # Get current weight in ounces
-            self.load_cell.zero(current_weight_oz)  # Zero the scale before adding flavor
-            time.sleep(0.5)
-            self.state = 3
-            self.instruction_label.setText("Add flavor until target weight reached.")
-            self.timer.start()
-            self.next_button.hide()
-        elif self.state == 3:
-            self.timer.stop()
-            self.state = 4
-            self.instruction_label.setText("Flavor addition complete. Blend the cup to finish.")
-            self.next_button.setText("Finish")
-            self.next_button.show()
-            self.exit_button.hide()  # Hide the Exit button during the last stage
-        elif self.state == 4:
-            self.abort_button.hide()  # Hide the Abort button before showing the Finish button
-            self.reset_ui()  # Return to the main page after clicking Finish
+        self.next_button.setEnabled(False)  # Re-enabled by the engine's next state
+        self.engine.next()
 
-    def load_overshoot_compensation(self):
-        """Load overshoot compensation data from calibration.json."""
-        try:
-            with open("calibration.json", "r") as f:
-                data = json.load(f)
-            return data.get("overshoot_compensation", {})
-        except Exception as e:
-            print(f"[ERROR] Failed to load overshoot compensation data: {e}")
-            return {}
-
-    def get_compensated_target(self, target_weight):
-        """Adjust the target weight based on the rotor speed and overshoot compensation."""
-        rotor_speed = self.app_settings["rotor_speed"]
-        compensation = self.overshoot_compensation.get(str(int(rotor_speed)), 0)
-        return max(target_weight - compensation, 0)  # Ensure the target is not negative
-
-    def update_weight(self):
-        # Ensure gauge is initialized before updating its value
+    def show_gauge(self):
+        """Add the GaugeWidget below the instructions if it is not shown yet."""
         if not hasattr(self, 'gauge'):
             self.gauge = GaugeWidget()
             self.gauge.setFixedSize(80, 180)
-
-            # Create a layout for the gauge only
             gauge_layout = QHBoxLayout()
             gauge_layout.addStretch()
             gauge_layout.addWidget(self.gauge)
             gauge_layout.addStretch()
+            self.layout().insertLayout(2, gauge_layout)  # Insert gauge layout dynamically
 
-            # Insert the gauge layout into the main layout
-            self.layout().insertLayout(2, gauge_layout)
-
-        self.motor.check_interlock_and_stop()
-        if self.motor.was_interrupted:
-            self.timer.stop()
-            self.motor.was_interrupted = False
-            self.show_interlock_warning()
-            if not self.motor.interlock_triggered():
-                self.motor.start()
-                self.motor.set_speed(self.app_settings["rotor_speed"])
-                self.timer.start()
+    def show_progress(self, event):
+        if event["state"] not in (dispense_engine.ICE, dispense_engine.ICE_DONE, dispense_engine.FLAVOR):
             return
+        self.show_gauge()
+        if event["target_time"] is not None:
+            # Time-based recipe: the rotor runs for the mapped time
+            self.elapsed_time_label.setText(f"Elapsed Time: {event['elapsed']:.1f}s")
+            return
+        text = f"Current weight: {event['weight_oz']:.2f} oz (Target: {event['target_oz']:.2f} oz)"
+        if event["stop_now"] and not event["target_reached"]:
+            text += " – STOP POURING"
+        elif event["eta"] is not None:
+            text += f" – {event['pour_rate']:.2f} oz/s, stop in {event['eta']:.1f}s"
+        self.instruction_label.setText(text)
+        self.gauge.setValue(event["weight_oz"], event["target_oz"], event["eta"], event["stop_now"])
+        if event["state"] == dispense_engine.FLAVOR:
+            self.next_button.setEnabled(event["target_reached"])
+            self.next_button.show()
 
-        weight_grams = self.load_cell.get_weight()
-        weight_oz = weight_grams * GRAMS_TO_OZ
-
-        if self.state == 2:  # Ice stage
-            if self.is_time_based:
-                # Time-based logic using speed_time_mapping
-                rotor_speed = int(self.app_settings["rotor_speed"])
-                speed_time_mapping = self.recipe.get("speed_time_mapping", {})
-                target_time = speed_time_mapping.get(str(rotor_speed), None)
-
-                if target_time is None:
-                    print(f"[ERROR] No time mapping found for speed {rotor_speed}%")
-                    self.timer.stop()
-                    self.motor.stop()
-                    self.instruction_label.setText("Error: Invalid speed-time mapping.")
-                    return
-
-                if self.elapsed_time_start is not None and not self.motor_stopped:
-                    elapsed_time = time.time() - self.elapsed_time_start
-                    self.elapsed_time_label.setText(f"Elapsed Time: {elapsed_time:.1f}s")
-                    if elapsed_time >= target_time:
-                        try:
-                            self.motor.stop()
-                        except Exception as e:
-                            print("[WARNING] Error stopping motor:", e)
-                        self.motor_stopped = True
-                        self.next_button.setEnabled(True)
-                        self.next_button.show()  # Ensure the button is visible
-            else:
-                # Weight-based logic
-                target = self.recipe.get("Ice", 0)
-                compensated_target = self.get_compensated_target(target)
-                weight_grams = self.load_cell.get_weight()
-                weight_oz = weight_grams * GRAMS_TO_OZ
-
-                self.instruction_label.setText(
-                    f"Current weight: {weight_oz:.2f} oz (Target: {target:.2f} oz)"
-                )
-                self.gauge.setValue(weight_oz, target)
-
-                if weight_oz >= compensated_target:
-                    if not self.motor_stopped:
-                        try:
-                            self.motor.stop()
-                        except Exception as e:
-                            print("[WARNING] Error stopping motor:", e)
-                        self.motor_stopped = True
-                    self.next_button.setEnabled(True)
-                    self.next_button.show()  # Ensure the button is visible
-
-        elif self.state == 3:  # Flavor stage
-            target = self.recipe.get("Flavor", 0)
-            compensated_target = target  # No compensation for Flavor
-            self.instruction_label.setText(
-                f"Current weight: {weight_oz:.2f} oz (Target: {target:.2f} oz)"
-            )
-            self.gauge.setValue(weight_oz, target)  # Use the actual target for the gauge
-
-            # Use the compensated target for motor shutdown logic
-            if (self.state == 2 or self.state == 3) and weight_oz >= compensated_target:
-                if self.state == 2 and not self.motor_stopped:
-                    try:
-                        self.motor.stop()
-                    except Exception as e:
-                        print("[WARNING] Error stopping motor:", e)
-                    self.motor_stopped = True
-                self.next_button.setEnabled(True)
-                self.next_button.show()  # Ensure the button is visible
-            elif self.state == 2 or self.state == 3:
-                self.next_button.setEnabled(False)
-                self.next_button.show()  # Ensure the button is visible
-
-    def update_ui_for_state(self):
-        if self.state == 1:
+    def update_ui_for_state(self, event):
+        state = event["state"]
+        if state == dispense_engine.PLACE_CUP:
             self.instruction_label.setText("Place your cup and then press Next.")
             self.next_button.setText("Next")
             self.next_button.setEnabled(True)  # Enable the button on the first page
             self.next_button.show()
-        elif self.state == 2 or self.state == 3:
-            # Add GaugeWidget dynamically during later stages
-            if not hasattr(self, 'gauge'):
-                self.gauge = GaugeWidget()
-                self.gauge.setFixedSize(80, 180)
-                gauge_layout = QHBoxLayout()
-                gauge_layout.addStretch()
-                gauge_layout.addWidget(self.gauge)
-                gauge_layout.addStretch()
-                self.layout().insertLayout(2, gauge_layout)  # Insert gauge layout dynamically
-            self.next_button.setEnabled(False)  # Disable the button initially for target-hitting stages
+        elif state == dispense_engine.ZEROING:
+            self.next_button.hide()
+            if event["stage"] == dispense_engine.ICE:
+                self.instruction_label.setText("Zeroing cup, please wait...")
+            else:
+                self.elapsed_time_label.hide()  # Hide the elapsed time label
+                self.instruction_label.setText("Ice shaving complete. Zeroing cup for flavor addition...")
+        elif state == dispense_engine.ICE:
+            self.show_gauge()
+            self.elapsed_time_label.setText("Elapsed Time: 0.0s")
+            self.elapsed_time_label.show()  # Show the elapsed time label
+            self.instruction_label.setText("Shaving ice... Please wait.")
+        elif state == dispense_engine.ICE_DONE:
+            self.next_button.setEnabled(True)
+            self.next_button.show()  # Ensure the button is visible
+        elif state == dispense_engine.FLAVOR:
+            self.show_gauge()
+            self.instruction_label.setText("Add flavor until target weight reached.")
+            self.next_button.setEnabled(False)  # Disable the button until the target is hit
+        elif state == dispense_engine.FINISH:
+            self.instruction_label.setText("Flavor addition complete. Blend the cup to finish.")
+            self.next_button.setText("Finish")
+            self.next_button.setEnabled(True)
+            self.next_button.show()
+            self.exit_button.hide()  # Hide the Exit button during the last stage
+        elif state == dispense_engine.IDLE:
+            self.reset_ui()  # Finished, aborted or failed: return to the main page
 
     def reset_ui(self):
         self.flavor_dropdown.show()
@@ -438,6 +356,7 @@ class MainUI(QWidget):
         self.exit_button.show()  # Show the Exit button again
         self.settings_button.show()  # Show the Settings button again
         self.motor_settings_button.show()  # Show the Motor Settings button again
+        self.elapsed_time_label.hide()
         self.instruction_label.setText("Configure options and press Start")
 
         # Remove GaugeWidget if it exists
@@ -448,10 +367,6 @@ class MainUI(QWidget):
         
         self.abort_button.hide()  # Hide the Abort button when resetting the UI
         self.rotor_speed_label.show()  # Show the rotor speed label when returning to the start screen
-        self.load_cell.offset = self.original_offset  # Restore the original offset
-        print(f"[INFO] Offset reset to original value: {self.original_offset:.2f}")
-        self.state = 0
-        self.motor_stopped = False
 
     def close_program(self):
         """Close the application."""
@@ -463,64 +378,59 @@ class MainUI(QWidget):
         if self.settings_window is None:
             self.settings_window = SettingsWindow()
         self.settings_window.show()
-        self.settings_window.save_settings = self.reload_settings  # Hook into save_settings
 
     def open_motor_settings(self):
         """Open the motor settings UI."""
         self.motor_settings_window = WeightDisplay()
         self.motor_settings_window.main_ui_window = self
-        self.motor_settings_window.save_motor_speed_callback = self.reload_settings  # Set callback to reload settings
         self.motor_settings_window.show()
         self.hide()
 
-    def reload_settings(self):
-        """Reload settings after saving."""
-        self.app_settings = settings.load_settings()
-        self.flavor_dropdown.clear()
-        self.flavor_dropdown.addItems(list(self.app_settings["sizes"].keys()))
-        self.rotor_speed_label.setText(f"Rotor Speed Setting: {self.app_settings['rotor_speed']}%")
-        print("[INFO] Settings reloaded in MainUI.")
+    def on_settings_changed(self, changes):
+        """Apply settings.json deltas; the engine recompiles the affected recipes itself."""
+        for change in changes:
+            config_store.apply_change(self.app_settings, change)
+        sections = {change.section for change in changes}
+        if sections & {"rotor_speed", "speed_mode"}:
+            self.speed_mode = self.app_settings.get("speed_mode", "duty")
+            self.rotor_speed_label.setText(f"Rotor Speed Setting: {settings.format_speed(self.app_settings)}")
+            if "speed_mode" in sections:
+                self.check_speed_map()
+        if any(change.section == "sizes" and len(change.key) <= 2 for change in changes):
+            self.sync_flavors()  # Flavors added or removed
+        print(f"[INFO] Settings v{changes[-1].version} applied in MainUI: {len(changes)} change(s).")
+
+    def check_speed_map(self):
+        """RPM mode needs the duty->RPM map; ask the operator to learn it rather than spinning the rotor unasked."""
+        if self.speed_mode != "rpm" or self.motor.feedforward.ready:
+            return
+        print("[WARNING] Duty->RPM map not learned; learn it from Motor Settings before shaving.")
+        QMessageBox.information(self, "Speed Map Needed",
+                                "RPM mode needs a duty->RPM map. Open Motor Settings, make sure the rotor "
+                                "is empty and the cover is closed, and press \"Learn Speed Map\".")
+
+    def sync_flavors(self):
+        """Add and remove dropdown entries to match the recipes, keeping the selection."""
+        flavors = list(self.app_settings.get("sizes", {}))
+        for index in reversed(range(self.flavor_dropdown.count())):
+            if self.flavor_dropdown.itemText(index) not in flavors:
+                self.flavor_dropdown.removeItem(index)
+        for flavor in flavors:
+            if self.flavor_dropdown.findText(flavor) < 0:
+                self.flavor_dropdown.addItem(flavor)
 
     def abort_process(self):
         """Abort the process, stop the motor, and return to the start page."""
         print("[INFO] Process aborted by user.")
-        try:
-            self.motor.stop()  # Stop the motor if it's running
-        except Exception as e:
-            print(f"[WARNING] Error stopping motor during abort: {e}")
-        
-        # Perform the same cleanup as reset_ui
-        self.flavor_dropdown.show()
-        for btn in self.size_buttons.values():
-            btn.setChecked(False)
-            btn.setStyleSheet("font-size: 16px; background-color: #444; color: white;")
-            btn.show()
-        self.start_button.show()
-        self.next_button.hide()
-        self.exit_button.show()  # Show the Exit button again
-        self.settings_button.show()  # Show the Settings button again
-        self.motor_settings_button.show()  # Show the Motor Settings button again
-        self.instruction_label.setText("Configure options and press Start")
-
-        # Remove GaugeWidget if it exists
-        if hasattr(self, 'gauge'):
-            self.layout().removeWidget(self.gauge)
-            self.gauge.deleteLater()
-            del self.gauge
-
-        # Stop the timer for weight updates
-        if self.timer.isActive():
-            self.timer.stop()
-
-        self.abort_button.hide()  # Hide the Abort button when resetting the UI
-        self.rotor_speed_label.show()  # Show the rotor speed label when returning to the start screen
-        self.load_cell.offset = self.original_offset  # Restore the original offset
-        print(f"[INFO] Offset reset to original value: {self.original_offset:.2f}")
-        self.state = 0
-        self.motor_stopped = False
+        self.engine.abort()  # Stops the motor and restores the scale offset
+        self.reset_ui()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    config_store.watch()  # Pick up settings.json / calibration.json edits made outside the app
     window = MainUI()
     window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    window.engine.stop()
+    devices.shutdown()
+    sys.exit(exit_code)
@@ -1,3 +1,5 @@
+import sim_hardware
+sim_hardware.install_if_requested()  # Fake RPi.GPIO, pigpio and hx711 before anything imports them
 from hx711_reader import LoadCell
 import time
 
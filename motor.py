@@ -1,10 +1,24 @@
+import math
 import pigpio
 import time
 import threading
+from collections import deque
+import numpy as np
 import RPi.GPIO as GPIO
+from speed_control import PIDController, FeedforwardMap
+import config_store
 
 class BLDCMotor:
-    def __init__(self, pwm_pin, speed_pin, en_pin, brk_pin, motor_pulley_diameter=22, rotor_pulley_diameter=95, dir_pin=12):
+    PULSE_DELIVERY_SLACK = 0.02  # Seconds pigpio may hold back edge notifications
+
+    def __init__(self, pwm_pin, speed_pin, en_pin, brk_pin, motor_pulley_diameter=22, rotor_pulley_diameter=95, dir_pin=12,
+                 rpm_window=6, rpm_time_constant=0.0, rpm_timeout=0.5, cal_file="calibration.json"):
+        """
+        rpm_window: number of speed-pulse periods averaged by the `rpm` property.
+        rpm_time_constant: seconds of EMA smoothing applied to `rpm`, advanced per speed pulse (0 = off).
+        rpm_timeout: seconds without a pulse after which `rpm` reports 0.
+        cal_file: holds the "speed_control" section (PID gains, duty->RPM map).
+        """
         self.pwm_pin = pwm_pin
         self.speed_pin = speed_pin
         self.en_pin = en_pin
@@ -14,7 +28,39 @@ class BLDCMotor:
         self.rotor_pulley_diameter = rotor_pulley_diameter
         self.pulse_count = 0
         self.lock = threading.Lock()
+        self.rpm_window = rpm_window
+        self.rpm_time_constant = rpm_time_constant
+        self.rpm_timeout = rpm_timeout
+        self._pulse_periods = deque(maxlen=rpm_window)  # Microseconds between speed pulses
+        self._last_pulse_tick = None
+        self._last_pulse_time = None  # time.monotonic() of the last pulse
+        self._rpm_filtered = 0.0  # Smoothed RPM as of the last pulse, updated under the lock
         self.was_interrupted = False
+        self.enabled = False  # EN and BRK driven low (see release/brake)
+        self.released_at = 0.0  # time.monotonic() of the last release()
+
+        # Write-only command path: EN and BRK share one bank write, a stop is one
+        # daemon script. Read-back happens in verify_outputs(), off the hot path.
+        self._drive_bits = (1 << en_pin) | (1 << brk_pin)
+        self._commanded = {"en": 1, "brk": 1, "pwm": 0}  # Levels the last command wrote
+        self.command_seq = 0  # Incremented by every output command
+        self._stop_script = None
+        self._stop_script_ready = False
+
+        # Closed-loop speed control (see set_rpm)
+        self.duty_cycle = 0.0  # Last commanded duty (%)
+        self.target_rpm = None  # None = open-loop duty control
+        self.feedforward = FeedforwardMap(cal_file)
+        self.pid = PIDController.from_config(self.feedforward.config)
+        self.control_period = 1.0 / self.feedforward.config.get("loop_hz", 50)
+        config_store.store(cal_file).add_listener(self._on_calibration_changed)  # After the feedforward map's
+        self._control_thread = None
+        self._control_running = False
+
+        # Speed profile execution (see run_profile)
+        self.profile_phase = None
+        self._profile_thread = None
+        self._profile_running = False
 
         # Safety interlock setup
         self.interlock_pin = 25
@@ -40,67 +86,328 @@ class BLDCMotor:
         print("[INFO] Motor direction permanently set to HIGH (GPIO-12 HIGH).")
 
         self.callback = self.pi.callback(self.speed_pin, pigpio.RISING_EDGE, self._pulse_callback)
+        self._store_stop_script()
 
         print("[INFO] BLDC Motor initialized.")
 
+    def _store_stop_script(self):
+        """Store the daemon script that drives BRK, EN (p0) and the PWM value (p1) in one command."""
+        self._stop_script = None
+        self._stop_script_ready = False
+        try:
+            self._stop_script = self.pi.store_script(
+                f"w {self.brk_pin} p0 w {self.en_pin} p0 pwm {self.pwm_pin} p1".encode())
+        except Exception as e:
+            print(f"[WARNING] pigpio script unavailable, stopping with bank writes: {e}")
+
+    def _run_stop_script(self):
+        """Brake, disable and zero the PWM with one daemon command. False if the script cannot run now."""
+        if self._stop_script is None:
+            return False
+        try:
+            if not self._stop_script_ready:
+                # Stored scripts are compiled asynchronously; check once that it is runnable
+                status, _ = self.pi.script_status(self._stop_script)
+                if status != pigpio.PI_SCRIPT_HALTED:
+                    return False
+                self._stop_script_ready = True
+            self.pi.run_script(self._stop_script, [1, 0])
+            return True
+        except Exception:
+            return False
+
+    def _commanded_outputs(self, **levels):
+        self._commanded = dict(self._commanded, **levels)
+        self.command_seq += 1
+
     def _pulse_callback(self, gpio, level, tick):
         with self.lock:
             self.pulse_count += 1
+            if self._last_pulse_tick is not None:
+                period = pigpio.tickDiff(self._last_pulse_tick, tick)
+                self._pulse_periods.append(period)
+                self._smooth_rpm(period / 1e6)
+            self._last_pulse_tick = tick
+            self._last_pulse_time = time.monotonic()
+
+    def _smooth_rpm(self, dt):
+        """Advance the smoothed RPM by one pulse period of `dt` seconds (lock held)."""
+        total = sum(self._pulse_periods)
+        rpm = self._pulse_rate_to_rpm(len(self._pulse_periods) * 1e6 / total) if total > 0 else 0.0
+        if self.rpm_time_constant > 0 and self._rpm_filtered > 0:
+            alpha = 1.0 - math.exp(-dt / self.rpm_time_constant)
+            rpm = self._rpm_filtered + alpha * (rpm - self._rpm_filtered)
+        self._rpm_filtered = rpm
+
+    def _reset_pulse_timing(self):
+        with self.lock:
+            self._pulse_periods.clear()
+            self._last_pulse_tick = None
+            self._last_pulse_time = None
+            self._rpm_filtered = 0.0
+
+    def _pulse_rate_to_rpm(self, frequency):
+        """Convert speed-pin pulse frequency (Hz) to rotor RPM."""
+        motor_rpm = (frequency / 2) * (60 / 3)  # Motor RPM calculation
+        pulley_ratio = self.rotor_pulley_diameter / self.motor_pulley_diameter
+        rotor_rpm = motor_rpm / pulley_ratio  # Convert motor RPM to rotor RPM
+        correction_factor = 1.031
+        return rotor_rpm * correction_factor
+
+    @property
+    def rpm(self):
+        """
+        Rotor RPM from the last `rpm_window` pulse periods, smoothed per pulse
+        over `rpm_time_constant` seconds. Never blocks and has no side effects,
+        so any number of threads may poll it. Once the next pulse is clearly
+        overdue (two periods plus the callback delivery slack) the elapsed
+        time bounds the period, so the value falls as the rotor stops.
+        """
+        with self.lock:
+            if not self._pulse_periods:
+                return 0.0
+            period = sum(self._pulse_periods) / len(self._pulse_periods) / 1e6
+            age = time.monotonic() - self._last_pulse_time
+            rpm = self._rpm_filtered
+        if age > self.rpm_timeout:
+            return 0.0
+        if age > 2 * period + self.PULSE_DELIVERY_SLACK:
+            rpm = min(rpm, self._pulse_rate_to_rpm(1.0 / age))
+        return rpm
+
+    def expected_rpm(self):
+        """No-load rotor RPM for the commanded duty from the duty->RPM map, or None without a map."""
+        if not self.feedforward.ready:
+            return None
+        return self.feedforward.rpm_for(self.duty_cycle)
 
     def interlock_triggered(self):
         """Check if the safety interlock (lid) is triggered."""
         return GPIO.input(self.interlock_pin) == GPIO.HIGH
 
     def check_interlock_and_stop(self):
-        """Stop the motor if the interlock is triggered."""
-        if self.interlock_triggered():
+        """Stop the motor if the interlock is triggered while it runs."""
+        if self.enabled and self.interlock_triggered():
             print("[SAFETY] Cover removed! Stopping motor...")
-            self.stop()
+            self.brake()
             self.was_interrupted = True
 
+    def _write_duty(self, duty_cycle):
+        pwm_value = int((duty_cycle / 100.0) * 255)
+        self.pi.set_PWM_dutycycle(self.pwm_pin, pwm_value)
+        self.duty_cycle = duty_cycle
+        self._commanded_outputs(pwm=pwm_value)
+        return pwm_value
+
     def set_speed(self, duty_cycle):
-        """Set the motor speed, ensuring the interlock is not triggered."""
+        """
+        Set the motor speed (open loop), ensuring the interlock is not triggered.
+        Write-only: one PWM command, no read-back (see verify_outputs()).
+        """
         if self.interlock_triggered():
             print("[WARNING] Cover open! Motor speed set request ignored.")
             self.was_interrupted = True
             return
         if 0 <= duty_cycle <= 100:
-            pwm_value = int((duty_cycle / 100.0) * 255)
-            self.pi.set_PWM_dutycycle(self.pwm_pin, pwm_value)
-            actual_freq = self.pi.get_PWM_frequency(self.pwm_pin)
-            actual_duty = self.pi.get_PWM_dutycycle(self.pwm_pin)
-            print(f"[INFO] Motor Speed: {duty_cycle}% | PWM: {pwm_value}/255 | Freq: {actual_freq} Hz | Duty Confirmed: {actual_duty}")
+            self._stop_profile()
+            self._stop_regulator()
+            self._write_duty(duty_cycle)
         else:
             raise ValueError("Duty cycle must be between 0 and 100.")
 
-    def start(self):
-        """Start the motor, ensuring the interlock is not triggered."""
+    def set_rpm(self, target_rpm):
+        """
+        Hold the rotor at target_rpm (closed loop). The duty starts at the
+        feedforward value for target_rpm and a PID loop running at loop_hz
+        corrects it from the measured `rpm`, so ice load does not slow the rotor.
+        """
+        if self.interlock_triggered():
+            print("[WARNING] Cover open! Motor speed set request ignored.")
+            self.was_interrupted = True
+            return
+        if not self.feedforward.ready:
+            raise RuntimeError("No duty->RPM map; run learn_feedforward() first.")
+        if target_rpm < 0:
+            raise ValueError("Target RPM must not be negative.")
+        self._stop_profile()
+        self._regulate_to(target_rpm)
+        print(f"[INFO] Motor Speed: {self.target_rpm:.0f} RPM (closed loop, feedforward {self.feedforward.duty_for(self.target_rpm):.1f}%)")
+
+    def _regulate_to(self, target_rpm):
+        if not self._control_running:
+            self._stop_regulator()  # Let a loop ended by emergency_brake() finish first
+            self.target_rpm = float(target_rpm)
+            self.pid.reset()
+            self._write_duty(self.feedforward.duty_for(self.target_rpm))
+            self._control_running = True
+            self._control_thread = threading.Thread(target=self._control_loop, daemon=True)
+            self._control_thread.start()
+        else:
+            self.target_rpm = float(target_rpm)
+
+    def run_at(self, speed, mode="duty"):
+        """Apply a settings.json rotor_speed: duty % in "duty" mode, rotor RPM in "rpm" mode."""
+        if mode == "rpm":
+            self.set_rpm(speed)
+        else:
+            self.set_speed(speed)
+
+    def run_profile(self, profile, progress, mode="duty"):
+        """
+        Execute a SpeedProfile on a motor thread until the next brake or speed
+        command. progress() returns the filled fraction of the Ice target and
+        is polled every control period, so the finishing band starts within
+        milliseconds of the cup reaching finish_at.
+        """
+        if self.interlock_triggered():
+            print("[WARNING] Cover open! Motor speed set request ignored.")
+            self.was_interrupted = True
+            return
+        if mode == "rpm" and not self.feedforward.ready:
+            raise RuntimeError("No duty->RPM map; run learn_feedforward() first.")
+        self._stop_profile()
+        self._stop_regulator()
+        profile.reset()
+        self._profile_running = True
+        self._profile_thread = threading.Thread(target=self._profile_loop, args=(profile, progress, mode), daemon=True)
+        self._profile_thread.start()
+        print(f"[INFO] Speed profile: ramp to {profile.bulk_speed} over {profile.ramp_time}s, "
+              f"{profile.finish_speed} from {profile.finish_at:.0%} of target ({mode})")
+
+    def _profile_loop(self, profile, progress, mode):
+        started = time.monotonic()
+        speed = None
+        while self._profile_running:
+            try:
+                phase, new_speed = profile.speed_at(time.monotonic() - started, progress())
+                if phase != self.profile_phase:
+                    print(f"[INFO] Speed profile phase: {phase} ({new_speed:.0f})")
+                    self.profile_phase = phase
+                if not self._profile_running or not self.enabled:
+                    break  # Braked meanwhile; never restart the speed loop
+                if new_speed != speed and not self.interlock_triggered():
+                    speed = new_speed
+                    if mode == "rpm":
+                        self._regulate_to(speed)
+                    else:
+                        self._write_duty(min(max(speed, 0.0), 100.0))
+            except Exception as e:
+                print(f"[ERROR] Speed profile stopped: {e}")
+                self._profile_running = False
+            time.sleep(self.control_period)
+
+    def _stop_profile(self):
+        self._profile_running = False
+        thread = self._profile_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._profile_thread = None
+        self.profile_phase = None
+
+    def _control_loop(self):
+        last = time.monotonic()
+        while self._control_running:
+            time.sleep(self.control_period)
+            now = time.monotonic()
+            dt, last = now - last, now
+            target = self.target_rpm
+            if target is None or self.interlock_triggered():
+                continue
+            correction = self.pid.update(target - self.rpm, dt)
+            duty = min(max(self.feedforward.duty_for(target) + correction, 0.0), 100.0)
+            try:
+                self._write_duty(duty)
+            except Exception as e:
+                print(f"[ERROR] Speed control stopped: {e}")
+                self._control_running = False
+
+    def _stop_regulator(self):
+        self._control_running = False
+        self.target_rpm = None
+        thread = self._control_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._control_thread = None
+
+    def _on_calibration_changed(self, changes):
+        """Edited PID gains or loop rate apply to the running regulator."""
+        if any(change.section == "speed_control" for change in changes):
+            self.pid.configure(self.feedforward.config)
+            self.control_period = 1.0 / self.feedforward.config.get("loop_hz", 50)
+
+    def learn_feedforward(self, duties=(20, 40, 60, 80, 100), settle_time=1.5, sample_time=0.5):
+        """
+        Sweep the unloaded rotor through `duties`, record the steady RPM at each
+        and save the duty->RPM map. The rotor spins for about
+        len(duties) * (settle_time + sample_time) seconds. Returns False if the
+        motor could not run (cover open).
+        """
+        print("[INFO] Learning duty->RPM map...")
+        if not self.start():
+            return False
+        self.was_interrupted = False
+        points = {}
+        try:
+            for duty in duties:
+                self.set_speed(duty)
+                time.sleep(settle_time)
+                readings = []
+                end = time.monotonic() + sample_time
+                while time.monotonic() < end:
+                    readings.append(self.rpm)
+                    time.sleep(0.02)
+                if self.was_interrupted:
+                    print("[WARNING] Duty->RPM learning interrupted.")
+                    return False
+                points[duty] = float(np.median(readings))
+                print(f"[INFO]   {duty}% -> {points[duty]:.0f} RPM")
+        finally:
+            self.stop()
+        self.feedforward.update(points)
+        return True
+
+    def release(self):
+        """
+        Enable the driver and release the brake on the open pigpio session,
+        ensuring the interlock is not triggered. EN and BRK go low with one
+        bank write; only reconnects if the session was shut down. A PWM
+        duty left over from a brake is zeroed first, so the driver never
+        wakes at a stale speed. Set the speed afterwards.
+        """
         if self.interlock_triggered():
             print("[WARNING] Cannot start motor: Cover is open.")
             self.was_interrupted = True
             return False
 
-        print("[INFO] Starting motor...")
         try:
             if self.pi is None or not self.pi.connected:
-                print("[ERROR] pigpio connection lost. Reinitializing...")
+                print("[INFO] Reconnecting to pigpio daemon...")
                 self.pi = pigpio.pi()
                 if not self.pi.connected:
                     raise RuntimeError("Failed to reconnect to pigpio daemon.")
-
-            print("[DEBUG] Enabling motor and releasing brake...")
-            self.callback = self.pi.callback(self.speed_pin, pigpio.RISING_EDGE, self._pulse_callback)  # Reinitialize callback
+                self.callback = None
+                self._store_stop_script()
+            if self.callback is None:
+                self.callback = self.pi.callback(self.speed_pin, pigpio.RISING_EDGE, self._pulse_callback)
             self.pulse_count = 0  # Reset pulse count to ensure accurate RPM calculation
+            self._reset_pulse_timing()
 
-            self.pi.write(self.en_pin, 0)
-            self.pi.write(self.brk_pin, 0)
-            time.sleep(0.5)  # Allow motor to stabilize before RPM calculation
-            print("[INFO] Motor enabled and brake released.")
+            if self._commanded["pwm"] != 0:
+                self._write_duty(0)  # Braked without the stop script: PWM still at the old duty
+            self.pi.clear_bank_1(self._drive_bits)  # EN and BRK low in one command
+            self._commanded_outputs(en=0, brk=0)
+            self.enabled = True
+            self.released_at = time.monotonic()
+            self.was_interrupted = False
             return True
         except Exception as e:
             print(f"[ERROR] Exception occurred while starting motor: {e}")
             return False
 
+    def start(self):
+        """Start the motor (same as release())."""
+        return self.release()
+
     def get_rpm(self, sample_time=1.0):
         with self.lock:
             start_count = self.pulse_count
@@ -110,22 +417,86 @@ class BLDCMotor:
 
         pulses = end_count - start_count
         frequency = pulses / sample_time
-        motor_rpm = (frequency / 2) * (60 / 3)  # Motor RPM calculation
-        pulley_ratio = self.rotor_pulley_diameter / self.motor_pulley_diameter
-        rotor_rpm = motor_rpm / pulley_ratio  # Convert motor RPM to rotor RPM
-        correction_factor = 1.031
-        return rotor_rpm * correction_factor  # Return rotor RPM
+        return self._pulse_rate_to_rpm(frequency)  # Return rotor RPM
+
+    def emergency_brake(self):
+        """
+        Brake and disable the driver with one bank write, then zero the PWM.
+        Safe to call from a GPIO callback; the speed loop exits on its own.
+        """
+        self.pi.set_bank_1(self._drive_bits)  # BRK and EN high in one command
+        self._braked()
+        self._write_duty(0)  # After the safety-critical write
+
+    def _braked(self):
+        self._commanded_outputs(en=1, brk=1)
+        self.enabled = False
+        self._control_running = False
+        self._profile_running = False
+
+    def brake(self):
+        """
+        Stop the rotor: brake, disable the driver and zero the PWM with one
+        daemon script (bank write plus PWM write if the script is unavailable).
+        The pigpio session stays open.
+        """
+        if self._run_stop_script():
+            self.duty_cycle = 0.0
+            self._braked()
+            self._commanded_outputs(pwm=0)
+        else:
+            self.emergency_brake()
+        self._stop_profile()
+        self._stop_regulator()
+        if self.duty_cycle != 0:
+            self._write_duty(0)  # A speed loop wrote once more before it exited
 
     def stop(self):
-        """Stop the motor and clean up resources."""
-        self.pi.write(self.brk_pin, 1)
-        self.pi.write(self.en_pin, 1)
-        if hasattr(self, 'callback') and self.callback is not None:
+        """Stop the motor (same as brake()). Use shutdown() to release pigpio on exit."""
+        self.brake()
+
+    def shutdown(self):
+        """Brake, cancel the speed callback and close the pigpio session."""
+        if self.pi is None or not self.pi.connected:
+            return
+        self.brake()
+        if self.callback is not None:
             self.callback.cancel()
+            self.callback = None
         self.pi.set_servo_pulsewidth(self.pwm_pin, 0)
+        if self._stop_script is not None:
+            try:
+                self.pi.delete_script(self._stop_script)
+            except Exception:
+                pass
+            self._stop_script = None
         self.pi.stop()
         print("[INFO] Motor stopped and resources cleaned up.")
 
+    def read_outputs(self):
+        """Read EN, BRK, PWM value and PWM frequency back from pigpio (several daemon round trips)."""
+        bank = self.pi.read_bank_1()
+        return {
+            "en": (bank >> self.en_pin) & 1,
+            "brk": (bank >> self.brk_pin) & 1,
+            "pwm": self.pi.get_PWM_dutycycle(self.pwm_pin),
+            "freq": self.pi.get_PWM_frequency(self.pwm_pin),
+        }
+
+    def verify_outputs(self):
+        """
+        Compare the pin levels with the last command. Returns a dict with "ok",
+        "expected" and "actual", or None if a command changed the outputs
+        during the read-back. Meant for a diagnostics thread, never the command path.
+        """
+        seq = self.command_seq
+        expected = dict(self._commanded)
+        actual = self.read_outputs()
+        if self.command_seq != seq:
+            return None
+        ok = all(actual[key] == level for key, level in expected.items())
+        return {"ok": ok, "expected": expected, "actual": actual, "seq": seq}
+
     def debug_status(self):
         print("[DEBUG] EN:", self.pi.read(self.en_pin))
         print("[DEBUG] BRK:", self.pi.read(self.brk_pin))
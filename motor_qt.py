@@ -1,18 +1,30 @@
-from PySide6.QtCore import QObject, Slot
-from motor import BLDCMotor
+from PySide6.QtCore import QObject, Signal, Slot
+import devices
+import hw_events
 
 class MotorController(QObject):
+    lidChanged = Signal(bool)  # True = cover opened; the motor is already braked
+    driverFault = Signal(bool)  # True = ALM fault; the motor is already braked
+    rotorJammed = Signal(float, float)  # Measured RPM, expected RPM (0 for a full stall or without a duty->RPM map)
+
     def __init__(self):
         super().__init__()
-        # Set your GPIO pin numbers here
-        self.motor = BLDCMotor(
-            pwm_pin=18,         # adjust as needed
-            speed_pin=16,
-            en_pin=20,
-            brk_pin=19
-        )
+        self.motor = devices.motor()  # Pins are set in devices.MOTOR_PINS
+        self.hw_events = devices.events()
+        self.hw_events.subscribe(self._on_hardware_event,
+                                 types=(hw_events.LID_OPEN, hw_events.LID_CLOSED, hw_events.FAULT, hw_events.FAULT_CLEARED,
+                                        hw_events.STALL, hw_events.JAM))
         self.default_speed = 60  # default duty cycle %
 
+    def _on_hardware_event(self, event):
+        # Runs on the pigpio callback thread; the signals are queued to QML
+        if event["type"] in (hw_events.LID_OPEN, hw_events.LID_CLOSED):
+            self.lidChanged.emit(event["type"] == hw_events.LID_OPEN)
+        elif event["type"] in (hw_events.STALL, hw_events.JAM):
+            self.rotorJammed.emit(event["rpm"], event.get("expected_rpm") or 0.0)
+        else:
+            self.driverFault.emit(event["type"] == hw_events.FAULT)
+
     @Slot()
     def start_motor(self):
         print("[INFO] Attempting to start motor...")
@@ -0,0 +1,118 @@
+import time
+import numpy as np
+import config_store
+
+
+class OvershootLearner:
+    """
+    Learns the per-speed ice overshoot (settled weight minus weight at motor stop)
+    and keeps the "overshoot_compensation" map in calibration.json up to date.
+
+    Each rotor speed keeps its last `history` observations. The stored value moves
+    toward their median by `gain`, each update is limited to `max_step`, and the
+    result is clamped to [0, max_value], so a single bad pour cannot wreck the
+    table. Every accepted update bumps "overshoot_learning.version". Edits of
+    the table made elsewhere (another process, an editor) are picked up from
+    the calibration store's change events.
+
+    Stages stopped by the flow predictor are learned the same way, but into
+    the predictor's "ice_cutoff.stop_delay": the seconds of fall-off it adds
+    at the current flow rate. Each such stage observes the delay that would
+    have predicted its settled weight, (settled - fitted weight at stop) /
+    flow rate, limited per update to `max_delay_step` and clamped to
+    [0, max_delay].
+    """
+
+    def __init__(self, cal_file="calibration.json", history=9, gain=0.5, max_step=0.3, max_value=5.0,
+                 max_delay_step=0.1, max_delay=2.0):
+        self.cal_file = cal_file
+        self.history = history
+        self.gain = gain
+        self.max_step = max_step
+        self.max_value = max_value
+        self.max_delay_step = max_delay_step
+        self.max_delay = max_delay
+        self.compensation = {}
+        self.observations = {}
+        self.stop_delay = 0.4
+        self.delay_observations = []
+        self.version = 0
+        self.load()
+        config_store.store(cal_file).add_listener(self._on_calibration_changed)
+
+    def _on_calibration_changed(self, changes):
+        if any(change.section in ("overshoot_compensation", "overshoot_learning", "ice_cutoff") for change in changes):
+            self.load()
+
+    def load(self):
+        config = config_store.store(self.cal_file)
+        learning = config.get("overshoot_learning", {})
+        self.compensation = dict(config.get("overshoot_compensation", {}))
+        self.observations = {k: list(v) for k, v in learning.get("history", {}).items()}
+        self.stop_delay = config.get("ice_cutoff", {}).get("stop_delay", 0.4)
+        self.delay_observations = list(learning.get("stop_delay_history", []))
+        self.version = learning.get("version", 0)
+
+    def record(self, rotor_speed, stop_weight, settled_weight):
+        """Record one ice stage and return the updated compensation for its speed."""
+        key = str(int(rotor_speed))
+        overshoot = settled_weight - stop_weight
+        if not -self.max_value <= overshoot <= 2 * self.max_value:
+            print(f"[WARNING] Ignoring implausible overshoot {overshoot:.2f} at speed {key}")
+            return self.compensation.get(key, 0)
+
+        history = self.observations.setdefault(key, [])
+        history.append(round(overshoot, 3))
+        del history[:-self.history]
+
+        current = self.compensation.get(key, float(np.median(history)))
+        step = self.gain * (float(np.median(history)) - current)
+        step = min(max(step, -self.max_step), self.max_step)
+        updated = round(min(max(current + step, 0.0), self.max_value), 3)
+
+        self.compensation[key] = updated
+        self.version += 1
+        print(f"[INFO] Overshoot at speed {key}: measured {overshoot:.2f}, compensation {current:.2f} -> {updated:.2f} (v{self.version})")
+        self.save()
+        return updated
+
+    def record_stop_delay(self, fitted_weight, rate, settled_weight):
+        """
+        Record one predictor-stopped ice stage (weights and rate in the same
+        unit, e.g. oz and oz/s) and return the updated stop_delay.
+        """
+        if rate <= 0:
+            return self.stop_delay  # Nothing was falling; the stage says nothing about the delay
+        delay = (settled_weight - fitted_weight) / rate
+        if not -self.max_delay <= delay <= 2 * self.max_delay:
+            print(f"[WARNING] Ignoring implausible stop delay {delay:.2f}s")
+            return self.stop_delay
+
+        history = self.delay_observations
+        history.append(round(delay, 3))
+        del history[:-self.history]
+
+        current = self.stop_delay
+        step = self.gain * (float(np.median(history)) - current)
+        step = min(max(step, -self.max_delay_step), self.max_delay_step)
+        updated = round(min(max(current + step, 0.0), self.max_delay), 3)
+
+        self.stop_delay = updated
+        self.version += 1
+        print(f"[INFO] Predicted stop: fall-off took {delay:.2f}s, stop_delay {current:.2f} -> {updated:.2f}s (v{self.version})")
+        ice_cutoff = config_store.store(self.cal_file).get("ice_cutoff", {})
+        ice_cutoff["stop_delay"] = updated
+        self.save({"ice_cutoff": ice_cutoff})
+        return updated
+
+    def save(self, sections=None):
+        """Merge the learned table (and any extra sections) into calibration.json."""
+        config_store.store(self.cal_file).update(dict(sections or {}, **{
+            "overshoot_compensation": self.compensation,
+            "overshoot_learning": {
+                "version": self.version,
+                "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "history": self.observations,
+                "stop_delay_history": self.delay_observations,
+            },
+        }))
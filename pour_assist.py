@@ -0,0 +1,73 @@
+import time
+from flow_predictor import FlowRatePredictor
+
+
+class PourAssistant:
+    """
+    Guides the manual flavor pour from the live weight stream.
+
+    The pour rate is the least-squares slope over the last `window` seconds
+    (a FlowRatePredictor). The "stop now" cue projects the weight forward by
+    everything between a sample and the operator's hand: the age of the
+    newest sample, `display_latency` (event -> repaint) and `reaction_time`,
+    so the cue fires while the operator can still land on the target. Below
+    `min_rate` per second the operator is not pouring and there is no ETA.
+    Units follow the weights fed in (g or oz).
+    """
+
+    def __init__(self, window=0.5, min_samples=5, display_latency=0.05, reaction_time=0.25, min_rate=0.5):
+        self.display_latency = display_latency
+        self.reaction_time = reaction_time
+        self.min_rate = min_rate
+        self.predictor = FlowRatePredictor(stop_delay=display_latency + reaction_time,
+                                           window=window, min_samples=min_samples)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an assistant from the "pour_assist" section of calibration.json."""
+        config = config or {}
+        return cls(
+            window=config.get("window", 0.5),
+            min_samples=config.get("min_samples", 5),
+            display_latency=config.get("display_latency", 0.05),
+            reaction_time=config.get("reaction_time", 0.25),
+            min_rate=config.get("min_rate", 0.5),
+        )
+
+    def reset(self):
+        self.predictor.reset()
+
+    def add(self, timestamp, weight):
+        """Add one weight reading (e.g. from an engine tick)."""
+        self.predictor.stop_delay = self.display_latency + self.reaction_time
+        self.predictor.add(timestamp, weight)
+
+    def update_window(self, times, weights):
+        """Refit from a window of streamed samples; the newest sample's age counts as latency."""
+        sample_age = max(time.monotonic() - times[-1], 0.0) if len(times) else 0.0
+        self.predictor.stop_delay = sample_age + self.display_latency + self.reaction_time
+        self.predictor.update_window(times, weights)
+
+    @property
+    def latency(self):
+        """Seconds the cue looks ahead."""
+        return self.predictor.stop_delay
+
+    @property
+    def rate(self):
+        """Pour rate in weight units per second, or None before enough samples."""
+        return self.predictor.rate
+
+    @property
+    def pouring(self):
+        return self.predictor.ready and self.predictor.rate >= self.min_rate
+
+    def time_to_stop(self, target):
+        """Seconds until the operator should stop pouring, or None while not pouring."""
+        if not self.pouring:
+            return None
+        return self.predictor.time_to_target(target)
+
+    def stop_now(self, target):
+        """True once the weight will reach target by the time the operator reacts to the cue."""
+        return self.predictor.should_stop(target)
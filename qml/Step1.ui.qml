@@ -24,6 +24,12 @@ Rectangle {
             label.text = "Tare complete"
             nextBtn.visible = true
         }
+        function onTareFailed(reason) {
+            console.log("❌ Backend tare failed: " + reason)
+            rectangle.tareComplete = false
+            label.text = "Tare failed – try again"
+            okBtn.visible = true
+        }
     }
 
     Button {
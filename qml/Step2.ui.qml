@@ -13,72 +13,27 @@ Rectangle {
     anchors.fill: parent  // Ensure no conflicting anchors
     color: "#1c1c1c"
 
-    property bool motorRunning: false
-    property bool motorDone: false
-    property real targetWeight: {
-        const flavor = AppState.selectedFlavor
-        const size = AppState.selectedSize
-        const sizes = AppSettings.sizes
-
-        console.log("DEBUG Step2 - Flavor:", flavor)
-        console.log("DEBUG Step2 - Size:", size)
-
-        if (sizes && sizes[flavor] && sizes[flavor][size]) {
-            const ice = sizes[flavor][size]["Ice"]
-            console.log("DEBUG Step2 - Target ICE weight =", ice)
-            return ice
+    // The order runs in the Python DispenseEngine; this page only renders it and sends commands
+    Connections {
+        target: Dispense
+        function onStateChanged() {
+            console.log("DEBUG Step2 - Dispense state:", Dispense.state)
+            if (Dispense.state === "zeroing")
+                statusLabel.text = "Zeroing cup..."
+            else if (Dispense.state === "ice")
+                statusLabel.text = "Shaving Ice..."
+            else if (Dispense.state === "ice_done")
+                statusLabel.text = "Shaving Complete!"
         }
-
-        console.log("DEBUG Step2 - Missing data. Fallback to 1.")
-        return 1.0
-    }
-
-    Timer {
-        id: motorStartDelay
-        interval: 3000
-        running: false  // Start manually on Component.onCompleted
-        repeat: false
-        onTriggered: {
-            console.log("⏳ Motor delay done — attempting to start motor")
-            MotorController.start_motor()
-            console.log("✅ Motor start command issued.")
-            motorRunning = true
-            statusLabel.text = "Shaving Ice..."
-            stabilizationDelay.start()  // Start stabilization delay
+        function onSettled() {
+            statusLabel.text = "Ice settled"
         }
-    }
-
-    Timer {
-        id: stabilizationDelay
-        interval: 2000  // 2-second delay for load cell stabilization
-        running: false
-        repeat: false
-        onTriggered: {
-            console.log("✅ Stabilization complete — starting weight polling")
-            weightPoller.start()
+        function onInterrupted() {
+            statusLabel.text = "Cover open – close it and press Resume"
+            resumeButton.visible = true
         }
-    }
-
-    Timer {
-        id: weightPoller
-        interval: 100  // Reduced interval for better responsiveness
-        repeat: true
-        running: false
-        onTriggered: {
-            const g = LoadCellReader.weight || 0
-            const oz = Math.max(g * 0.035274, 0);  // Ensure no negative weights
-            console.log("DEBUG: Current weight:", oz.toFixed(2), "oz")
-            weightLabel.text = oz.toFixed(2) + " oz / " + targetWeight.toFixed(1) + " oz"
-            if (motorRunning && !motorDone && oz >= targetWeight) {
-                console.log("✅ Target reached – stopping motor")
-                MotorController.stop_motor()
-                motorRunning = false
-                motorDone = true
-                statusLabel.text = "Shaving Complete!"
-                weightPoller.stop()
-            } else if (!motorRunning) {
-                console.log("⚠️ Motor is not running but weightPoller is active.")
-            }
+        function onOrderFailed(title, reason) {
+            statusLabel.text = title + ": " + reason
         }
     }
 
@@ -94,7 +49,7 @@ Rectangle {
 
     Text {
         id: weightLabel
-        text: "0.00 oz"
+        text: Dispense.weight.toFixed(2) + " oz / " + Dispense.target.toFixed(1) + " oz"
         font.pixelSize: 28
         color: "white"
         z: 10
@@ -118,13 +73,32 @@ Rectangle {
             radius: 6
         }
         onClicked: {
-            MotorController.stop_motor()
-            motorRunning = false
-            weightPoller.stop()
+            Dispense.abort()
             AppStackView.pop()
         }
     }
 
+    Button {
+        id: resumeButton
+        text: "Resume"
+        width: 120
+        height: 50
+        visible: false
+        anchors.bottom: parent.bottom
+        anchors.left: parent.left
+        anchors.bottomMargin: 20
+        anchors.leftMargin: 20
+        background: Rectangle {
+            color: "#1003e8"
+            radius: 6
+        }
+        onClicked: {
+            resumeButton.visible = false
+            statusLabel.text = "Shaving Ice..."
+            Dispense.resume()
+        }
+    }
+
     Rectangle {
         id: progressBar
         height: 243
@@ -145,19 +119,30 @@ Rectangle {
             anchors.right: parent.right
             anchors.bottom: parent.bottom
             height: {
-                const g = LoadCellReader.weight || 0
-                const oz = g * 0.035274
-                return Math.min(oz / targetWeight, 1.0) * parent.height
+                const percent = Dispense.target > 0 ? Math.min(Dispense.weight / Dispense.target, 1.0) : 0
+                return percent * parent.height
             }
             color: {
-                const g = LoadCellReader.weight || 0
-                const oz = g * 0.035274
-                const percent = Math.min(oz / targetWeight, 1.0)
+                const percent = Dispense.target > 0 ? Math.min(Dispense.weight / Dispense.target, 1.0) : 0
+                if (Dispense.stopNow && percent < 1.0)
+                    return "#ffd200"  // Stop cue while pouring flavor
                 return Qt.rgba(1 - percent, percent, 0, 1)
             }
         }
     }
 
+    Text {
+        id: pourLabel
+        visible: Dispense.state === "flavor"
+        text: Dispense.stopNow ? "STOP" : (Dispense.eta >= 0 ? "Stop in " + Dispense.eta.toFixed(1) + " s" : "")
+        font.pixelSize: 28
+        font.bold: Dispense.stopNow
+        color: Dispense.stopNow ? "#ffd200" : "white"
+        anchors.bottom: progressBar.top
+        anchors.horizontalCenter: progressBar.horizontalCenter
+        anchors.bottomMargin: 10
+    }
+
     Label {
         id: label
         text: qsTr("Ice Shaving")
@@ -169,8 +154,8 @@ Rectangle {
     }
 
     Component.onCompleted: {
-        console.log("📦 Step2 loaded — initializing load cell and starting motor delay timer")
-        LoadCellReader.tare()  // Tare the load cell before starting the motor
-        motorStartDelay.start()  // Start motor delay directly
+        console.log("📦 Step2 loaded — starting the order (zero, then shave)")
+        if (Dispense.startOrder(AppState.selectedFlavor, AppState.selectedSize))
+            Dispense.next()  // The cup is already on the scale (Step1)
     }
 }
\ No newline at end of file
@@ -0,0 +1,139 @@
+from collections import namedtuple
+import numpy as np
+from speed_profile import SpeedProfile
+
+GRAMS_PER_OZ = 28.35
+
+# Stages of a plan, in dispense order
+ICE = "ice"
+FLAVOR = "flavor"
+
+
+class RecipeError(ValueError):
+    """A settings.json recipe that cannot be dispensed."""
+
+
+class DispensePlan(namedtuple("DispensePlan", [
+        "flavor", "size",
+        "stages",            # Tuple of ICE / FLAVOR, in order
+        "ice_target_g",      # Ice target; 0 for time-based recipes without an Ice weight
+        "ice_stop_g",        # Static stop threshold: ice target minus the overshoot at stop_speed
+        "ice_time",          # Seconds of shaving for time-based recipes (mapped or fixed "Time"), else None
+        "flavor_target_g",
+        "rotor_speed",       # Global rotor speed (speed_mode unit)
+        "stop_speed",        # Rotor speed when the ice stage stops (profile finish speed or rotor_speed)
+        "speed_profile",     # SpeedProfile or None
+        "recipe",            # The settings.json entry the plan was compiled from
+])):
+    """
+    One validated, precomputed order: all targets in grams (the load cell's
+    unit), so the dispense engine only compares numbers per tick. Build plans
+    with compile_plans().
+    """
+    __slots__ = ()
+
+    @property
+    def is_time_based(self):
+        return self.ice_time is not None
+
+    @property
+    def ice_target_oz(self):
+        return self.ice_target_g / GRAMS_PER_OZ
+
+    @property
+    def flavor_target_oz(self):
+        return self.flavor_target_g / GRAMS_PER_OZ
+
+
+def interpolate_time(speed_time_mapping, speed):
+    """
+    Shaving time (s) at a rotor speed from a {"speed": seconds} mapping,
+    linearly interpolated between the listed speeds. Raises RecipeError
+    for a malformed mapping or a speed outside the listed range.
+    """
+    try:
+        points = sorted((float(s), float(t)) for s, t in speed_time_mapping.items())
+    except (TypeError, ValueError):
+        raise RecipeError(f"speed_time_mapping must map speeds to seconds: {speed_time_mapping}")
+    if not points:
+        raise RecipeError("speed_time_mapping is empty.")
+    speeds, times = zip(*points)
+    if min(times) <= 0:
+        raise RecipeError("speed_time_mapping times must be positive.")
+    if not speeds[0] <= speed <= speeds[-1]:
+        raise RecipeError(f"Rotor speed {speed:g} is outside the speed_time_mapping range "
+                          f"{speeds[0]:g}-{speeds[-1]:g}.")
+    return float(np.interp(speed, speeds, times))
+
+
+def _weight_g(recipe, key):
+    value = recipe.get(key, 0)
+    if not isinstance(value, (int, float)) or value < 0:
+        raise RecipeError(f"{key} must be a non-negative weight in oz, not {value!r}.")
+    return float(value) * GRAMS_PER_OZ
+
+
+def compile_plan(flavor, size, recipe, app_settings, compensation=None):
+    """
+    Validate one recipe and precompute its DispensePlan. compensation is the
+    per-speed overshoot table (oz) from calibration.json. Raises RecipeError.
+    """
+    if not isinstance(recipe, dict) or not recipe:
+        raise RecipeError(f"Recipe not found: {flavor} / {size}")
+    compensation = compensation or {}
+    speed_mode = app_settings.get("speed_mode", "duty")
+    rotor_speed = app_settings.get("rotor_speed")
+    if not isinstance(rotor_speed, (int, float)) or rotor_speed <= 0:
+        raise RecipeError(f"rotor_speed must be positive, not {rotor_speed!r}.")
+    if speed_mode == "duty" and rotor_speed > 100:
+        raise RecipeError(f"rotor_speed {rotor_speed:g}% exceeds 100% duty.")
+
+    ice_target_g = _weight_g(recipe, "Ice")
+    flavor_target_g = _weight_g(recipe, "Flavor")
+    ice_time = None
+    speed_profile = None
+    if "speed_time_mapping" in recipe:
+        ice_time = interpolate_time(recipe["speed_time_mapping"], rotor_speed)
+    elif "Time" in recipe and ice_target_g <= 0:
+        # Fixed shaving time at any rotor speed
+        ice_time = recipe["Time"]
+        if not isinstance(ice_time, (int, float)) or ice_time <= 0:
+            raise RecipeError(f"Time must be a positive number of seconds, not {ice_time!r}.")
+        ice_time = float(ice_time)
+    else:
+        if ice_target_g <= 0:
+            raise RecipeError("Weight-based recipes need an Ice target above 0 oz.")
+        try:
+            speed_profile = SpeedProfile.from_recipe(recipe, max_speed=100 if speed_mode == "duty" else None)
+        except (KeyError, TypeError, ValueError) as e:
+            raise RecipeError(f"Invalid speed profile: {e}")
+
+    stop_speed = speed_profile.finish_speed if speed_profile is not None else rotor_speed
+    overshoot_oz = compensation.get(str(int(stop_speed)), 0)
+    stages = (ICE, FLAVOR) if flavor_target_g > 0 else (ICE,)
+    return DispensePlan(
+        flavor=flavor, size=size, stages=stages,
+        ice_target_g=ice_target_g,
+        ice_stop_g=max(ice_target_g - overshoot_oz * GRAMS_PER_OZ, 0.0),
+        ice_time=ice_time,
+        flavor_target_g=flavor_target_g,
+        rotor_speed=rotor_speed,
+        stop_speed=stop_speed,
+        speed_profile=speed_profile,
+        recipe=recipe,
+    )
+
+
+def compile_plans(app_settings, compensation=None):
+    """
+    Compile every recipe in settings.json. Returns ({(flavor, size): DispensePlan},
+    {(flavor, size): RecipeError}) so invalid recipes are known before an order.
+    """
+    plans, errors = {}, {}
+    for flavor, sizes in app_settings.get("sizes", {}).items():
+        for size, recipe in sizes.items():
+            try:
+                plans[(flavor, size)] = compile_plan(flavor, size, recipe, app_settings, compensation)
+            except RecipeError as e:
+                errors[(flavor, size)] = e
+    return plans, errors
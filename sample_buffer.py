@@ -0,0 +1,75 @@
+import threading
+import numpy as np
+
+
+class SampleBuffer:
+    """Fixed-size ring buffer of (monotonic timestamp, raw count) pairs.
+
+    Every sample is written twice, at ``i`` and ``i + capacity``, so the most
+    recent ``n <= capacity`` samples are always contiguous in memory and can be
+    returned as NumPy views without copying.
+    """
+
+    def __init__(self, capacity=256):
+        if capacity < 1:
+            raise ValueError("Buffer capacity must be at least 1.")
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros(2 * capacity, dtype=np.float64)
+        self._head = 0      # Next write position in [0, capacity)
+        self._count = 0     # Total samples ever written
+        self._lock = threading.Lock()
+        self._new_sample = threading.Condition(self._lock)
+
+    def append(self, timestamp, value):
+        """Store one sample and wake up any waiting readers."""
+        with self._lock:
+            i = self._head
+            self._times[i] = self._times[i + self.capacity] = timestamp
+            self._values[i] = self._values[i + self.capacity] = value
+            self._head = (i + 1) % self.capacity
+            self._count += 1
+            self._new_sample.notify_all()
+
+    def __len__(self):
+        with self._lock:
+            return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        """Number of samples written since the buffer was created or cleared."""
+        with self._lock:
+            return self._count
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def latest(self, n=None):
+        """
+        Return (timestamps, values) views of the newest ``n`` samples, oldest first.
+        The views share memory with the buffer, so copy them if they need to
+        outlive the next ``capacity - n`` appends.
+        """
+        with self._lock:
+            available = min(self._count, self.capacity)
+            n = available if n is None else max(0, min(n, available))
+            end = self._head + self.capacity
+            start = end - n
+            times = self._times[start:end]
+            values = self._values[start:end]
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+
+    def since(self, timestamp):
+        """Return views of all buffered samples newer than ``timestamp``."""
+        times, values = self.latest()
+        first = int(np.searchsorted(times, timestamp, side="right"))
+        return times[first:], values[first:]
+
+    def wait_for(self, total, timeout=None):
+        """Block until at least ``total`` samples have been written. Returns False on timeout."""
+        with self._lock:
+            return self._new_sample.wait_for(lambda: self._count >= total, timeout)
@@ -1,11 +1,11 @@
-import json
-import os
+import config_store
 
 SETTINGS_FILE = "settings.json"
 
 # Updated default settings structure:
 DEFAULT_SETTINGS = {
     "rotor_speed": 50,  # Default rotor speed
+    "speed_mode": "duty",  # "duty": rotor_speed is PWM duty (%); "rpm": closed-loop rotor RPM
     "sizes": {
         "Strawberry Banana (w/ Yogurt)": {
             "Small": {"Flavor": 1.25, "Yogurt": 2.50, "Ice": 3.75},
@@ -41,24 +41,28 @@ DEFAULT_SETTINGS = {
     }
 }
 
+def store():
+    """
+    The shared settings.json ConfigStore. Subscribe with add_listener() to
+    receive recipe and rotor edits as versioned Changes.
+    """
+    return config_store.store(SETTINGS_FILE, DEFAULT_SETTINGS)
+
 def load_settings():
     """Load settings from the JSON file, or create default if missing."""
-    if not os.path.exists(SETTINGS_FILE):
-        save_settings(DEFAULT_SETTINGS)  # Create file with default settings if missing.
-        return DEFAULT_SETTINGS
+    config = store()
+    if not config.exists:
+        config.save()  # Create file with default settings if missing.
+    return config.data()
 
-    try:
-        with open(SETTINGS_FILE, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"[ERROR] Failed to load settings: {e}")
-        return DEFAULT_SETTINGS
+def format_speed(settings, speed=None):
+    """Format a rotor speed (default: the rotor_speed setting) in the unit of the speed_mode."""
+    speed = settings["rotor_speed"] if speed is None else speed
+    return f"{speed:.0f} RPM" if settings.get("speed_mode", "duty") == "rpm" else f"{speed}%"
 
 def save_settings(settings):
-    """Save settings to the JSON file."""
-    try:
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(settings, f, indent=4)
-        print("[INFO] Settings saved:", settings)
-    except Exception as e:
-        print(f"[ERROR] Failed to save settings: {e}")
+    """
+    Save settings. The in-memory copy updates at once; the file is written in
+    the background, once per burst of edits (see config_store).
+    """
+    store().replace(settings)
@@ -183,8 +183,10 @@ class SettingsWindow(QWidget):
             speed_time_table.append({"speed": speed, "time": time})
         self.app_settings["speed_time_table"] = speed_time_table
 
-        # Save settings to file
-        settings.save_settings(self.app_settings)
+        # Publish only what this window edits, so newer edits elsewhere are not reverted
+        config = settings.store()
+        config.set_in(("sizes", selected_flavor), self.app_settings["sizes"][selected_flavor])
+        config.set("speed_time_table", speed_time_table)
         print("[INFO] Saved settings, including speed-time table.")
         if hasattr(self, 'save_settings_callback'):
             self.save_settings_callback()  # Trigger callback to reload settings
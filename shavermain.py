@@ -1,6 +1,7 @@
 import sys
+import sim_hardware
+sim_hardware.install_if_requested()  # Fake RPi.GPIO, pigpio and hx711 before anything imports them
 import os
-import json
 from PySide6.QtWidgets import QApplication
 from PySide6.QtQml import QQmlApplicationEngine, qmlRegisterSingletonType
 from PySide6.QtCore import QUrl, QStringListModel, QObject, Slot
@@ -9,29 +10,68 @@ from loadcell_reader_qt import LoadCellReader
 from hx711_reader import LoadCell  # ✅
 from app_state import AppState
 from motor_qt import MotorController
+from dispense_qt import DispenseController
+import devices
 import settings
+import config_store
 
 
 
 
 class SettingsManager(QObject):
-    def __init__(self, settings_file, settings_dict):
+    def __init__(self, settings_dict):
         super().__init__()
-        self.settings_file = settings_file
         self.settings_dict = settings_dict
 
     @Slot(str, str, str, float)
     def updateValue(self, flavor, size, field, value):
         try:
             self.settings_dict["sizes"][flavor][size][field] = value
-            with open(self.settings_file, "w") as f:
-                json.dump(self.settings_dict, f, indent=4)
+            settings.store().set_in(("sizes", flavor, size, field), value)  # One versioned change, written in the background
             print(f"Saved: {flavor} / {size} / {field} = {value}")
         except KeyError as e:
             print(f"[ERROR] Invalid key: {e}")
         except Exception as e:
             print(f"[ERROR] Failed to save: {e}")
 
+
+class LiveSettings(QObject):
+    """settings.json for QML: `AppSettings.sizes` and the FlavorModel follow every config_store edit."""
+    changed = Signal()
+    _storeChanged = Signal(object)  # settings.json Changes, re-emitted on the GUI thread
+
+    def __init__(self, settings_dict, flavor_model):
+        super().__init__()
+        self.settings_dict = settings_dict
+        self.flavor_model = flavor_model
+        self._storeChanged.connect(self._on_store_changed)
+        settings.store().add_listener(self._storeChanged.emit)  # Edits from QML, MainUI or another process
+
+    def _get_sizes(self):
+        return self.settings_dict.get("sizes", {})
+
+    sizes = Property("QVariantMap", _get_sizes, notify=changed)
+
+    def _on_store_changed(self, changes):
+        for change in changes:
+            config_store.apply_change(self.settings_dict, change)
+        if any(change.section == "sizes" and len(change.key) <= 2 for change in changes):
+            self._sync_flavors()  # Flavors added or removed
+        self.changed.emit()
+
+    def _sync_flavors(self):
+        """Insert and remove model rows to match the recipes, so open ComboBoxes keep their selection."""
+        flavors = list(self._get_sizes())
+        rows = self.flavor_model.stringList()
+        for row in reversed(range(len(rows))):
+            if rows[row] not in flavors:
+                self.flavor_model.removeRows(row, 1)
+        for flavor in flavors:
+            if flavor not in self.flavor_model.stringList():
+                row = self.flavor_model.rowCount()
+                self.flavor_model.insertRows(row, 1)
+                self.flavor_model.setData(self.flavor_model.index(row), flavor)
+
 # Qt app setup
 app = QApplication(sys.argv)
 engine = QQmlApplicationEngine()
@@ -42,18 +82,20 @@ qml_path = os.path.abspath("qml/Constants.qml")
 qmlRegisterSingletonType(QUrl.fromLocalFile(qml_path), "App", 1, 0, "Constants")
 
 # Load settings and model
-settings_file = "settings.json"
+config_store.watch()  # Pick up settings.json / calibration.json edits made outside the app
 app_settings = settings.load_settings()
 flavor_model = QStringListModel(list(app_settings["sizes"].keys()))
 load_cell_reader = LoadCellReader()  # LoadCellReader is created but not initialized
 motor_controller = MotorController()
+dispense_controller = DispenseController(app_settings)  # Runs the order on its own thread
+live_settings = LiveSettings(app_settings, flavor_model)
 
 print("[DEBUG] LoadCellReader and MotorController initialized.")
 
 # Set context properties before loading UI
-engine.rootContext().setContextProperty("AppSettings", app_settings)
+engine.rootContext().setContextProperty("AppSettings", live_settings)
 engine.rootContext().setContextProperty("FlavorModel", flavor_model)
-engine.rootContext().setContextProperty("SettingsManager", SettingsManager(settings_file, app_settings))
+engine.rootContext().setContextProperty("SettingsManager", SettingsManager(app_settings))
 engine.rootContext().setContextProperty("AppStackView", None)
 engine.rootContext().setContextProperty("LoadCellReader", load_cell_reader)
 load_cell_reader.tareCompleted.connect(lambda: print("[INFO] Tare completed signal received"))
@@ -61,6 +103,7 @@ load_cell_reader.tareCompleted.connect(lambda: print("[INFO] Tare completed sign
 print("[DEBUG] Connected tareCompleted signal to QML.")
 engine.rootContext().setContextProperty("AppState", app_state)  # Ensure AppState is set
 engine.rootContext().setContextProperty("MotorController", motor_controller)
+engine.rootContext().setContextProperty("Dispense", dispense_controller)
 
 # Load main UI
 engine.load(QUrl.fromLocalFile(os.path.abspath("qml/MainApp.qml")))
@@ -84,4 +127,7 @@ else:
 engine.rootContext().setContextProperty("AppStackView", stack_view)  # Replace placeholder
 
 root.showFullScreen()
-sys.exit(app.exec())
+exit_code = app.exec()
+dispense_controller.stop()
+devices.shutdown()
+sys.exit(exit_code)
@@ -0,0 +1,632 @@
+"""
+Simulated hardware backend.
+
+Replaces the RPi.GPIO, pigpio and hx711 modules with in-process fakes backed by
+one shared physical model of the machine: a BLDC motor with speed pulses, an
+ice block shaved into the cup at a rate that depends on rotor duty, a noisy
+load cell that picks up rotor vibration, the lid interlock and the driver ALM
+pin. Select it with WUNDERBAR_BACKEND=sim (or --sim on the command line) and
+the whole PyQt5/QML application runs headless on any Linux box:
+
+    WUNDERBAR_BACKEND=sim python main_ui.py
+
+Scripts can drive the machine through world(), e.g. world().open_lid() or
+world().pour(grams_per_second=4.0, seconds=3.0).
+"""
+import math
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+# BCM pin map (see README)
+HX711_DOUT = 18
+HX711_SCK = 17
+PWM_PIN = 5
+SPEED_PIN = 16
+EN_PIN = 20
+BRK_PIN = 19
+ALM_PIN = 13
+DIR_PIN = 12
+INTERLOCK_PIN = 25
+
+MAX_MOTOR_RPM = 4800.0
+PULLEY_RATIO = 95 / 22  # Rotor pulley / motor pulley
+
+_installed = False
+_world = None
+
+
+class SimWorld:
+    """Shared state and physics of the simulated machine."""
+
+    def __init__(self, step=0.002, seed=None):
+        self.step = step
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.start_time = time.monotonic()
+
+        self.levels = {INTERLOCK_PIN: 0, ALM_PIN: 1, SPEED_PIN: 0, EN_PIN: 1, BRK_PIN: 1}
+        self.modes = {}
+        self.pwm_duty = {}          # gpio -> 0..255
+        self.pwm_freq = {}
+        self.callbacks = []         # SimCallback objects
+        self.pin_log = []           # (tick, gpio, level) of every output write
+
+        # Motor
+        self.motor_rpm = 0.0
+        self.motor_tau = 0.25       # Spin-up time constant (s)
+        self.brake_tau = 0.08       # Braking time constant (s)
+        self.load_drag = 0.0        # 0..1, slows the rotor; 1.0 = jammed
+        self._pulse_phase = 0.0
+
+        # Ice and cup
+        self.ice_rate_full = 50.0   # g/s of shaved ice at 100 % duty with no drag
+        self.fall_time = 0.35       # Seconds from blade to cup
+        self.cup_weight = 0.0       # Everything sitting on the scale (g)
+        self._falling = []          # (arrival time, grams) of ice in the air
+        self._pours = []            # (end time, grams per second)
+        self.weight_mark = None     # Grams on the scale to timestamp, see mark_weight()
+        self.weight_mark_time = None
+
+        # Load cell
+        self.counts_per_gram = 1 / 0.0027
+        self.zero_counts = -169342.75
+        self.noise_counts = 12.0
+        self.vibration_counts = 40.0  # Peak rotor vibration at full speed
+        self.sample_rate = float(os.environ.get("WUNDERBAR_SIM_HX711_RATE", 80))
+        self.recording = None       # Optional replayed raw counts
+        self._recording_index = 0
+
+        self.hx711_chip = None      # Pin-level HX711 (SimHX711Chip), started by the first pigpio waveform
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="sim-physics", daemon=True)
+        self._thread.start()
+
+    # --- Clock -----------------------------------------------------------
+
+    def now(self):
+        return time.monotonic() - self.start_time
+
+    def tick(self, t=None):
+        """pigpio-style 32-bit microsecond tick."""
+        t = self.now() if t is None else t
+        return int(t * 1e6) & 0xFFFFFFFF
+
+    # --- Pins ------------------------------------------------------------
+
+    def read(self, gpio):
+        with self.lock:
+            return self.levels.get(gpio, 0)
+
+    def write(self, gpio, level):
+        with self.lock:
+            level = 1 if level else 0
+            tick = self.tick()
+            self.pin_log.append((tick, gpio, level))
+            del self.pin_log[:-10000]
+            self._set_level(gpio, level, tick)
+
+    def _set_level(self, gpio, level, tick):
+        if self.levels.get(gpio) == level:
+            return
+        self.levels[gpio] = level
+        for cb in list(self.callbacks):
+            cb.notify(gpio, level, tick)
+
+    def set_pwm(self, gpio, duty):
+        with self.lock:
+            self.pwm_duty[gpio] = max(0, min(int(duty), 255))
+
+    def play_wave(self, pulses, stop):
+        """
+        Play a pigpio waveform: each pulse sets its gpio_on bits, clears its
+        gpio_off bits and lasts `delay` microseconds of tick time. The edges
+        carry those ticks; the thread itself does not sleep between pulses.
+        """
+        tick = self.tick()
+        for p in pulses:
+            if stop.is_set():
+                return
+            with self.lock:
+                for gpio in range(32):
+                    if p.gpio_on >> gpio & 1:
+                        self._set_level(gpio, 1, tick)
+                    if p.gpio_off >> gpio & 1:
+                        self._set_level(gpio, 0, tick)
+            tick = (tick + p.delay) & 0xFFFFFFFF
+
+    def start_hx711_chip(self):
+        with self.lock:
+            if self.hx711_chip is None:
+                self.hx711_chip = SimHX711Chip(self)
+
+    def stop_hx711_chip(self):
+        with self.lock:
+            chip, self.hx711_chip = self.hx711_chip, None
+        if chip is not None:
+            chip.stop()
+
+    # --- Operator and fault controls ---------------------------------------
+
+    def open_lid(self):
+        with self.lock:
+            self._set_level(INTERLOCK_PIN, 1, self.tick())
+
+    def close_lid(self):
+        with self.lock:
+            self._set_level(INTERLOCK_PIN, 0, self.tick())
+
+    def set_fault(self, fault=True):
+        with self.lock:
+            self._set_level(ALM_PIN, 0 if fault else 1, self.tick())
+
+    def set_jam(self, drag):
+        """0 = free running, 1 = rotor fully jammed."""
+        with self.lock:
+            self.load_drag = max(0.0, min(drag, 1.0))
+
+    def place(self, grams):
+        """Put something on the scale (negative to remove)."""
+        with self.lock:
+            self.cup_weight = max(self.cup_weight + grams, 0.0)
+
+    def clear_scale(self):
+        with self.lock:
+            self.cup_weight = 0.0
+            self._falling = []
+            self._pours = []
+
+    def pour(self, grams_per_second, seconds):
+        """Simulate the operator pouring syrup."""
+        with self.lock:
+            self._pours.append((self.now() + seconds, grams_per_second))
+
+    def mark_weight(self, grams):
+        """Record in weight_mark_time the world time the scale first holds `grams` or more."""
+        with self.lock:
+            self.weight_mark = grams
+            self.weight_mark_time = None
+
+    def load_recording(self, path):
+        """Replay raw counts (one per line, or 'timestamp,count') instead of the model."""
+        counts = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    counts.append(float(line.split(",")[-1]))
+        with self.lock:
+            self.recording = counts
+            self._recording_index = 0
+
+    # --- Derived quantities ------------------------------------------------
+
+    @property
+    def motor_enabled(self):
+        return self.levels.get(EN_PIN) == 0 and self.levels.get(BRK_PIN) == 0 and self.levels.get(ALM_PIN) == 1
+
+    @property
+    def rotor_rpm(self):
+        return self.motor_rpm / PULLEY_RATIO
+
+    def read_counts(self):
+        """One HX711 conversion at the current instant."""
+        with self.lock:
+            if self.recording:
+                value = self.recording[self._recording_index % len(self.recording)]
+                self._recording_index += 1
+                return value
+            rotor_hz = self.rotor_rpm / 60.0
+            vibration = self.vibration_counts * (self.motor_rpm / MAX_MOTOR_RPM) * math.sin(2 * math.pi * rotor_hz * self.now())
+            noise = self.random.gauss(0.0, self.noise_counts)
+            return self.zero_counts + self.cup_weight * self.counts_per_gram + vibration + noise
+
+    # --- Physics loop ------------------------------------------------------
+
+    def _run(self):
+        last = self.now()
+        while self._running:
+            time.sleep(self.step)
+            now = self.now()
+            self._advance(last, now)
+            last = now
+
+    def _advance(self, t0, t1):
+        dt = t1 - t0
+        with self.lock:
+            duty = self.pwm_duty.get(PWM_PIN, 0) / 255.0
+            if self.motor_enabled:
+                target = duty * MAX_MOTOR_RPM * (1.0 - self.load_drag)
+                tau = self.motor_tau
+            else:
+                target = 0.0
+                tau = self.brake_tau if self.levels.get(BRK_PIN) == 1 else self.motor_tau * 4
+            self.motor_rpm += (target - self.motor_rpm) * min(dt / tau, 1.0)
+
+            # Speed pulses, matching BLDCMotor.get_rpm(): N = (F / 2) * 60 / 3, so F = N / 10
+            freq = self.motor_rpm / 10.0
+            self._pulse_phase += freq * dt
+            while self._pulse_phase >= 1.0:
+                self._pulse_phase -= 1.0
+                edge_t = t1 - self._pulse_phase / freq if freq > 0 else t1
+                tick = self.tick(edge_t)
+                self._set_level(SPEED_PIN, 1, tick)
+                self._set_level(SPEED_PIN, 0, tick + 1)
+
+            # Ice leaves the blade in proportion to rotor speed and lands fall_time later
+            if self.motor_enabled and self.motor_rpm > 1.0:
+                grams = self.ice_rate_full * (self.motor_rpm / MAX_MOTOR_RPM) * dt
+                grams *= 1.0 + self.random.gauss(0.0, 0.15)
+                self._falling.append((t1 + self.fall_time, max(grams, 0.0)))
+            while self._falling and self._falling[0][0] <= t1:
+                self.cup_weight += self._falling.pop(0)[1]
+
+            for end, rate in self._pours:
+                self.cup_weight += rate * min(dt, max(end - t0, 0.0))
+            self._pours = [p for p in self._pours if p[0] > t1]
+
+            if self.weight_mark_time is None and self.weight_mark is not None and self.cup_weight >= self.weight_mark:
+                self.weight_mark_time = t1
+
+    def shutdown(self):
+        self._running = False
+
+
+def world():
+    """The shared simulated machine, created on first use."""
+    global _world
+    if _world is None:
+        seed = os.environ.get("WUNDERBAR_SIM_SEED")
+        _world = SimWorld(seed=int(seed) if seed else None)
+        recording = os.environ.get("WUNDERBAR_SIM_RECORDING")
+        if recording:
+            _world.load_recording(recording)
+    return _world
+
+
+class SimCallback:
+    """Edge callback registration, shared by the fake pigpio and RPi.GPIO."""
+
+    def __init__(self, gpio, edge, func):
+        self.gpio = gpio
+        self.edge = edge  # 0 rising, 1 falling, 2 either
+        self.func = func
+        world().callbacks.append(self)
+
+    def notify(self, gpio, level, tick):
+        if gpio != self.gpio:
+            return
+        if self.edge == 2 or (self.edge == 0 and level == 1) or (self.edge == 1 and level == 0):
+            try:
+                self.func(gpio, level, tick)
+            except Exception as e:
+                print(f"[ERROR] Simulated GPIO callback failed: {e}")
+
+    def cancel(self):
+        callbacks = world().callbacks
+        if self in callbacks:
+            callbacks.remove(self)
+
+
+class SimHX711Chip:
+    """
+    Pin-level HX711 for the pigpio reader (hx711_pigpio.py). DOUT falls when a
+    conversion is ready, each rising PD_SCK edge shifts out the next of its 24
+    bits (two's complement, MSB first), and the 25th pulse returns DOUT high
+    until the next conversion. Conversions come at the world's sample_rate;
+    one that is not clocked out is replaced by the next, as on the chip.
+    """
+
+    def __init__(self, world, dout=HX711_DOUT, sck=HX711_SCK):
+        self.world = world
+        self.dout = dout
+        self.value = None  # 24-bit conversion waiting on DOUT, None once read out
+        self.shifted = 0   # Bits clocked out of the current conversion
+        world.levels[dout] = 1
+        self._callback = SimCallback(sck, 0, self._on_clock)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="sim-hx711", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._callback.cancel()
+
+    def _run(self):
+        world = self.world
+        next_conversion = time.monotonic()
+        while self._running:
+            next_conversion += 1.0 / world.sample_rate
+            time.sleep(max(next_conversion - time.monotonic(), 0.0))
+            counts = int(round(world.read_counts()))
+            with world.lock:
+                if self.shifted == 0:  # Not while a conversion is being clocked out
+                    self.value = max(min(counts, 0x7FFFFF), -0x800000) & 0xFFFFFF
+                    world._set_level(self.dout, 0, world.tick())
+
+    def _on_clock(self, gpio, level, tick):
+        if self.value is None:
+            return
+        if self.shifted < 24:
+            bit = self.value >> (23 - self.shifted) & 1
+            self.shifted += 1
+            self.world._set_level(self.dout, bit, tick)
+        else:  # Gain/channel pulse: the conversion is done
+            self.value = None
+            self.shifted = 0
+            self.world._set_level(self.dout, 1, tick)
+
+
+# --- Fake pigpio ---------------------------------------------------------------
+
+def _make_pigpio():
+    mod = types.ModuleType("pigpio")
+    mod.INPUT, mod.OUTPUT = 0, 1
+    mod.RISING_EDGE, mod.FALLING_EDGE, mod.EITHER_EDGE = 0, 1, 2
+    mod.PUD_OFF, mod.PUD_DOWN, mod.PUD_UP = 0, 1, 2
+    mod.TIMEOUT = 2
+    mod.PI_SCRIPT_INITING, mod.PI_SCRIPT_HALTED, mod.PI_SCRIPT_RUNNING = 0, 1, 2
+    mod.error = RuntimeError
+
+    def tickDiff(t1, t2):
+        return (t2 - t1) & 0xFFFFFFFF
+
+    class pulse:
+        def __init__(self, gpio_on, gpio_off, delay):
+            self.gpio_on, self.gpio_off, self.delay = gpio_on, gpio_off, delay
+
+    class pi:
+        def __init__(self, host=None, port=None):
+            self.connected = True
+            self._world = world()
+            self._scripts = []
+            self._wave_pulses = []
+            self._waves = []
+            self._wave_stop = threading.Event()
+
+        def set_mode(self, gpio, mode):
+            self._world.modes[gpio] = mode
+            return 0
+
+        def get_mode(self, gpio):
+            return self._world.modes.get(gpio, 0)
+
+        def set_pull_up_down(self, gpio, pud):
+            return 0
+
+        def set_glitch_filter(self, gpio, steady):
+            return 0
+
+        def read(self, gpio):
+            return self._world.read(gpio)
+
+        def write(self, gpio, level):
+            self._world.write(gpio, level)
+            return 0
+
+        def set_PWM_frequency(self, gpio, frequency):
+            self._world.pwm_freq[gpio] = frequency
+            return frequency
+
+        def get_PWM_frequency(self, gpio):
+            return self._world.pwm_freq.get(gpio, 800)
+
+        def set_PWM_dutycycle(self, gpio, dutycycle):
+            self._world.set_pwm(gpio, dutycycle)
+            return 0
+
+        def get_PWM_dutycycle(self, gpio):
+            return self._world.pwm_duty.get(gpio, 0)
+
+        def read_bank_1(self):
+            return sum(self._world.read(gpio) << gpio for gpio in range(32))
+
+        def set_bank_1(self, bits):
+            self._write_bank(bits, 1)
+            return 0
+
+        def clear_bank_1(self, bits):
+            self._write_bank(bits, 0)
+            return 0
+
+        def _write_bank(self, bits, level):
+            with self._world.lock:  # All pins change at the same instant, like the real bank write
+                for gpio in range(32):
+                    if bits >> gpio & 1:
+                        self._world.write(gpio, level)
+
+        def store_script(self, script):
+            text = script.decode() if isinstance(script, bytes) else script
+            self._scripts.append(text.split())
+            return len(self._scripts) - 1
+
+        def script_status(self, script_id):
+            return mod.PI_SCRIPT_HALTED, [0] * 10
+
+        def run_script(self, script_id, params=None):
+            # Only the w and pwm commands used by BLDCMotor are interpreted
+            params = list(params or []) + [0] * 10
+            tokens = self._scripts[script_id]
+            arg = lambda token: params[int(token[1:])] if token.startswith("p") else int(token)
+            with self._world.lock:
+                for i in range(0, len(tokens), 3):
+                    command, gpio, value = tokens[i], arg(tokens[i + 1]), arg(tokens[i + 2])
+                    if command == "w":
+                        self._world.write(gpio, value)
+                    elif command == "pwm":
+                        self._world.set_pwm(gpio, value)
+                    else:
+                        raise mod.error(f"sim script command not supported: {command}")
+            return 0
+
+        def delete_script(self, script_id):
+            self._scripts[script_id] = None
+            return 0
+
+        def set_servo_pulsewidth(self, gpio, pulsewidth):
+            self._world.set_pwm(gpio, 0)
+            return 0
+
+        def callback(self, user_gpio, edge=0, func=None):
+            return SimCallback(user_gpio, edge, func or (lambda *a: None))
+
+        def get_current_tick(self):
+            return self._world.tick()
+
+        def wave_add_generic(self, pulses):
+            self._wave_pulses.extend(pulses)
+            return len(self._wave_pulses)
+
+        def wave_create(self):
+            # Only the HX711 clock waveform is used, so a waveform brings up the pin-level HX711
+            self._waves.append(self._wave_pulses)
+            self._wave_pulses = []
+            self._world.start_hx711_chip()
+            return len(self._waves) - 1
+
+        def wave_send_once(self, wave_id):
+            pulses = self._waves[wave_id] if 0 <= wave_id < len(self._waves) else None
+            if pulses is None:
+                return -66  # PI_BAD_WAVE_ID
+            threading.Thread(target=self._world.play_wave, args=(pulses, self._wave_stop),
+                             name="sim-wave", daemon=True).start()
+            return len(pulses)
+
+        def wave_tx_stop(self):
+            self._wave_stop.set()
+            self._wave_stop = threading.Event()
+            return 0
+
+        def wave_delete(self, wave_id):
+            self._waves[wave_id] = None
+            if not any(self._waves):
+                self._world.stop_hx711_chip()
+            return 0
+
+        def stop(self):
+            self.connected = False
+
+    mod.tickDiff = tickDiff
+    mod.pulse = pulse
+    mod.pi = pi
+    return mod
+
+
+# --- Fake RPi.GPIO -------------------------------------------------------------
+
+def _make_gpio():
+    rpi = types.ModuleType("RPi")
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM, gpio.BOARD = 11, 10
+    gpio.IN, gpio.OUT = 1, 0
+    gpio.LOW, gpio.HIGH = 0, 1
+    gpio.PUD_OFF, gpio.PUD_DOWN, gpio.PUD_UP = 20, 21, 22
+    gpio.RISING, gpio.FALLING, gpio.BOTH = 31, 32, 33
+    edge_map = {gpio.RISING: 0, gpio.FALLING: 1, gpio.BOTH: 2}
+    detects = {}
+
+    gpio.setwarnings = lambda flag: None
+    gpio.setmode = lambda mode: None
+    gpio.getmode = lambda: gpio.BCM
+
+    def setup(channel, direction, pull_up_down=None, initial=None):
+        world().modes[channel] = direction
+        if direction == gpio.OUT and initial is not None:
+            world().write(channel, initial)
+
+    def output(channel, value):
+        world().write(channel, value)
+
+    def input(channel):
+        return world().read(channel)
+
+    def add_event_detect(channel, edge, callback=None, bouncetime=None):
+        detects[channel] = SimCallback(channel, edge_map[edge], lambda g, level, tick: callback and callback(g))
+
+    def remove_event_detect(channel):
+        cb = detects.pop(channel, None)
+        if cb:
+            cb.cancel()
+
+    def cleanup(channel=None):
+        for ch in list(detects):
+            remove_event_detect(ch)
+
+    gpio.setup, gpio.output, gpio.input = setup, output, input
+    gpio.add_event_detect, gpio.remove_event_detect, gpio.cleanup = add_event_detect, remove_event_detect, cleanup
+    rpi.GPIO = gpio
+    return rpi, gpio
+
+
+# --- Fake hx711 ----------------------------------------------------------------
+
+def _make_hx711():
+    mod = types.ModuleType("hx711")
+
+    class HX711:
+        def __init__(self, dout, pd_sck, gain=128):
+            self._world = world()
+            self._next = time.monotonic()
+
+        def _wait_conversion(self):
+            period = 1.0 / self._world.sample_rate
+            now = time.monotonic()
+            self._next = max(self._next + period, now)
+            time.sleep(self._next - now)
+
+        def get_weight_A(self, times=3):
+            total = 0.0
+            for _ in range(times):
+                self._wait_conversion()
+                total += self._world.read_counts()
+            return total / times
+
+        def get_weight(self, times=3):
+            return self.get_weight_A(times)
+
+        def tare_A(self, times=15):
+            return self.get_weight_A(times)
+
+        def power_down(self):
+            pass
+
+        def power_up(self):
+            pass
+
+        def reset(self):
+            pass
+
+    mod.HX711 = HX711
+    return mod
+
+
+def install():
+    """Register the simulated modules so later hardware imports resolve to them."""
+    global _installed
+    if _installed:
+        return
+    rpi, gpio = _make_gpio()
+    sys.modules["RPi"] = rpi
+    sys.modules["RPi.GPIO"] = gpio
+    sys.modules["pigpio"] = _make_pigpio()
+    sys.modules["hx711"] = _make_hx711()
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Run Qt headless
+    _installed = True
+    print("[INFO] Simulated hardware backend active.")
+
+
+def requested():
+    return os.environ.get("WUNDERBAR_BACKEND", "").lower() == "sim" or "--sim" in sys.argv
+
+
+def install_if_requested():
+    if requested():
+        install()
+
+
+def is_active():
+    return _installed
@@ -0,0 +1,117 @@
+import time
+import numpy as np
+import config_store
+
+
+class PIDController:
+    """
+    PID on rotor RPM error. The output is a duty-cycle correction (%) that is
+    added to the feedforward duty, so the integrator only has to cover the
+    load (ice drag), not the whole speed range. Outside integral_band RPM the
+    integrator pauses while the error is already shrinking (spin-up), and it
+    stops growing while the output is saturated.
+    """
+
+    def __init__(self, kp=0.08, ki=0.5, kd=0.0, output_limit=30.0, integral_band=100.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_band = integral_band
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the "speed_control" section of calibration.json."""
+        pid = cls()
+        pid.configure(config)
+        return pid
+
+    def configure(self, config):
+        """Take new gains from a "speed_control" section, keeping the integral state."""
+        self.kp = config.get("kp", 0.08)
+        self.ki = config.get("ki", 0.5)
+        self.kd = config.get("kd", 0.0)
+        self.output_limit = config.get("output_limit", 30.0)
+        self.integral_band = config.get("integral_band", 100.0)
+
+    def reset(self):
+        self.integral = 0.0
+        self._prev_error = None
+
+    def update(self, error, dt):
+        """Return the duty correction (%) for an RPM error measured dt seconds after the last one."""
+        derivative = 0.0
+        converging = False
+        if self._prev_error is not None:
+            converging = abs(error) < abs(self._prev_error)
+            if dt > 0:
+                derivative = self.kd * (error - self._prev_error) / dt
+        self._prev_error = error
+
+        proportional = self.kp * error
+        integral = self.integral + self.ki * error * dt
+        integrate = abs(error) <= self.integral_band or not converging
+        if integrate and abs(proportional + integral + derivative) <= self.output_limit:
+            self.integral = integral
+        output = proportional + self.integral + derivative
+        return min(max(output, -self.output_limit), self.output_limit)
+
+
+class FeedforwardMap:
+    """
+    No-load duty (%) -> rotor RPM table, stored as "speed_control.feedforward"
+    in calibration.json and inverted to find the duty for a target RPM.
+    BLDCMotor.learn_feedforward() fills it by sweeping the motor. Edits of
+    the section made elsewhere are picked up from the calibration store.
+    """
+
+    def __init__(self, cal_file="calibration.json"):
+        self.cal_file = cal_file
+        self.config = {}
+        self.points = {}
+        self.load()
+        config_store.store(cal_file).add_listener(self._on_calibration_changed)
+
+    def _on_calibration_changed(self, changes):
+        if any(change.section == "speed_control" for change in changes):
+            self.load()
+
+    def load(self):
+        self.config = config_store.store(self.cal_file).get("speed_control", {})
+        self.points = {float(duty): float(rpm) for duty, rpm in self.config.get("feedforward", {}).items()}
+
+    @property
+    def ready(self):
+        return len(self.points) >= 2
+
+    @property
+    def max_rpm(self):
+        return max(self.points.values()) if self.points else 0.0
+
+    def duty_for(self, rpm):
+        """Feedforward duty (%) for a rotor RPM, interpolated through (0 %, 0 RPM)."""
+        duties = np.array([0.0] + sorted(self.points))
+        rpms = np.maximum.accumulate(np.array([0.0] + [self.points[d] for d in sorted(self.points)]))
+        return float(np.clip(np.interp(rpm, rpms, duties), 0.0, 100.0))
+
+    def rpm_for(self, duty):
+        """No-load rotor RPM expected at a duty (%), interpolated through (0 %, 0 RPM)."""
+        duties = [0.0] + sorted(self.points)
+        rpms = [0.0] + [self.points[d] for d in sorted(self.points)]
+        return float(np.interp(duty, duties, rpms))
+
+    def update(self, points):
+        """Replace the table with freshly measured {duty: rpm} points and save it."""
+        self.points = {float(duty): float(rpm) for duty, rpm in points.items()}
+        self.save()
+
+    def save(self):
+        """Merge the table into calibration.json."""
+        config = config_store.store(self.cal_file)
+        section = config.get("speed_control", {})
+        section["feedforward"] = {str(int(duty)): round(rpm, 1) for duty, rpm in sorted(self.points.items())}
+        section["feedforward_updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.config = section
+        config.set("speed_control", section)
+        print(f"[INFO] Duty->RPM map saved: {section['feedforward']}")
@@ -0,0 +1,56 @@
+class SpeedProfile:
+    """
+    Rotor speed schedule for one ice stage: ramp from start_speed up to
+    bulk_speed over ramp_time seconds, hold bulk_speed, and drop to
+    finish_speed once the cup holds finish_at (fraction) of the Ice target.
+    The finishing band is latched, so scale noise cannot bounce the rotor
+    back to bulk speed. Speeds are in the settings speed_mode unit (duty % or
+    rotor RPM).
+
+    A recipe in settings.json opts in with, for example:
+
+        "speed_profile": {"bulk_speed": 90, "finish_speed": 40, "finish_at": 0.8, "ramp_time": 0.5}
+    """
+
+    def __init__(self, bulk_speed, finish_speed, finish_at=0.8, ramp_time=0.5, start_speed=None):
+        if bulk_speed <= 0 or finish_speed <= 0:
+            raise ValueError("Profile speeds must be positive.")
+        if not 0.0 < finish_at <= 1.0:
+            raise ValueError("finish_at must be a fraction of the Ice target in (0, 1].")
+        if ramp_time < 0:
+            raise ValueError("ramp_time must not be negative.")
+        self.bulk_speed = bulk_speed
+        self.finish_speed = finish_speed
+        self.finish_at = finish_at
+        self.ramp_time = ramp_time
+        self.start_speed = finish_speed if start_speed is None else start_speed
+        self.finishing = False
+
+    @classmethod
+    def from_recipe(cls, recipe, max_speed=None):
+        """Profile from a recipe's "speed_profile" entry, or None if it has none."""
+        config = recipe.get("speed_profile")
+        if not config:
+            return None
+        profile = cls(
+            bulk_speed=config["bulk_speed"],
+            finish_speed=config["finish_speed"],
+            finish_at=config.get("finish_at", 0.8),
+            ramp_time=config.get("ramp_time", 0.5),
+            start_speed=config.get("start_speed"),
+        )
+        if max_speed is not None and max(profile.bulk_speed, profile.finish_speed, profile.start_speed) > max_speed:
+            raise ValueError(f"Profile speeds must not exceed {max_speed}.")
+        return profile
+
+    def reset(self):
+        self.finishing = False
+
+    def speed_at(self, elapsed, progress):
+        """Return (phase, speed) for `elapsed` seconds into the stage at `progress` (fraction of the target)."""
+        if self.finishing or progress >= self.finish_at:
+            self.finishing = True
+            return "finish", self.finish_speed
+        if elapsed < self.ramp_time:
+            return "ramp", self.start_speed + (self.bulk_speed - self.start_speed) * elapsed / self.ramp_time
+        return "bulk", self.bulk_speed
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class StabilityDetector:
+    """
+    Decides whether the scale has settled from the recent weight trajectory.
+
+    The last `window` seconds count as settled when their standard deviation
+    is at most `max_std` and the least-squares slope is at most `max_slope`
+    per second in either direction, so a slow drip is not mistaken for a
+    steady reading. At least `min_samples` samples spanning half a window
+    are needed. Units follow the weights fed in (g or oz).
+    """
+
+    def __init__(self, window=0.5, max_std=0.2, max_slope=0.5, min_samples=5):
+        self.window = window
+        self.max_std = max_std
+        self.max_slope = max_slope
+        self.min_samples = min_samples
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a detector from the "stability" section of calibration.json."""
+        config = config or {}
+        return cls(
+            window=config.get("window", 0.5),
+            max_std=config.get("max_std", 0.2),
+            max_slope=config.get("max_slope", 0.5),
+            min_samples=config.get("min_samples", 5),
+        )
+
+    def reset(self):
+        self._times = []
+        self._weights = []
+        self.std = None      # Standard deviation of the window
+        self.slope = None    # Weight units per second
+        self.settled = False
+
+    def add(self, timestamp, weight):
+        """Add one weight reading (e.g. from an engine tick) and re-evaluate."""
+        self._times.append(timestamp)
+        self._weights.append(weight)
+        while self._times and timestamp - self._times[0] > self.window:
+            self._times.pop(0)
+            self._weights.pop(0)
+        return self._evaluate(np.asarray(self._times), np.asarray(self._weights))
+
+    def update_window(self, times, weights):
+        """Re-evaluate from a window of streamed samples, replacing any added history."""
+        times = np.asarray(times, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(times):
+            keep = times >= times[-1] - self.window
+            times, weights = times[keep], weights[keep]
+        self._times, self._weights = list(times), list(weights)
+        return self._evaluate(times, weights)
+
+    def _evaluate(self, times, weights):
+        if len(times) < self.min_samples or times[-1] - times[0] < self.window / 2:
+            self.std = None
+            self.slope = None
+            self.settled = False
+            return False
+        self.std = float(np.std(weights))
+        self.slope = float(np.polyfit(times - times[-1], weights, 1)[0])
+        self.settled = self.std <= self.max_std and abs(self.slope) <= self.max_slope
+        return self.settled
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+import pytest
+
+import config_store
+from config_store import Change, ConfigStore, apply_change, diff, lookup
+
+
+def write_file(path, data):
+    """Edit the file as another process would, with a distinct mtime."""
+    previous = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    path.write_text(json.dumps(data))
+    os.utime(path, ns=(previous + 10**9, previous + 10**9))
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "calibration.json"
+    write_file(path, {"offset": 100, "tare": {"window": 0.5, "timeout": 3.0}, "A": 1.0})
+    return path
+
+
+def test_diff_is_per_key():
+    old = {"sizes": {"Mango": {"Small": {"Ice": 4.0, "Flavor": 6.0}}}, "rotor_speed": 60, "old": 1}
+    new = {"sizes": {"Mango": {"Small": {"Ice": 4.5, "Flavor": 6.0}}}, "rotor_speed": 60, "new": [1]}
+    assert sorted(diff(old, new)) == sorted([
+        (("sizes", "Mango", "Small", "Ice"), 4.5, False),
+        (("new",), [1], False),
+        (("old",), None, True),
+    ])
+    assert diff(old, old) == []
+
+
+def test_apply_change_round_trips_diff():
+    old = {"a": {"b": 1, "c": 2}, "d": 3}
+    new = {"a": {"b": 5}, "e": {"f": {"g": 1}}, "d": 3}
+    data = json.loads(json.dumps(old))
+    for change in diff(old, new):
+        apply_change(data, change)
+    assert data == new
+
+    apply_change(data, (("x", "y"), None, True))  # Removing a missing key is a no-op
+    assert data == new
+    value = [1, 2]
+    apply_change(data, Change("f", 1, ("e", "list"), value, False))
+    value.append(3)  # Values are copied in
+    assert lookup(data, ("e", "list")) == [1, 2]
+    assert lookup(data, ("e", "missing"), "default") == "default"
+
+
+def test_edits_notify_versioned_changes_and_write_later(path):
+    config = ConfigStore(str(path), delay=60)
+    received = []
+    config.add_listener(received.append)
+
+    config.set_in(("tare", "window"), 0.8)
+    config.set_in(("tare", "window"), 0.8)  # No change, no event
+    assert [[(c.key, c.value, c.version) for c in changes] for changes in received] == [
+        [(("tare", "window"), 0.8, 1)]]
+    assert json.loads(path.read_text())["tare"]["window"] == 0.5  # Not on the caller's thread
+
+    config.flush()
+    assert json.loads(path.read_text())["tare"]["window"] == 0.8
+    assert not os.path.exists(f"{path}.tmp")
+    assert config.writes == 1
+    assert config.reload() == []  # Our own write is not an external edit
+
+
+def test_reload_keeps_pending_edits(path):
+    config = ConfigStore(str(path), delay=60)
+    config.set_in(("tare", "window"), 0.8)  # Pending, not yet written
+    received = []
+    config.add_listener(received.append)
+
+    write_file(path, {"offset": 250, "tare": {"window": 0.5, "timeout": 3.0}, "A": 1.0})
+    changes = config.reload()
+
+    assert [(c.key, c.value) for c in changes] == [(("offset",), 250)]
+    assert received == [changes]
+    assert config.data() == {"offset": 250, "tare": {"window": 0.8, "timeout": 3.0}, "A": 1.0}
+
+    config.flush()
+    assert json.loads(path.read_text()) == config.data()
+
+
+def test_reload_applies_only_what_changed_on_disk(path):
+    config = ConfigStore(str(path), delay=60)
+    config.set("A", 2.0)
+
+    # The editor also sets A to 2.0 and removes the tare timeout
+    write_file(path, {"offset": 100, "tare": {"window": 0.5}, "A": 2.0})
+    changes = config.reload()
+    assert [(c.key, c.removed) for c in changes] == [(("tare", "timeout"), True)]
+
+    path.write_text("{ half written")
+    os.utime(path, ns=(1, 1))
+    assert config.reload() == []  # Invalid files are ignored
+    assert config.get("tare") == {"window": 0.5}
+
+
+def test_missing_file_uses_default(tmp_path):
+    path = tmp_path / "settings.json"
+    config = ConfigStore(str(path), {"rotor_speed": 60})
+    assert not config.exists
+    assert config.get("rotor_speed") == 60
+    config.save()
+    config.flush()
+    assert json.loads(path.read_text()) == {"rotor_speed": 60}
+
+
+def test_failed_write_is_retried(path, monkeypatch):
+    config = ConfigStore(str(path), delay=0.05)
+    replace = os.replace
+
+    def fail(src, dst):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(config_store.os, "replace", fail)
+    config.set("A", 2.0)
+    config.flush()
+    assert json.loads(path.read_text())["A"] == 1.0
+    assert config.writes == 0
+
+    monkeypatch.setattr(config_store.os, "replace", replace)
+    deadline = time.monotonic() + 2.0
+    while config.writes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)  # The writer thread retries on its own
+    assert json.loads(path.read_text())["A"] == 2.0
@@ -0,0 +1,165 @@
+import threading
+
+import numpy as np
+import pytest
+
+import filters
+from filters import EMAFilter, FilterBank, KalmanFilter, MedianFilter, NotchFilter
+
+RATE = 80.0  # HX711 samples per second
+RPM = 134.0  # Just above min_rpm: a 4-cycle block spans ~1.8 s
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(filters.time, "monotonic", clock)
+    return clock
+
+
+def make_notch(clock, spin_up_at=0.0):
+    notch = NotchFilter()
+    notch.rpm_source = lambda: RPM
+    clock.now = spin_up_at
+    notch.ready  # The rotor is seen at speed from here on
+    return notch
+
+
+def vibration(times, amplitude=0.1):
+    omega = 2 * np.pi * RPM / 60.0
+    return amplitude * np.sin(omega * times) + 0.5 * amplitude * np.cos(2 * omega * times + 0.3)
+
+
+def test_notch_removes_rotor_vibration(clock):
+    times = np.arange(0.0, 3.0, 1 / RATE)
+    notch = make_notch(clock)
+    clock.now = times[-1]
+    out = notch.apply(times, 50.0 + vibration(times))
+    assert notch.frequency == pytest.approx(RPM / 60.0)
+    assert np.max(np.abs(out[-80:] - 50.0)) < 0.02
+
+
+def test_notch_does_not_ring_on_a_zero_step(clock):
+    # Cup placed at 1.0 s, scale zeroed at 1.5 s: the older samples read -cup weight
+    times = np.arange(0.0, 3.5, 1 / RATE)
+    weights = np.where(times < 1.5, -130.0, 0.0) + vibration(times)
+    notch = make_notch(clock)
+    notch.restart(1.5)
+    clock.now = times[-1]
+    out = notch.apply(times, weights)
+    after = times >= 1.5
+    assert np.max(np.abs(out[after])) < 0.5
+    np.testing.assert_array_equal(out[~after], weights[~after])  # Never fitted across the step
+
+
+def test_notch_rejects_implausible_fits(clock):
+    # Without a restart the step falls inside a block; the fit must be rejected, not subtracted
+    times = np.arange(0.0, 3.5, 1 / RATE)
+    weights = np.where(times < 1.5, -130.0, 0.0) + vibration(times)
+    notch = make_notch(clock)
+    clock.now = times[-1]
+    out = notch.apply(times, weights)
+    assert np.max(np.abs(out - weights)) <= notch.max_amplitude
+    assert notch.rejected >= 1
+
+
+def test_notch_counts_rejections_from_several_threads(clock):
+    times = np.arange(0.0, 3.5, 1 / RATE)
+    weights = np.where(times < 1.5, -130.0, 0.0) + vibration(times)
+    notch = make_notch(clock)
+    clock.now = times[-1]
+    notch.apply(times, weights)
+    per_call, notch.rejected = notch.rejected, 0
+
+    def run():
+        for _ in range(20):
+            notch.apply(times, weights)
+            notch.restart(0.0)  # The offset setter, from another thread
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert notch.rejected == 4 * 20 * per_call
+
+
+def test_notch_waits_for_steady_speed(clock):
+    times = np.arange(0.0, 3.0, 1 / RATE)
+    weights = vibration(times)
+    notch = make_notch(clock, spin_up_at=2.9)
+    clock.now = times[-1]
+    assert not notch.ready
+    np.testing.assert_array_equal(notch.apply(times, weights), weights)
+
+
+def test_notch_passes_through_below_min_rpm(clock):
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    notch = NotchFilter()
+    notch.rpm_source = lambda: 60.0
+    weights = vibration(times)
+    assert notch.apply(times, weights) is weights
+    assert not notch.active
+
+
+def test_kalman_sliding_windows_match_one_pass():
+    times = np.arange(0.0, 4.0, 1 / RATE)
+    rng = np.random.default_rng(1)
+    weights = 20.0 * np.clip(times - 1.0, 0.0, None) + rng.normal(0.0, 0.2, len(times))
+    full = KalmanFilter().apply(times, weights)
+
+    kalman = KalmanFilter()
+    for end in range(20, len(times) + 1):  # 20-sample window, one new sample per read
+        out = kalman.apply(times[end - 20:end], weights[end - 20:end])
+        np.testing.assert_allclose(out, full[end - 20:end])
+    assert kalman.rate == pytest.approx(20.0, abs=1.0)
+
+
+def test_kalman_restarts_after_gap_and_reset():
+    kalman = KalmanFilter()
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    kalman.apply(times, np.full(len(times), 100.0))
+
+    later = times + 5.0  # Longer than reset_gap: the old state is stale
+    assert kalman.apply(later, np.zeros(len(times)))[0] == 0.0
+
+    kalman.reset()  # E.g. the scale was zeroed
+    assert kalman.apply(later + 1 / RATE, np.full(len(times), 7.0))[0] == 7.0
+
+
+def test_median_replaces_spikes_only():
+    values = 50.0 + 0.1 * np.sin(np.arange(40.0))
+    spiked = values.copy()
+    spiked[[7, 30]] = [400.0, -300.0]
+    out = MedianFilter(window=5).apply(np.arange(40.0), spiked)
+    assert np.max(np.abs(out - 50.0)) < 0.2
+    keep = np.ones(40, dtype=bool)
+    keep[[7, 30]] = False
+    np.testing.assert_array_equal(out[keep], spiked[keep])
+
+
+def test_ema_matches_recursive_form():
+    values = np.random.default_rng(2).normal(10.0, 1.0, 60)
+    expected = [values[0]]
+    for v in values[1:]:
+        expected.append(0.3 * v + 0.7 * expected[-1])
+    np.testing.assert_allclose(EMAFilter(alpha=0.3).apply(None, values), expected, atol=1e-5)
+    with pytest.raises(ValueError):
+        EMAFilter(alpha=0)
+
+
+def test_filter_bank_from_config():
+    bank = FilterBank.from_config({"chain": ["median", "ema"], "window": 30, "ema": {"alpha": 0.5}})
+    assert [f.name for f in bank.filters] == ["median", "ema"] and bank.window == 30
+    assert bank.apply(np.arange(30.0), np.full(30, 12.0)) == pytest.approx(12.0)
+    assert set(bank.report(1 / RATE)["ema"]) == {"runtime_ms", "lag_samples", "lag_s"}
+    assert FilterBank().apply([0.0, 1.0], [1.0, 3.0]) == 2.0  # Empty chain: mean
+    with pytest.raises(ValueError):
+        FilterBank.from_config({"chain": ["butterworth"]})
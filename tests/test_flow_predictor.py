@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from flow_predictor import FlowRatePredictor
+
+RATE = 80.0  # HX711 samples per second
+
+
+def test_predicts_settled_weight_from_the_flow_rate():
+    predictor = FlowRatePredictor(stop_delay=0.4, window=1.0)
+    times = np.arange(0.0, 2.0, 1 / RATE)
+    predictor.update_window(times, 30.0 * times)  # 30 g/s
+    assert predictor.rate == pytest.approx(30.0)
+    assert predictor.current == pytest.approx(30.0 * times[-1])
+    assert predictor.predicted_final() == pytest.approx(30.0 * (times[-1] + 0.4))
+    assert predictor.time_to_target(100.0) == pytest.approx((100.0 - predictor.predicted_final()) / 30.0)
+    assert not predictor.should_stop(100.0)
+    assert predictor.should_stop(predictor.predicted_final())
+
+
+def test_add_keeps_only_the_window():
+    predictor = FlowRatePredictor(window=0.5, min_samples=5)
+    for i in range(4):
+        predictor.add(i * 0.1, 1000.0)  # Old history is dropped below
+    assert not predictor.ready
+    for i in range(10):
+        t = 1.0 + i * 0.1
+        predictor.add(t, 10.0 * t)
+    assert predictor.rate == pytest.approx(10.0)
+    assert len(predictor._times) == 6
+
+
+def test_rate_never_negative_and_needs_samples():
+    predictor = FlowRatePredictor(min_samples=5)
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    predictor.update_window(times, 50.0 - 5.0 * times)  # Scale settling downwards
+    assert predictor.rate == 0.0
+    assert predictor.time_to_target(100.0) is None
+
+    predictor.update_window(times[:4], times[:4])
+    assert not predictor.ready
+    assert predictor.predicted_final() is None
+    assert not predictor.should_stop(0.0)
+
+
+def test_from_config_defaults():
+    predictor = FlowRatePredictor.from_config({"stop_delay": 0.25})
+    assert (predictor.stop_delay, predictor.window, predictor.min_samples) == (0.25, 1.0, 5)
+    assert FlowRatePredictor.from_config(None).stop_delay == 0.4
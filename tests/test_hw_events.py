@@ -0,0 +1,63 @@
+import pytest
+
+import sim_hardware
+sim_hardware.install()  # Fake pigpio before hw_events imports it
+import hw_events
+from hw_events import HardwareEventBus
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMotor:
+    """Just what the jam check reads: a commanded rotor and, optionally, a duty->RPM map."""
+
+    def __init__(self, duty=60.0, expected=None):
+        self.enabled = True
+        self.duty_cycle = duty
+        self.expected = expected
+
+    def expected_rpm(self):
+        return self.expected
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(hw_events.time, "monotonic", clock)
+    return clock
+
+
+def run_slow(bus, clock, rpm, seconds=1.0, period=0.1):
+    events = []
+    bus.subscribe(events.append, types=(hw_events.JAM,))
+    for _ in range(round(seconds / period)):
+        clock.now += period
+        bus._check_jam(rpm, since_release=10.0)
+    return events
+
+
+def test_jam_uses_the_speed_map(clock):
+    bus = HardwareEventBus(FakeMotor(expected=700.0))
+    assert run_slow(bus, clock, rpm=380.0) == []  # Above half the no-load RPM
+    [event] = run_slow(bus, clock, rpm=300.0)
+    assert event["expected_rpm"] == 700.0
+    assert event["min_rpm"] == pytest.approx(350.0)
+
+
+def test_jam_falls_back_to_a_fixed_floor_without_a_map(clock):
+    bus = HardwareEventBus(FakeMotor(duty=60.0))
+    assert run_slow(bus, clock, rpm=300.0) == []  # A loaded rotor is not a jam
+    [event] = run_slow(bus, clock, rpm=150.0)
+    assert event["expected_rpm"] is None
+    assert event["min_rpm"] == pytest.approx(3.0 * 60.0)
+
+
+def test_jam_detection_off_without_map_or_floor(clock):
+    bus = HardwareEventBus(FakeMotor(), jam_min_rpm_per_duty=0)
+    assert run_slow(bus, clock, rpm=50.0) == []
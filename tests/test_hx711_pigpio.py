@@ -0,0 +1,82 @@
+import json
+import time
+
+import pytest
+
+import sim_hardware
+sim_hardware.install()  # Fake pigpio, RPi.GPIO and hx711 before the readers import them
+import pigpio
+import config_store
+from hx711_pigpio import PigpioHX711
+from hx711_reader import LoadCell
+
+
+@pytest.fixture
+def world():
+    world = sim_hardware.world()
+    world.clear_scale()
+    yield world
+    world.clear_scale()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_bit_banged_read_returns_signed_counts(world):
+    world.place(100.0)
+    expected = world.zero_counts + 100.0 * world.counts_per_gram  # Negative: exercises the sign bit
+    samples = []
+    pi = pigpio.pi()
+    reader = PigpioHX711(pi, on_sample=lambda tick, timestamp, count: samples.append((timestamp, count)))
+    reader.start()
+    try:
+        assert wait_for(lambda: len(samples) >= 20)
+    finally:
+        reader.cancel()
+    assert reader.read_errors == 0
+    counts = [count for _, count in samples]
+    assert all(abs(count - expected) < 10 * world.noise_counts for count in counts)
+    times = [timestamp for timestamp, _ in samples]
+    assert times == sorted(times) and abs(times[-1] - time.monotonic()) < 0.5
+
+
+@pytest.fixture
+def cal_file(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({"offset": 1000.0, "A": 0.002, "B": 0, "stream_mode": "interrupt"}))
+    return path
+
+
+def test_interrupt_mode_needs_its_own_calibration(world, cal_file):
+    load_cell = LoadCell(cal_file=str(cal_file))
+    load_cell.start_stream()
+    try:
+        assert load_cell.stream_mode == "thread"  # Refused: library units calibration only
+        assert (load_cell.calibration_mode, load_cell.offset) == ("thread", 1000.0)
+    finally:
+        load_cell.stop_stream()
+
+
+def test_calibration_follows_the_stream_mode(world, cal_file):
+    data = json.loads(cal_file.read_text())
+    data["interrupt_calibration"] = {"offset": -169000.0, "A": 0.0027, "B": 0}
+    cal_file.write_text(json.dumps(data))
+    load_cell = LoadCell(cal_file=str(cal_file))
+    load_cell.start_stream()
+    try:
+        assert load_cell.stream_mode == "interrupt"
+        assert (load_cell.offset, load_cell.A) == (-169000.0, 0.0027)
+        assert wait_for(lambda: load_cell.stream_buffer.total >= 10)
+
+        load_cell.offset = -169100.0
+        load_cell.save_calibration()  # Lands in the interrupt section only
+        saved = config_store.store(str(cal_file)).data()
+        assert saved["interrupt_calibration"]["offset"] == -169100.0
+        assert saved["offset"] == 1000.0
+    finally:
+        load_cell.stop_stream()
+    assert (load_cell.calibration_mode, load_cell.offset, load_cell.A) == ("thread", 1000.0, 0.002)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import sim_hardware
+sim_hardware.install()  # Fake pigpio and RPi.GPIO before motor imports them
+import motor
+from motor import BLDCMotor
+
+PERIOD_US = 10000  # 100 Hz speed pulses
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(motor.time, "monotonic", clock)
+    return clock
+
+
+def make_motor(tmp_path, **kwargs):
+    cal_file = tmp_path / "calibration.json"
+    cal_file.write_text(json.dumps({"speed_control": {"kp": 0.08, "ki": 0.5}}))
+    return BLDCMotor(pwm_pin=5, speed_pin=16, en_pin=20, brk_pin=19, cal_file=str(cal_file), **kwargs)
+
+
+def pulses(bldc, clock, count, period_us, tick=0):
+    for _ in range(count):
+        tick += period_us
+        clock.now += period_us / 1e6
+        bldc._pulse_callback(bldc.speed_pin, 1, tick)
+    return tick
+
+
+def test_reading_rpm_has_no_side_effects(tmp_path, clock):
+    bldc = make_motor(tmp_path, rpm_time_constant=0.1)
+    pulses(bldc, clock, 20, PERIOD_US)
+    expected = bldc._pulse_rate_to_rpm(1e6 / PERIOD_US)
+    readings = {bldc.rpm for _ in range(1000)}
+    assert len(readings) == 1
+    assert readings.pop() == pytest.approx(expected)
+
+
+def test_smoothing_follows_pulse_time_not_reads(tmp_path, clock):
+    bldc = make_motor(tmp_path, rpm_window=1, rpm_time_constant=0.1)
+    tick = pulses(bldc, clock, 20, PERIOD_US)
+    low = bldc.rpm
+    pulses(bldc, clock, 20, PERIOD_US // 2, tick)  # Speed doubles for 0.1 s = one time constant
+    for _ in range(100):
+        bldc.rpm
+    assert bldc.rpm == pytest.approx(low + (1 - 0.3679) * low, rel=0.02)
+
+
+def test_rpm_falls_when_pulses_stop(tmp_path, clock):
+    bldc = make_motor(tmp_path)
+    pulses(bldc, clock, 10, PERIOD_US)
+    running = bldc.rpm
+    clock.now += 0.1  # Ten periods overdue
+    assert bldc.rpm == pytest.approx(running / 10, rel=0.01)
+    clock.now += 1.0
+    assert bldc.rpm == 0.0
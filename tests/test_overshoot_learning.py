@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+import config_store
+from overshoot_learning import OvershootLearner
+
+
+@pytest.fixture
+def cal_file(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({"overshoot_compensation": {"60": 1.5}, "ice_cutoff": {"stop_delay": 0.4, "window": 0.5}}))
+    return str(path)
+
+
+def test_threshold_stops_learn_the_speed_table(cal_file):
+    learner = OvershootLearner(cal_file)
+    assert learner.record(60, 4.0, 5.0) == 1.25  # Halfway to the 1.0 oz measured, at most max_step
+    assert config_store.store(cal_file).get("overshoot_compensation")["60"] == 1.25
+    assert learner.record(60, 4.0, 40.0) == 1.25  # Implausible, ignored
+
+
+def test_predicted_stops_learn_the_stop_delay(cal_file):
+    learner = OvershootLearner(cal_file)
+    # Fitted 4.0 oz at 0.5 oz/s when stopped; settled at 4.3 oz -> the fall-off took 0.6 s
+    assert learner.record_stop_delay(4.0, 0.5, 4.3) == pytest.approx(0.5)  # Limited to max_delay_step
+    for _ in range(5):
+        learner.record_stop_delay(4.0, 0.5, 4.3)
+    assert learner.stop_delay == pytest.approx(0.6, abs=0.01)
+    config = config_store.store(cal_file)
+    assert config.get("ice_cutoff") == {"stop_delay": learner.stop_delay, "window": 0.5}
+    assert config.get("overshoot_compensation") == {"60": 1.5}
+    assert learner.record_stop_delay(4.0, 0.0, 4.3) == learner.stop_delay  # No flow, nothing learned
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import pour_assist
+from pour_assist import PourAssistant
+
+RATE = 80.0  # HX711 samples per second
+
+
+def test_cue_looks_ahead_by_sample_age_display_and_reaction(monkeypatch):
+    assistant = PourAssistant(window=0.5, display_latency=0.05, reaction_time=0.25)
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    monkeypatch.setattr(pour_assist.time, "monotonic", lambda: times[-1] + 0.1)
+    assistant.update_window(times, 20.0 * times)  # 20 g/s
+
+    assert assistant.latency == pytest.approx(0.4)
+    assert assistant.rate == pytest.approx(20.0)
+    assert assistant.pouring
+    now = 20.0 * times[-1]
+    assert assistant.time_to_stop(now + 10.0) == pytest.approx(10.0 / 20.0 - 0.4)
+    assert not assistant.stop_now(now + 10.0)
+    assert assistant.stop_now(now + 20.0 * 0.4 - 0.01)
+
+
+def test_no_eta_while_not_pouring():
+    assistant = PourAssistant(min_rate=0.5)
+    for i in range(40):
+        assistant.add(i / RATE, 80.0 + 0.1 * i / RATE)  # 0.1 g/s of drift
+    assert assistant.latency == pytest.approx(0.3)
+    assert not assistant.pouring
+    assert assistant.time_to_stop(100.0) is None
+
+    assistant.reset()
+    assert assistant.rate is None
+
+
+def test_from_config():
+    assistant = PourAssistant.from_config({"reaction_time": 0.4, "min_rate": 1.0})
+    assert (assistant.display_latency, assistant.reaction_time, assistant.min_rate) == (0.05, 0.4, 1.0)
+    assert assistant.predictor.window == 0.5
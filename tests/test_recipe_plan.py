@@ -0,0 +1,65 @@
+import pytest
+
+from recipe_plan import FLAVOR, GRAMS_PER_OZ, ICE, RecipeError, compile_plan, compile_plans, interpolate_time
+
+SETTINGS = {"rotor_speed": 60.0, "speed_mode": "duty"}
+MAPPING = {"40": 8.0, "60": 4.0, "80": 2.0}
+
+
+def test_weight_recipe_in_grams_with_overshoot_compensation():
+    plan = compile_plan("Mango", "Small", {"Ice": 4.0, "Flavor": 6.0}, SETTINGS, {"60": 0.5})
+    assert plan.stages == (ICE, FLAVOR)
+    assert plan.ice_target_g == pytest.approx(4.0 * GRAMS_PER_OZ)
+    assert plan.ice_stop_g == pytest.approx(3.5 * GRAMS_PER_OZ)
+    assert plan.flavor_target_oz == pytest.approx(6.0)
+    assert not plan.is_time_based
+
+
+def test_speed_profile_stops_at_finish_speed():
+    recipe = {"Ice": 4.0, "speed_profile": {"bulk_speed": 90, "finish_speed": 40}}
+    plan = compile_plan("Mango", "Small", recipe, SETTINGS, {"40": 0.2, "60": 0.5})
+    assert plan.stop_speed == 40
+    assert plan.ice_stop_g == pytest.approx(3.8 * GRAMS_PER_OZ)
+    assert plan.stages == (ICE,)
+
+
+def test_time_recipes():
+    plan = compile_plan("Mango", "Small", {"Time": 2.0, "speed_time_mapping": MAPPING}, SETTINGS)
+    assert plan.is_time_based
+    assert plan.ice_time == pytest.approx(4.0)  # The mapping wins over the fixed Time
+    assert interpolate_time(MAPPING, 50) == pytest.approx(6.0)
+    assert compile_plan("Mango", "Small", {"Time": 2.5}, SETTINGS).ice_time == 2.5
+
+
+@pytest.mark.parametrize("recipe, settings", [
+    ({}, SETTINGS),
+    ({"Ice": 4.0}, {"rotor_speed": 0}),
+    ({"Ice": 4.0}, {"speed_mode": "duty", "rotor_speed": 120}),
+    ({"Ice": -1.0}, SETTINGS),
+    ({"Ice": "4"}, SETTINGS),
+    ({"Flavor": 6.0}, SETTINGS),
+    ({"Time": 0}, SETTINGS),
+    ({"speed_time_mapping": {}}, SETTINGS),
+    ({"speed_time_mapping": {"fast": 2.0}}, SETTINGS),
+    ({"speed_time_mapping": {"40": 2.0, "60": 0}}, SETTINGS),
+    ({"speed_time_mapping": {"70": 2.0, "80": 1.0}}, SETTINGS),
+    ({"Ice": 4.0, "speed_profile": {"bulk_speed": 90, "finish_speed": 40, "finish_at": 1.5}}, SETTINGS),
+    ({"Ice": 4.0, "speed_profile": {"bulk_speed": 120, "finish_speed": 40}}, SETTINGS),
+    ({"Ice": 4.0, "speed_profile": {"finish_speed": 40}}, SETTINGS),
+])
+def test_invalid_recipes_raise(recipe, settings):
+    with pytest.raises(RecipeError):
+        compile_plan("Mango", "Small", recipe, settings)
+
+
+def test_rpm_mode_allows_speeds_above_100():
+    settings = {"speed_mode": "rpm", "rotor_speed": 900}
+    recipe = {"Ice": 4.0, "speed_profile": {"bulk_speed": 1200, "finish_speed": 600}}
+    assert compile_plan("Mango", "Small", recipe, settings).stop_speed == 600
+
+
+def test_compile_plans_collects_errors():
+    settings = dict(SETTINGS, sizes={"Mango": {"Small": {"Ice": 4.0}, "Large": {"Ice": -1.0}}})
+    plans, errors = compile_plans(settings)
+    assert list(plans) == [("Mango", "Small")]
+    assert isinstance(errors[("Mango", "Large")], RecipeError)
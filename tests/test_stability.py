@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from stability import StabilityDetector
+
+RATE = 80.0  # HX711 samples per second
+
+
+def noise(n, std, seed=0):
+    return np.random.default_rng(seed).normal(0.0, std, n)
+
+
+def test_settles_on_a_quiet_reading():
+    detector = StabilityDetector(window=0.5, max_std=0.2, max_slope=0.5)
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    assert detector.update_window(times, 120.0 + noise(len(times), 0.05))
+    assert detector.std < 0.2
+    assert abs(detector.slope) < 0.5
+
+
+def test_noise_and_drift_are_not_settled():
+    detector = StabilityDetector(window=0.5, max_std=0.2, max_slope=0.5)
+    times = np.arange(0.0, 1.0, 1 / RATE)
+    assert not detector.update_window(times, 120.0 + noise(len(times), 1.0))
+    # A slow drip: tiny spread, but a steady slope
+    assert not detector.update_window(times, 120.0 + 1.0 * times)
+    assert detector.std <= 0.2
+    assert detector.slope == pytest.approx(1.0)
+
+
+def test_needs_half_a_window_of_samples():
+    detector = StabilityDetector(window=0.5, min_samples=5)
+    for i in range(19):  # 0.225 s at 80 Hz
+        assert not detector.add(i / RATE, 120.0)
+    assert detector.std is None
+    assert detector.add(20 / RATE, 120.0)
+    assert detector.settled
+
+
+def test_add_drops_samples_older_than_the_window():
+    detector = StabilityDetector(window=0.5)
+    detector.add(0.0, 0.0)  # Cup being placed
+    for i in range(1, 80):
+        detector.add(i / RATE, 120.0)
+    assert detector.settled
+    assert 0.0 not in detector._weights
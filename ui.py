@@ -1,19 +1,19 @@
 #!/usr/bin/env python3
 import sys
 import threading
-import time
 import RPi.GPIO as GPIO
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QGridLayout, QComboBox, QDoubleSpinBox
 )
-from PyQt5.QtCore import Qt, QTimer
-from hx711_reader import LoadCell  # Load cell sensor class
-from motor import BLDCMotor  # Motor control class
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+import devices  # Shared LoadCell and BLDCMotor
 from settings_ui import SettingsWindow  # Settings window
 import settings
 
 class WeightDisplay(QWidget):
+    speedMapLearned = pyqtSignal(bool)  # Emitted by the learning thread, handled on the GUI thread
+
     def __init__(self):
         """Initialize the main UI window and components."""
         super().__init__()
@@ -22,12 +22,13 @@ class WeightDisplay(QWidget):
         self.app_settings = settings.load_settings()
 
         # Initialize Load Cell (Weight Sensor)
-        self.load_cell = LoadCell(calibration_factor=0.002965)
+        self.load_cell = devices.load_cell()
 
         # Initialize Motor Controller
         GPIO.setmode(GPIO.BCM)
-        self.motor = BLDCMotor(pwm_pin=5, speed_pin=16, en_pin=20, brk_pin=19)
+        self.motor = devices.motor()
         self.motor_speed = self.app_settings["rotor_speed"]
+        self.speed_mode = self.app_settings.get("speed_mode", "duty")
 
         # UI Elements
         self.weight_label = QLabel("Weight:  0.00 g", self)  # Add padding to align text
@@ -40,7 +41,7 @@ class WeightDisplay(QWidget):
         """
         )
 
-        self.speed_label = QLabel(f"Motor Speed: {self.motor_speed}%", self)
+        self.speed_label = QLabel(f"Motor Speed: {settings.format_speed(self.app_settings, self.motor_speed)}", self)
         self.speed_label.setAlignment(Qt.AlignCenter)
         self.speed_label.setStyleSheet("font-size: 20px; font-weight: bold;")
 
@@ -73,6 +74,11 @@ class WeightDisplay(QWidget):
         self.decrease_speed_button.setStyleSheet("font-size: 20px; padding: 10px;")
         self.decrease_speed_button.clicked.connect(self.decrease_speed)
 
+        self.learn_speed_button = QPushButton("Learn Speed Map", self)
+        self.learn_speed_button.setStyleSheet("font-size: 20px; padding: 10px;")
+        self.learn_speed_button.clicked.connect(self.learn_speed_map)
+        self.speedMapLearned.connect(self.on_speed_map_learned)
+
         self.exit_button = QPushButton("X")
         self.exit_button.setFixedSize(70, 70)  # Adjust the size here (width, height)
         self.exit_button.setStyleSheet("font-size: 24px; padding: 5px; background-color: red; color: white;")  # Adjust font size if needed
@@ -112,6 +118,7 @@ class WeightDisplay(QWidget):
         button_layout.addWidget(self.decrease_speed_button, 3, 0)  # Row 3, Column 0
         button_layout.addWidget(self.save_speed_button, 3, 1)  # Row 3, Column 1
         button_layout.addWidget(self.save_tare_button, 4, 0)  # Add Save Tare button to the grid layout
+        button_layout.addWidget(self.learn_speed_button, 4, 1)  # Row 4, Column 1
 
         # Main layout
         layout = QVBoxLayout()
@@ -131,10 +138,10 @@ class WeightDisplay(QWidget):
         self.timer.timeout.connect(self.update_weight)
         self.timer.start(50)
 
-        # Thread for RPM updates
-        self.rpm_thread_running = True  # Flag to control the RPM thread
-        self.rpm_thread = threading.Thread(target=self.rpm_loop, daemon=True)
-        self.rpm_thread.start()
+        # Timer for RPM updates (BLDCMotor.rpm never blocks)
+        self.rpm_timer = QTimer(self)
+        self.rpm_timer.timeout.connect(self.update_rpm)
+        self.rpm_timer.start(200)
 
         # Configure Window
         self.setWindowTitle("Weight Sensor & Motor Control")
@@ -149,18 +156,9 @@ class WeightDisplay(QWidget):
         weight = self.load_cell.get_weight()
         self.weight_label.setText(f"Weight: {weight:6.2f} g")  # Pad to 6 characters for alignment
 
-    def rpm_loop(self):
-        """Continuously update RPM in a separate thread."""
-        first_run = True  # Track if this is the first run
-        while self.rpm_thread_running:
-            if first_run:
-                self.motor.pulse_count = 0  # Reset pulse count on the first run
-                time.sleep(0.5)  # Allow motor to stabilize before first RPM calculation
-                first_run = False
-            rpm = self.motor.get_rpm()  # This is rotor RPM
-            if self.rpm_thread_running:
-                self.rpm_label.setText(f"RPM: {rpm:.2f}")  # Display rotor RPM
-            time.sleep(0.3)
+    def update_rpm(self):
+        """Update the rotor RPM display."""
+        self.rpm_label.setText(f"RPM: {self.motor.rpm:.2f}")
 
     def load_size_settings(self):
         """Load ingredient weight settings based on selected flavor."""
@@ -183,34 +181,79 @@ class WeightDisplay(QWidget):
         self.motor.pulse_count = 0  # Reset pulse count to ensure accurate RPM calculation
         self.motor.start()
         self.motor_speed = self.app_settings["rotor_speed"]
-        self.motor.set_speed(self.motor_speed)
-        self.speed_label.setText(f"Motor Speed: {self.motor_speed}%")
+        if self.apply_motor_speed():
+            self.speed_label.setText(f"Motor Speed: {settings.format_speed(self.app_settings, self.motor_speed)}")
         QApplication.processEvents()
 
     def stop_motor(self):
         """Stop the motor completely."""
         self.motor.stop()
-        self.speed_label.setText(f"Motor Speed: {self.motor_speed}%")  # Keep the motor speed setting displayed
+        self.speed_label.setText(f"Motor Speed: {settings.format_speed(self.app_settings, self.motor_speed)}")  # Keep the motor speed setting displayed
         QApplication.processEvents()
 
+    def speed_step_and_limit(self):
+        """Button step and maximum: 5% / 100% in duty mode, 50 RPM / mapped top speed in RPM mode."""
+        if self.speed_mode == "rpm":
+            return 50, round(self.motor.feedforward.max_rpm)
+        return 5, 100
+
+    def apply_motor_speed(self):
+        """Send the current speed setting to the motor. Returns False without a speed map in RPM mode."""
+        try:
+            self.motor.run_at(self.motor_speed, self.speed_mode)
+            return True
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            self.speed_label.setText("Learn the speed map first")
+            return False
+
     def increase_speed(self):
-        """Increase motor speed by 5% (max 100%)."""
-        if self.motor_speed < 100:
-            self.motor_speed += 5
-            self.motor_speed = min(self.motor_speed, 100)  # Ensure it doesn't exceed 100%
-            self.motor.set_speed(self.motor_speed)
-            self.speed_label.setText(f"Motor Speed: {self.motor_speed}%")
+        """Increase motor speed by one step (5% or 50 RPM)."""
+        step, limit = self.speed_step_and_limit()
+        if self.motor_speed < limit:
+            self.motor_speed += step
+            self.motor_speed = min(self.motor_speed, limit)  # Ensure it doesn't exceed the maximum
+            self.apply_motor_speed()
+            self.speed_label.setText(f"Motor Speed: {settings.format_speed(self.app_settings, self.motor_speed)}")
             QApplication.processEvents()
 
     def decrease_speed(self):
-        """Decrease motor speed by 5% (min 0%)."""
+        """Decrease motor speed by one step (min 0)."""
+        step, _ = self.speed_step_and_limit()
         if self.motor_speed > 0:
-            self.motor_speed -= 5
-            self.motor_speed = max(self.motor_speed, 0)  # Ensure it doesn't go below 0%
-            self.motor.set_speed(self.motor_speed)
-            self.speed_label.setText(f"Motor Speed: {self.motor_speed}%")
+            self.motor_speed -= step
+            self.motor_speed = max(self.motor_speed, 0)  # Ensure it doesn't go below 0
+            self.apply_motor_speed()
+            self.speed_label.setText(f"Motor Speed: {settings.format_speed(self.app_settings, self.motor_speed)}")
             QApplication.processEvents()
 
+    def learn_speed_map(self):
+        """
+        Spin the empty rotor through a duty sweep and save the duty->RPM map.
+        The sweep takes about 10 s, so it runs on a worker thread and the
+        window keeps updating; the result arrives through speedMapLearned.
+        """
+        self.learn_speed_button.setEnabled(False)
+        self.start_motor_button.setEnabled(False)  # The sweep owns the motor until it finishes
+        self.speed_label.setText("Learning speed map...")
+        threading.Thread(target=self._learn_speed_map, name="speed-map", daemon=True).start()
+
+    def _learn_speed_map(self):
+        try:
+            learned = self.motor.learn_feedforward()
+        except Exception as e:
+            print(f"[ERROR] Speed map learning failed: {e}")
+            learned = False
+        self.speedMapLearned.emit(learned)
+
+    def on_speed_map_learned(self, learned):
+        self.learn_speed_button.setEnabled(True)
+        self.start_motor_button.setEnabled(True)
+        if learned:
+            self.speed_label.setText(f"Speed map: up to {self.motor.feedforward.max_rpm:.0f} RPM")
+        else:
+            self.speed_label.setText("Speed map not learned (cover open?)")
+
     def return_to_main_screen(self):
         """Return to the main UI start screen."""
         self.close()  # Close the current WeightDisplay window
@@ -222,7 +265,7 @@ class WeightDisplay(QWidget):
     def save_motor_speed(self):
         """Save the updated motor speed to settings.json."""
         self.app_settings["rotor_speed"] = self.motor_speed
-        settings.save_settings(self.app_settings)
+        settings.store().set("rotor_speed", self.motor_speed)  # Only this field; listeners apply it live
         print(f"[INFO] Motor speed updated to {self.motor_speed}% and saved.")
         if self.save_motor_speed_callback:
             self.save_motor_speed_callback()  # Notify MainUI to reload settings
@@ -244,16 +287,13 @@ class WeightDisplay(QWidget):
 
     def closeEvent(self, event):
         """Handle the window close event."""
-        self.rpm_thread_running = False  # Stop the RPM thread
-        if self.rpm_thread.is_alive():
-            self.rpm_thread.join()  # Wait for the thread to finish
+        self.rpm_timer.stop()
         self.motor.stop()  # Ensure the motor is stopped if running
         super().closeEvent(event)  # Call the parent class's closeEvent
 
     def closeProgram(self):
         """Safely close the program and cleanup GPIO."""
-        self.motor.cleanup()
-        self.load_cell.stop()
+        devices.shutdown()
         QApplication.quit()
 
 if __name__ == "__main__":